@@ -0,0 +1,102 @@
+# api/artifacts.py
+"""
+Bulky stage outputs, kept out of media_docs.
+
+Transcripts, frame metadata and evidence lists are written to the
+`artifacts` collection, one document per (media_id, kind), with
+_id "<media_id>:<kind>". The media doc only keeps a small marker per
+kind under ``artifacts`` ({kind: {"fields": [...], "bytes": n}}), so
+status / listing / report reads stay a few hundred bytes and the hot
+working set is the small docs only.
+
+    kind          fields
+    transcript    transcript, transcript_segments
+    frames        keyframes
+    evidence      evidence
+
+Artifacts over ARTIFACT_INLINE_MAX_BYTES go to GridFS (bucket
+"artifact_files") and the artifact doc holds the file id instead.
+
+Stages read and write these fields as usual; api.stages routes them
+through offload() / load(). Older docs that still carry the fields inline
+are read as they are (see manage.py offload_artifacts).
+"""
+import bson
+from django.utils import timezone
+from gridfs import GridFSBucket
+from pymongo import ReturnDocument
+
+from .mongo import artifacts, get_db
+
+ARTIFACT_KINDS = {
+    "transcript": ["transcript", "transcript_segments"],
+    "frames": ["keyframes"],
+    "evidence": ["evidence"],
+}
+KIND_OF = {field: kind for kind, fields in ARTIFACT_KINDS.items() for field in fields}
+
+ARTIFACT_INLINE_MAX_BYTES = 8 * 1024 * 1024  # Mongo's document limit is 16 MB
+
+
+def artifact_id(media_id, kind):
+    return f"{media_id}:{kind}"
+
+
+def _files():
+    return GridFSBucket(get_db(), bucket_name="artifact_files")
+
+
+def save(media_id, kind, data):
+    """Store one artifact (replacing an earlier one); returns its media-doc marker."""
+    encoded = bson.encode({"data": data})
+    doc = {"media_id": media_id, "kind": kind, "bytes": len(encoded), "created_at": timezone.now()}
+    if len(encoded) > ARTIFACT_INLINE_MAX_BYTES:
+        doc["file_id"] = _files().upload_from_stream(artifact_id(media_id, kind), encoded)
+    else:
+        doc["data"] = data
+    previous = artifacts.find_one_and_replace(
+        {"_id": artifact_id(media_id, kind)}, doc,
+        upsert=True, projection={"file_id": 1}, return_document=ReturnDocument.BEFORE,
+    )
+    if previous and previous.get("file_id") is not None:
+        # a retried stage replaced a GridFS artifact
+        _files().delete(previous["file_id"])
+    return {"fields": sorted(data), "bytes": len(encoded)}
+
+
+def offload(media_id, fields):
+    """
+    Store the artifact fields among a stage's results and return what goes
+    on the media doc instead: the remaining fields plus the markers.
+    """
+    by_kind = {}
+    small = {}
+    for key, value in fields.items():
+        kind = KIND_OF.get(key)
+        if kind:
+            by_kind.setdefault(kind, {})[key] = value
+        else:
+            small[key] = value
+    for kind, data in by_kind.items():
+        small[f"artifacts.{kind}"] = save(media_id, kind, data)
+    return small
+
+
+def load(media_id, names, markers=None):
+    """
+    {field: value} for the artifact fields or kinds in `names`. With the
+    media doc's `artifacts` markers, kinds it never stored are not looked up.
+    """
+    kinds = {n if n in ARTIFACT_KINDS else KIND_OF[n] for n in names}
+    if markers is not None:
+        kinds &= set(markers)
+    if not kinds:
+        return {}
+    values = {}
+    for doc in artifacts.find({"_id": {"$in": [artifact_id(media_id, k) for k in sorted(kinds)]}}):
+        if doc.get("file_id") is not None:
+            data = bson.decode(_files().open_download_stream(doc["file_id"]).read())["data"]
+        else:
+            data = doc.get("data") or {}
+        values.update(data)
+    return values
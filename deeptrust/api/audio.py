@@ -0,0 +1,336 @@
+# api/audio.py
+"""
+Audio transcription for the transcribe_audio stage.
+
+ffmpeg streams the track as 16 kHz mono PCM in AUDIO_WINDOW_SECONDS
+windows, so memory does not grow with file length. An energy VAD marks
+AUDIO_FRAME_MS frames above AUDIO_VAD_THRESHOLD_DB (dBFS) as voiced;
+voiced runs are padded, merged across short pauses and cut into chunks
+of at most AUDIO_MAX_CHUNK_SECONDS. Silence and padding never reach the
+transcriber.
+
+Chunks go to a process pool as soon as they close, and each chunk's
+segment timestamps are shifted by the chunk's offset in the file before
+the transcript is stitched back together. Wall time therefore follows
+the amount of speech, not the length of the file.
+
+The pool lives as long as the process (see get_pool): its workers are
+spawned, not forked, so they inherit no sockets, locks or threads, and
+each loads the transcriber once in its initializer. Django-Q and Celery
+prefork workers are daemonic processes, which may not start children;
+there the pool is a thread pool sharing one transcriber, so chunks only
+run in parallel as far as the model releases the GIL, and the heavy
+lane's worker count is what scales transcription. Celery workers started
+with --pool=solo or --pool=threads are not daemonic and get the process
+pool.
+
+A transcriber is any object with a `name` and
+``transcribe(samples, sample_rate) -> [{"start", "end", "text"}]`` with
+times relative to the chunk. settings.AUDIO_TRANSCRIBER picks one by
+"package.module:attr" (class or no-argument factory), the same way as
+SNIPPET_EMBEDDER; the default StubTranscriber is deterministic and local.
+"""
+import hashlib
+import importlib
+import multiprocessing
+import os
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+from django.conf import settings
+
+SAMPLE_RATE = 16000
+AUDIO_FRAME_MS = 30
+AUDIO_WINDOW_SECONDS = 30.0
+AUDIO_VAD_THRESHOLD_DB = -40.0
+AUDIO_MIN_SPEECH_SECONDS = 0.25  # shorter voiced runs are clicks, not speech
+AUDIO_MIN_SILENCE_SECONDS = 0.5  # pauses shorter than this stay inside a chunk
+AUDIO_PAD_SECONDS = 0.2          # kept on both sides of a voiced run
+AUDIO_MAX_CHUNK_SECONDS = 30.0
+
+FRAME_SAMPLES = SAMPLE_RATE * AUDIO_FRAME_MS // 1000
+
+
+def _frame_count(seconds):
+    return max(1, int(round(seconds * 1000 / AUDIO_FRAME_MS)))
+
+
+# -----------------------------
+# Transcribers
+# -----------------------------
+class StubTranscriber:
+    """
+    Deterministic stand-in: one segment per chunk, text derived from the
+    samples. `realtime_factor` sleeps that fraction of the chunk's
+    duration, to stand in for a model's cost in benchmarks.
+    """
+
+    def __init__(self, realtime_factor=0.0):
+        self.realtime_factor = realtime_factor
+        self.name = "stub"
+
+    def transcribe(self, samples, sample_rate):
+        duration = len(samples) / sample_rate
+        if self.realtime_factor:
+            import time
+            time.sleep(duration * self.realtime_factor)
+        digest = hashlib.sha1(np.ascontiguousarray(samples).tobytes()).hexdigest()[:8]
+        return [{"start": 0.0, "end": round(duration, 3), "text": f"[speech {duration:.2f}s {digest}]"}]
+
+
+def load_transcriber(path):
+    if not path:
+        return StubTranscriber()
+    module, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module), attr)()
+
+
+def transcriber_path():
+    return getattr(settings, "AUDIO_TRANSCRIBER", "")
+
+
+# one instance per pool process (or per process, for the thread pool)
+_worker_transcriber = None
+_worker_path = None
+_worker_lock = threading.Lock()
+
+
+def _load_worker_transcriber(path):
+    global _worker_transcriber, _worker_path
+    with _worker_lock:
+        if _worker_transcriber is None or _worker_path != path:
+            _worker_transcriber = load_transcriber(path)
+            _worker_path = path
+        return _worker_transcriber
+
+
+def _transcribe_chunk(path, offset, samples, sample_rate):
+    segments = _load_worker_transcriber(path).transcribe(samples, sample_rate)
+    return [
+        {"start": round(offset + s["start"], 3), "end": round(offset + s["end"], 3), "text": s["text"].strip()}
+        for s in segments
+    ]
+
+
+# -----------------------------
+# Decoding
+# -----------------------------
+def ffmpeg_audio(source, sample_rate=SAMPLE_RATE, window_seconds=AUDIO_WINDOW_SECONDS):
+    """Yield int16 mono windows of `window_seconds` (the last may be shorter)."""
+    cmd = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-i", source, "-vn", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "s16le", "pipe:1",
+    ]
+    # whole frames per window, so VAD frames never straddle two windows
+    window_bytes = int(window_seconds * sample_rate) // FRAME_SAMPLES * FRAME_SAMPLES * 2
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=window_bytes)
+    errors = deque(maxlen=20)
+    drain = threading.Thread(target=lambda: errors.extend(proc.stderr), daemon=True)
+    drain.start()
+    try:
+        while True:
+            data = proc.stdout.read(window_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data[: len(data) // 2 * 2], dtype="<i2")
+        if proc.wait() != 0:
+            drain.join(timeout=1)
+            message = b"".join(errors).decode("utf-8", "replace").strip()
+            raise subprocess.SubprocessError(message or f"ffmpeg exited with {proc.returncode}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+# -----------------------------
+# Voice activity
+# -----------------------------
+def frame_levels(window):
+    """dBFS per AUDIO_FRAME_MS frame of an int16 window (a partial last frame is zero-padded)."""
+    n = -(-len(window) // FRAME_SAMPLES)
+    frames = np.zeros(n * FRAME_SAMPLES, dtype=np.float32)
+    frames[: len(window)] = window
+    power = np.mean((frames.reshape(n, FRAME_SAMPLES) / 32768.0) ** 2, axis=1)
+    return 10 * np.log10(power + 1e-10)
+
+
+def voiced_chunks(windows, threshold_db=None, sample_rate=SAMPLE_RATE):
+    """
+    Yield (offset_seconds, int16 samples) for voiced chunks, in order,
+    from a stream of windows. Only the open chunk and AUDIO_PAD_SECONDS
+    of look-back are held in memory.
+    """
+    threshold_db = AUDIO_VAD_THRESHOLD_DB if threshold_db is None else threshold_db
+    frame_seconds = FRAME_SAMPLES / sample_rate
+    pad, gap = _frame_count(AUDIO_PAD_SECONDS), _frame_count(AUDIO_MIN_SILENCE_SECONDS)
+    min_speech, max_chunk = _frame_count(AUDIO_MIN_SPEECH_SECONDS), _frame_count(AUDIO_MAX_CHUNK_SECONDS)
+
+    lookback = deque(maxlen=pad)  # frames just before the open chunk
+    chunk, start, voiced, last_voiced = [], None, 0, None
+    index = 0
+
+    def close(end):
+        # trailing silence beyond the pad is dropped
+        kept = chunk[: end - start]
+        if voiced >= min_speech:
+            return start * frame_seconds, np.concatenate(kept)
+        return None
+
+    for window in windows:
+        levels = frame_levels(window)
+        for i, level in enumerate(levels):
+            frame = window[i * FRAME_SAMPLES:(i + 1) * FRAME_SAMPLES]
+            is_voiced = level > threshold_db
+            if start is None:
+                if not is_voiced:
+                    lookback.append(frame)
+                    index += 1
+                    continue
+                chunk = list(lookback)
+                start = index - len(chunk)
+                lookback.clear()
+                voiced = 0
+            chunk.append(frame)
+            if is_voiced:
+                voiced += 1
+                last_voiced = index
+            index += 1
+
+            if index - 1 - last_voiced >= gap or len(chunk) >= max_chunk:
+                end = min(last_voiced + 1 + pad, index) if len(chunk) < max_chunk else index
+                out = close(end)
+                if out:
+                    yield out
+                lookback.extend(chunk[end - start:])
+                chunk, start = [], None
+    if start is not None:
+        out = close(min(last_voiced + 1 + pad, index))
+        if out:
+            yield out
+
+
+# -----------------------------
+# Transcription
+# -----------------------------
+def audio_workers():
+    return getattr(settings, "AUDIO_WORKERS", 0) or os.cpu_count() or 1
+
+
+_pool = None
+_pool_key = None  # (pid, kind, transcriber path, workers) it was built for
+_pool_lock = threading.Lock()
+
+
+def get_pool(path, workers):
+    """
+    The process's transcription pool, created on first use and rebuilt only
+    when the transcriber or worker count changes, or after a fork (a child
+    never reuses its parent's pool).
+    """
+    global _pool, _pool_key
+    # Celery prefork / Django-Q workers are daemonic and may not start children
+    kind = "thread" if multiprocessing.current_process().daemon else "process"
+    key = (os.getpid(), kind, path, workers)
+    with _pool_lock:
+        if _pool_key != key:
+            if _pool is not None and _pool_key[0] == key[0]:
+                _pool.shutdown(wait=False)
+            if kind == "thread":
+                print(f"⚠ Daemonic worker: transcribing on a thread pool ({workers}) instead of processes")
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcribe")
+            else:
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_load_worker_transcriber,
+                    initargs=(path,),
+                )
+            _pool_key = key
+        return _pool
+
+
+def reset_pool():
+    """Drop the pool (a worker died and broke it); the next job builds a new one."""
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is not None and _pool_key[0] == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool, _pool_key = None, None
+
+
+def transcribe_windows(windows, path=None, workers=None, threshold_db=None, sample_rate=SAMPLE_RATE):
+    """
+    VAD + parallel transcription over a window stream. Returns
+    {"segments", "text", "speech_seconds", "audio_seconds", "chunks"}.
+    """
+    path = transcriber_path() if path is None else path
+    workers = workers or audio_workers()
+    counted = {"samples": 0}
+
+    def counting(stream):
+        for window in stream:
+            counted["samples"] += len(window)
+            yield window
+
+    segments, speech_samples, chunks = [], 0, 0
+    pool = get_pool(path, workers)
+    pending = set()
+    try:
+        for offset, samples in voiced_chunks(counting(windows), threshold_db, sample_rate):
+            # bounded in flight, so a long file never queues all of its audio
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    segments.extend(future.result())
+            pending.add(pool.submit(_transcribe_chunk, path, offset, samples, sample_rate))
+            speech_samples += len(samples)
+            chunks += 1
+        for future in pending:
+            segments.extend(future.result())
+    except BrokenExecutor:
+        reset_pool()
+        raise
+    finally:
+        # the pool outlives this job: don't leave its chunks queued on failure
+        for future in pending:
+            future.cancel()
+
+    segments.sort(key=lambda s: s["start"])
+    return {
+        "segments": segments,
+        "text": " ".join(s["text"] for s in segments if s["text"]),
+        "speech_seconds": round(speech_samples / sample_rate, 3),
+        "audio_seconds": round(counted["samples"] / sample_rate, 3),
+        "chunks": chunks,
+    }
+
+
+# -----------------------------
+# Stage bodies
+# -----------------------------
+def transcribe_fields(media_doc):
+    """media_docs fields for the transcribe_audio stage."""
+    from .frames import media_source
+
+    source = media_source(media_doc) if media_doc else None
+    if not source:
+        return {"transcript": None, "transcript_error": "no audio source"}
+    threshold_db = getattr(settings, "AUDIO_VAD_THRESHOLD_DB", None)
+    try:
+        result = transcribe_windows(ffmpeg_audio(source), threshold_db=threshold_db)
+    except (OSError, subprocess.SubprocessError) as e:
+        print("❌ Transcription failed:", e)
+        return {"transcript": None, "transcript_error": str(e)}
+    print(f"🎤 {result['speech_seconds']}s of speech in {result['audio_seconds']}s, {result['chunks']} chunks")
+    return {
+        "transcript": result["text"],
+        "transcript_segments": result["segments"],
+        "speech_seconds": result["speech_seconds"],
+        "audio_seconds": result["audio_seconds"],
+        "transcriber": transcriber_path() or "stub",
+    }
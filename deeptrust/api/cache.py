@@ -0,0 +1,117 @@
+# api/cache.py
+"""
+Small in-process caches shared by the planner and the API.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL.
+
+    ttl=None keeps entries until they are evicted by size. Individual
+    entries can override the default TTL in set().
+    """
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=_MISSING):
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+# -----------------------------
+# Job status / report payloads
+# -----------------------------
+# Assembled API payloads live in the "jobs" Django cache (LocMem per
+# process by default, Redis when JOB_CACHE_URL is set so worker
+# invalidations reach every web process). Entries for finished (completed
+# or failed) jobs never expire; in-flight ones are also dropped by
+# invalidate_media() whenever a pipeline stage writes to the media doc,
+# with a short TTL as a backstop.
+
+JOB_CACHE_ALIAS = "jobs"
+JOB_CACHE_TTL = 5
+
+
+def _job_cache():
+    return caches[JOB_CACHE_ALIAS]
+
+
+def cached_job(job_id, user, load):
+    """
+    {"media_id": ...} for a job owned by `user`, or None. Ownership and
+    media_id never change, so this is cached without expiry.
+    """
+    key = f"job:{job_id}"
+    entry = _job_cache().get(key)
+    if entry is None:
+        job = load()
+        if job is None:
+            return None
+        entry = {"user_id": job.user_id, "media_id": job.media_id, "status": job.status}
+        _job_cache().set(key, entry, timeout=None)
+    if entry["user_id"] != user.id:
+        return None
+    return entry
+
+
+def cached_payload(kind, media_id, build):
+    key = f"{kind}:{media_id}"
+    payload = _job_cache().get(key)
+    if payload is None:
+        payload = build()
+        timeout = None if payload.get("status") in ("completed", "failed") else JOB_CACHE_TTL
+        _job_cache().set(key, payload, timeout=timeout)
+    return payload
+
+
+def invalidate_media(media_id):
+    try:
+        _job_cache().delete_many([f"status:{media_id}", f"report:{media_id}"])
+    except Exception as e:
+        print("⚠ Could not invalidate job cache:", e)
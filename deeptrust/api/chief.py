@@ -1,16 +1,62 @@
 # api/chief.py
 import os
+import copy
 import json
-import requests
+import random
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+
+from .cache import LRUCache
+from .llm_client import LLMError, get_openrouter_client
+from .metrics import PLAN_CACHE_LOOKUPS, PLANNER_SECONDS, timed
+from .mongo import plan_cache, audit_log
 
 OPENROUTER_API_KEY = "<OPENROUTER_API_KEY>"
 CHIEF_MODEL = "meta-llama/llama-3.3-70b-instruct:free"
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+# Bump whenever generate_prompt() changes so cached plans are not reused
+PROMPT_VERSION = 1
+PLAN_CACHE_TTL = int(os.getenv("PLAN_CACHE_TTL", "86400"))
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "64"))
+
+# Fraction of rule-planned jobs that are also sent to the LLM for comparison
+CHIEF_SHADOW_SAMPLE_RATE = float(os.getenv("CHIEF_SHADOW_SAMPLE_RATE", "0"))
+
+AVAILABLE_TASKS = [
+    "extract_frames",
+    "transcribe_audio",
+    "authenticity_image",
+    "authenticity_video",
+    "authenticity_audio",
+    "detect_text_ai",
+    "claim_extract",
+    "claim_normalize",
+    "retrieval_semantic_search",
+    "verification_ensemble",
+    "truthscore_compute",
+    "job_finalize",
+]
 
 
 # -----------------------------
 # Build prompt for the LLM
 # -----------------------------
+# Media fields generate_task_plan reads (plus user_id for lane routing);
+# orchestration fetches only these.
+PLAN_PROJECTION = {"media_id": 1, "user_id": 1, "file_type": 1, "text_input": 1, "claim_text": 1}
+
+
+def plan_signature(media_doc):
+    """The only media fields the plan depends on (media_id is injected later)."""
+    return {
+        "file_type": (media_doc.get("file_type") or "").lower(),
+        "text_input_present": bool(media_doc.get("text_input")),
+        "claim_text_present": bool(media_doc.get("claim_text")),
+    }
+
+
 def generate_prompt(media_doc):
     metadata = {
         "media_id": media_doc.get("media_id"),
@@ -19,6 +65,8 @@ def generate_prompt(media_doc):
         "claim_text_present": bool(media_doc.get("claim_text")),
     }
 
+    tasks = "\n".join(f"   - {name}" for name in AVAILABLE_TASKS)
+
     return f"""
 You are the Chief Orchestration Agent for DeepTrust AI.
 
@@ -31,18 +79,7 @@ RULES:
 1. Output ONLY JSON (no explanation).
 2. JSON format: {{"plan":[{{"task":"task_name","args":{{}}}}]}}
 3. Tasks available:
-   - extract_frames
-   - transcribe_audio
-   - authenticity_image
-   - authenticity_video
-   - authenticity_audio
-   - detect_text_ai
-   - claim_extract
-   - claim_normalize
-   - retrieval_semantic_search
-   - verification_ensemble
-   - truthscore_compute
-   - job_finalize
+{tasks}
 """
 
 
@@ -51,32 +88,11 @@ RULES:
 # Safe LLM API Call
 # -----------------------------
 def call_openrouter(prompt):
-    if not OPENROUTER_API_KEY:
-        raise ValueError("❌ OPENROUTER_API_KEY is missing. Set it in environment variables.")
-
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "model": CHIEF_MODEL,
-        "messages": [
-            {"role": "system", "content": "You output ONLY valid JSON."},
-            {"role": "user", "content": prompt},
-        ]
-    }
-
-    resp = requests.post(OPENROUTER_URL, headers=headers, json=payload)
-
-    # Debug info for failures
-    if resp.status_code != 200:
-        print("\n🔥 OpenRouter API Error")
-        print("Status:", resp.status_code)
-        print("Response:", resp.text)
-        resp.raise_for_status()
-
-    return resp.json()["choices"][0]["message"]["content"]
+    client = get_openrouter_client(OPENROUTER_URL, OPENROUTER_API_KEY)
+    return client.chat(CHIEF_MODEL, [
+        {"role": "system", "content": "You output ONLY valid JSON."},
+        {"role": "user", "content": prompt},
+    ])
 
 
 
@@ -96,23 +112,256 @@ def safe_json_loads(raw):
 
 
 
+# -----------------------------
+# Plan validation
+# -----------------------------
+def validate_plan(steps):
+    """
+    Keep only well-formed steps naming a task from AVAILABLE_TASKS,
+    without duplicates, in the order given.
+    """
+    valid = []
+    seen = set()
+    for step in steps:
+        if not isinstance(step, dict) or step.get("task") not in AVAILABLE_TASKS:
+            print("⚠ Dropping invalid plan step:", step)
+            continue
+        if step["task"] in seen:
+            continue
+        seen.add(step["task"])
+        args = step.get("args") or {}
+        if not isinstance(args, dict):
+            args = {}
+        valid.append({"task": step["task"], "args": {k: v for k, v in args.items() if k != "media_id"}})
+    return valid
+
+
+# -----------------------------
+# Rule-based fast path
+# -----------------------------
+CLAIM_PIPELINE = [
+    "claim_extract",
+    "claim_normalize",
+    "retrieval_semantic_search",
+    "verification_ensemble",
+]
+
+# First matching rule wins; "match" is compared against plan_signature().
+PLAN_RULES = [
+    {
+        "name": "text",
+        "match": {"file_type": "text"},
+        "tasks": ["detect_text_ai", *CLAIM_PIPELINE, "truthscore_compute", "job_finalize"],
+    },
+    {
+        "name": "image_only",
+        "match": {"file_type": "image", "text_input_present": False, "claim_text_present": False},
+        "tasks": ["authenticity_image", "truthscore_compute", "job_finalize"],
+    },
+    {
+        "name": "audio_only",
+        "match": {"file_type": "audio", "text_input_present": False, "claim_text_present": False},
+        "tasks": [
+            "transcribe_audio", "authenticity_audio", *CLAIM_PIPELINE,
+            "truthscore_compute", "job_finalize",
+        ],
+    },
+    {
+        "name": "video_with_claim",
+        "match": {"file_type": "video", "claim_text_present": True},
+        "tasks": [
+            "extract_frames", "transcribe_audio", "authenticity_video", "authenticity_audio",
+            *CLAIM_PIPELINE, "truthscore_compute", "job_finalize",
+        ],
+    },
+]
+
+# Rule tables are data; fail at import rather than at plan time if one is off
+for _rule in PLAN_RULES:
+    _steps = [{"task": t, "args": {}} for t in _rule["tasks"]]
+    if validate_plan(_steps) != _steps:
+        raise ValueError(f"Invalid plan rule: {_rule['name']}")
+
+
+def default_plan(media_doc):
+    """
+    Conservative full plan for the media type. Used when the LLM is
+    unavailable or returns nothing usable; never cached.
+    """
+    signature = plan_signature(media_doc)
+    file_type = signature["file_type"]
+
+    tasks = {
+        "video": ["extract_frames", "transcribe_audio", "authenticity_video", "authenticity_audio"],
+        "audio": ["transcribe_audio", "authenticity_audio"],
+        "image": ["authenticity_image"],
+        "text": ["detect_text_ai"],
+    }.get(file_type, [])
+
+    if file_type in ("video", "audio", "text") or signature["text_input_present"] or signature["claim_text_present"]:
+        tasks += CLAIM_PIPELINE
+    tasks += ["truthscore_compute", "job_finalize"]
+
+    return [{"task": t, "args": {}} for t in tasks]
+
+
+def rule_based_plan(media_doc):
+    """Steps for inputs covered by PLAN_RULES, or None to defer to the LLM."""
+    signature = plan_signature(media_doc)
+    for rule in PLAN_RULES:
+        if all(signature.get(k) == v for k, v in rule["match"].items()):
+            return rule["name"], [{"task": t, "args": {}} for t in rule["tasks"]]
+    return None, None
+
+
+def _shadow_compare(media_doc, rule_name, rule_steps):
+    try:
+        llm_steps = _llm_plan_steps(media_doc)
+    except Exception as e:
+        print("⚠ Shadow planner call failed:", e)
+        return
+
+    rule_tasks = [s["task"] for s in rule_steps]
+    llm_tasks = [s["task"] for s in llm_steps]
+    if set(rule_tasks) != set(llm_tasks):
+        print(f"⚖ Planner mismatch ({rule_name}): rules={rule_tasks} llm={llm_tasks}")
+
+    audit_log.insert_one({
+        "event": "planner_shadow",
+        "media_id": media_doc.get("media_id"),
+        "rule": rule_name,
+        "rule_tasks": rule_tasks,
+        "llm_tasks": llm_tasks,
+        "match": set(rule_tasks) == set(llm_tasks),
+        "created_at": datetime.now(timezone.utc),
+    })
+
+
+# -----------------------------
+# Plan cache (in-process LRU -> Mongo)
+# -----------------------------
+_plan_cache = LRUCache(maxsize=PLAN_CACHE_SIZE, ttl=PLAN_CACHE_TTL)
+
+
+def plan_cache_key(media_doc):
+    key = {
+        "signature": plan_signature(media_doc),
+        "model": CHIEF_MODEL,
+        "prompt_version": PROMPT_VERSION,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def _cached_plan(key):
+    steps = _plan_cache.get(key)
+    if steps is not None:
+        PLAN_CACHE_LOOKUPS.inc(tier="local", outcome="hit")
+        return steps
+    PLAN_CACHE_LOOKUPS.inc(tier="local", outcome="miss")
+
+    try:
+        doc = plan_cache.find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"plan": 1},
+        )
+    except Exception as e:
+        PLAN_CACHE_LOOKUPS.inc(tier="shared", outcome="error")
+        print("⚠ Plan cache lookup failed:", e)
+        return None
+
+    if not doc:
+        PLAN_CACHE_LOOKUPS.inc(tier="shared", outcome="miss")
+        return None
+
+    PLAN_CACHE_LOOKUPS.inc(tier="shared", outcome="hit")
+    _plan_cache.set(key, doc["plan"])
+    return doc["plan"]
+
+
+def _store_plan(key, steps):
+    _plan_cache.set(key, steps)
+    try:
+        plan_cache.replace_one(
+            {"_id": key},
+            {
+                "_id": key,
+                "plan": steps,
+                "model": CHIEF_MODEL,
+                "prompt_version": PROMPT_VERSION,
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=PLAN_CACHE_TTL),
+            },
+            upsert=True,
+        )
+    except Exception as e:
+        print("⚠ Plan cache write failed:", e)
+
+
+def plan_cache_stats():
+    """This process's lookups (also exported on /metrics as deeptrust_plan_cache_lookups_total)."""
+    lookups = PLAN_CACHE_LOOKUPS.snapshot()
+
+    def count(tier, outcome):
+        return lookups.get(f"{tier}|{outcome}", 0)
+
+    return {
+        "local": {"size": len(_plan_cache), "hits": count("local", "hit"), "misses": count("local", "miss")},
+        "shared": {"hits": count("shared", "hit"), "misses": count("shared", "miss"), "errors": count("shared", "error")},
+    }
+
+
 # -----------------------------
 # Build final task plan
 # -----------------------------
-def generate_task_plan(media_doc):
+def _inject_media_id(steps, media_id):
+    plan = {"plan": copy.deepcopy(steps)}
+    for step in plan["plan"]:
+        step.setdefault("args", {})
+        step["args"].setdefault("media_id", media_id)
+    return plan
+
+
+def _llm_plan_steps(media_doc):
+    key = plan_cache_key(media_doc)
+    steps = _cached_plan(key)
+    if steps is not None:
+        return steps
+
     prompt = generate_prompt(media_doc)
-    raw_output = call_openrouter(prompt)
+    try:
+        raw_output = call_openrouter(prompt)
+    except (LLMError, ValueError) as e:
+        # ValueError: no OpenRouter API key configured
+        print("⚠ Chief planner degraded to default plan:", e)
+        return default_plan(media_doc)
 
     plan = safe_json_loads(raw_output)
 
     # Always ensure valid structure
-    if "plan" not in plan:
+    if not isinstance(plan, dict) or not isinstance(plan.get("plan"), list):
         plan = {"plan": []}
 
-    # Inject media_id automatically
-    for step in plan["plan"]:
-        step.setdefault("args", {})
-        step["args"].setdefault("media_id", media_doc.get("media_id"))
+    # Cache the plan without the per-job media_id
+    steps = validate_plan(plan["plan"])
+    if not steps:
+        return default_plan(media_doc)
 
-    return plan
+    _store_plan(key, steps)
+    return steps
 
+
+def generate_task_plan(media_doc):
+    # Deterministic inputs never need the LLM
+    with timed(PLANNER_SECONDS, source="rules"):
+        rule_name, steps = rule_based_plan(media_doc)
+
+    if steps is None:
+        with timed(PLANNER_SECONDS, source="llm"):
+            steps = _llm_plan_steps(media_doc)
+    elif CHIEF_SHADOW_SAMPLE_RATE and random.random() < CHIEF_SHADOW_SAMPLE_RATE:
+        # Off the critical path: the job proceeds with the rule plan
+        threading.Thread(
+            target=_shadow_compare, args=(media_doc, rule_name, steps), daemon=True
+        ).start()
+
+    # Inject media_id automatically
+    return _inject_media_id(steps, media_doc.get("media_id"))
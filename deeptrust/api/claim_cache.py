@@ -0,0 +1,344 @@
+# api/claim_cache.py
+"""
+Verdict cache for claims.
+
+Claims are canonicalized and hashed after claim_normalize; the
+claim_lookup_cache stage then checks, in order:
+
+    hot tier    per-process LRU, bounded by the verdict's own expires_at
+    claims      Mongo, one doc per claim_hash (unique index) with the
+                verdict, its evidence and expires_at
+
+A fresh verdict lets the job skip retrieval_semantic_search and
+verification_ensemble. On a miss the job takes a lease on the claim_hash
+and verifies it; jobs that arrive while the lease is held park themselves
+in the doc's `waiters` and are resumed with the leader's verdict, so a
+trending claim is verified once instead of once per upload.
+
+A leader that fails or dies never publishes. When the failure is caught
+(stages.fail_job) abandon_lease() hands the lease to the first waiter
+straight away; otherwise the lease just expires, and
+recover_stalled_claims() (scheduled by ``manage.py provision``) does the
+same. Either way the promoted job then verifies the claim itself.
+"""
+import hashlib
+import os
+import re
+import unicodedata
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from . import artifacts
+from .cache import LRUCache
+from .dag import CLAIM_LOOKUP_STAGE, CLAIM_CACHE_SKIPS, complete_stage
+from .mongo import claims, media_docs
+from .writer import stage_writer
+
+CLAIM_CACHE_TTL = int(os.getenv("CLAIM_CACHE_TTL", str(7 * 24 * 3600)))
+CLAIM_HOT_TTL = int(os.getenv("CLAIM_HOT_TTL", "300"))
+CLAIM_HOT_SIZE = int(os.getenv("CLAIM_HOT_SIZE", "10000"))
+CLAIM_LEASE_SECONDS = int(os.getenv("CLAIM_LEASE_SECONDS", "600"))
+
+# returned by the lookup stage when the job waits on another job's lease;
+# the executor must not complete the stage (see resume_waiters)
+PARKED = "parked"
+
+_hot = LRUCache(maxsize=CLAIM_HOT_SIZE, ttl=CLAIM_HOT_TTL)
+
+
+# -----------------------------
+# Canonical form
+# -----------------------------
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def canonicalize_claim(text):
+    """Case, width, punctuation and spacing differences hash the same."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def claim_hash(canonical_text):
+    return hashlib.sha256(canonical_text.encode("utf-8")).hexdigest()
+
+
+def claim_text_of(media_doc):
+    """The claim a job verifies: the normalized claim, else the user's claim_text."""
+    claim = media_doc.get("claim") or {}
+    candidates = [claim.get("normalized_text"), *(media_doc.get("normalized_claims") or []), media_doc.get("claim_text")]
+    for text in candidates:
+        if isinstance(text, str) and text.strip():
+            return text
+    return None
+
+
+# -----------------------------
+# Lookup / lease / publish
+# -----------------------------
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _aware(value):
+    # pymongo hands datetimes back naive (UTC) unless tz_aware is set
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _entry(doc):
+    return {
+        "claim_hash": doc["claim_hash"],
+        "verdict": doc["verdict"],
+        "evidence": doc.get("evidence", []),
+        "verified_at": doc.get("verified_at"),
+        "expires_at": _aware(doc["expires_at"]),
+        "source_media_id": doc.get("source_media_id"),
+    }
+
+
+def _remember(entry):
+    remaining = (entry["expires_at"] - _now()).total_seconds()
+    if remaining > 0:
+        _hot.set(entry["claim_hash"], entry, ttl=min(CLAIM_HOT_TTL, remaining))
+
+
+def cached_verdict(h):
+    """Fresh verdict entry for a claim_hash, or None."""
+    entry = _hot.get(h)
+    if entry is not None:
+        return entry
+
+    doc = claims.find_one(
+        {"claim_hash": h, "verdict": {"$exists": True}, "expires_at": {"$gt": _now()}},
+        {"claim_hash": 1, "verdict": 1, "evidence": 1, "verified_at": 1, "expires_at": 1, "source_media_id": 1},
+    )
+    if doc is None:
+        return None
+    entry = _entry(doc)
+    _remember(entry)
+    return entry
+
+
+def lookup_or_lease(h, media_id, canonical_text, attempts=3):
+    """
+    ("hit", entry)  a fresh verdict exists
+    ("lead", None)  this job holds the lease and must verify the claim
+    ("wait", None)  another job holds the lease; this one is in its waiters
+    """
+    for _ in range(attempts):
+        entry = cached_verdict(h)
+        if entry is not None:
+            return "hit", entry
+
+        now = _now()
+        try:
+            # take the lease unless the verdict is fresh or someone else holds a live lease
+            claims.find_one_and_update(
+                {
+                    "claim_hash": h,
+                    "$and": [
+                        {"$or": [{"verdict": {"$exists": False}}, {"expires_at": {"$lte": now}}]},
+                        {"$or": [
+                            {"lease.owner": {"$exists": False}},
+                            {"lease.expires_at": {"$lte": now}},
+                            {"lease.owner": media_id},
+                        ]},
+                    ],
+                },
+                {
+                    "$set": {"lease": {"owner": media_id, "expires_at": now + timedelta(seconds=CLAIM_LEASE_SECONDS)}},
+                    "$setOnInsert": {"canonical_text": canonical_text, "created_at": now},
+                },
+                upsert=True,
+                projection={"_id": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            return "lead", None
+        except DuplicateKeyError:
+            pass
+
+        # Queue behind the live lease. If it was released in the meantime
+        # nothing matches and the next attempt finds the published verdict.
+        res = claims.update_one(
+            {"claim_hash": h, "lease.owner": {"$ne": media_id}, "lease.expires_at": {"$gt": now}},
+            {"$addToSet": {"waiters": media_id}},
+        )
+        if res.matched_count:
+            return "wait", None
+
+    # give up on de-duplication rather than stall the job
+    return "lead", None
+
+
+def publish(h, media_id, verdict, evidence):
+    """Store a verdict, release the lease and return (entry, waiting media_ids)."""
+    now = _now()
+    entry = {
+        "claim_hash": h,
+        "verdict": verdict,
+        "evidence": evidence,
+        "verified_at": now,
+        "expires_at": now + timedelta(seconds=CLAIM_CACHE_TTL),
+        "source_media_id": media_id,
+    }
+    before = claims.find_one_and_update(
+        {"claim_hash": h},
+        {"$set": {k: v for k, v in entry.items() if k != "claim_hash"}, "$unset": {"lease": "", "waiters": ""}},
+        upsert=True,
+        projection={"waiters": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    _remember(entry)
+    waiters = [m for m in (before or {}).get("waiters", []) if m != media_id]
+    return entry, waiters
+
+
+# -----------------------------
+# Pipeline hooks
+# -----------------------------
+def verdict_fields(entry):
+    """media_docs fields for a job answered from the cache."""
+    return {
+        "claim.latest_verdict": entry["verdict"],
+        "claim_cache": {
+            "claim_hash": entry["claim_hash"],
+            "verified_at": entry["verified_at"],
+            "source_media_id": entry["source_media_id"],
+        },
+        "evidence": entry["evidence"],
+    }
+
+
+def lookup_stage(media_id):
+    """
+    Body of claim_lookup_cache. Returns the downstream stages to skip
+    (complete_stage(..., skip=...)), or PARKED when the job has to wait.
+    """
+    doc = media_docs.find_one(
+        {"media_id": media_id},
+        {"claim.normalized_text": 1, "normalized_claims": 1, "claim_text": 1},
+    ) or {}
+    text = claim_text_of(doc)
+    if not text:
+        return []
+
+    canonical = canonicalize_claim(text)
+    if not canonical:
+        return []
+    h = claim_hash(canonical)
+    stage_writer.set(media_id, {"claim_hash": h})
+
+    outcome, entry = lookup_or_lease(h, media_id, canonical)
+    if outcome == "hit":
+        print("⚡ Claim cache hit:", h[:12])
+        stage_writer.set(media_id, artifacts.offload(media_id, verdict_fields(entry)))
+        return list(CLAIM_CACHE_SKIPS)
+    if outcome == "wait":
+        print("⏳ Claim already being verified, waiting:", h[:12])
+        stage_writer.flush(media_id)
+        return PARKED
+    return []
+
+
+def publish_verdict(media_id, verdict, evidence, dispatcher_for):
+    """
+    Called by verification_ensemble with the verdict it produced: caches it
+    and resumes every job parked on the same claim. `dispatcher_for(media_ids)`
+    returns {media_id: dispatch} for the executor in use.
+    """
+    doc = media_docs.find_one({"media_id": media_id}, {"claim_hash": 1}) or {}
+    h = doc.get("claim_hash")
+    if not h:
+        return
+    entry, waiters = publish(h, media_id, verdict, evidence)
+    if waiters:
+        resume_waiters(waiters, entry, dispatcher_for(waiters))
+
+
+def resume_waiters(waiters, entry, dispatchers):
+    for waiter in waiters:
+        try:
+            stage_writer.set(waiter, artifacts.offload(waiter, verdict_fields(entry)))
+            complete_stage(waiter, CLAIM_LOOKUP_STAGE, dispatchers[waiter], skip=CLAIM_CACHE_SKIPS)
+        except Exception as e:
+            print("❌ Could not resume job waiting on claim:", waiter, e)
+
+
+# -----------------------------
+# Stalled leases
+# -----------------------------
+def hand_off(h, now=None):
+    """
+    Give the expired lease on `h` to its first waiter; returns that
+    media_id, or None when the lease is live, gone, or has no waiters.
+    """
+    now = now or _now()
+    doc = claims.find_one({"claim_hash": h}, {"lease": 1, "waiters": 1}) or {}
+    lease = doc.get("lease") or {}
+    if not doc.get("waiters") or not lease.get("expires_at") or _aware(lease["expires_at"]) > now:
+        return None
+    waiter = doc["waiters"][0]
+    res = claims.update_one(
+        # the lease may have been taken or published since the read
+        {"claim_hash": h, "lease.owner": lease.get("owner"), "lease.expires_at": {"$lte": now}, "waiters": waiter},
+        {
+            "$set": {"lease": {"owner": waiter, "expires_at": now + timedelta(seconds=CLAIM_LEASE_SECONDS)}},
+            "$pull": {"waiters": waiter},
+        },
+    )
+    return waiter if res.modified_count else None
+
+
+def recover_stalled_claims(dispatcher_for=None):
+    """
+    Promote a waiter on every expired lease that still has waiters. The
+    promoted job's claim_lookup_cache completes as a miss, so it runs
+    retrieval and verification itself, and its publish_verdict resumes the
+    other waiters. Returns the promoted media_ids.
+    """
+    now = _now()
+    stalled = claims.find({"lease.expires_at": {"$lte": now}, "waiters.0": {"$exists": True}}, {"claim_hash": 1})
+    promoted = [m for m in (hand_off(doc["claim_hash"], now) for doc in stalled) if m]
+    _release(promoted, dispatcher_for)
+    return promoted
+
+
+def abandon_lease(h, media_id, dispatcher_for=None):
+    """
+    The leader `media_id` failed: end its lease on `h` now and promote the
+    first waiter without waiting for recover_stalled_claims. Returns the
+    promoted media_id, or None.
+    """
+    now = _now()
+    res = claims.update_one({"claim_hash": h, "lease.owner": media_id}, {"$set": {"lease.expires_at": now}})
+    if not res.modified_count:
+        return None
+    waiter = hand_off(h, now)
+    if waiter:
+        _release([waiter], dispatcher_for)
+    return waiter
+
+
+def _release(promoted, dispatcher_for=None):
+    """Complete the lookup stage of promoted waiters as a miss."""
+    if not promoted:
+        return
+    if dispatcher_for is None:
+        from .executors import get_executor
+
+        dispatcher_for = get_executor().dispatchers
+
+    dispatchers = dispatcher_for(promoted)
+    for media_id in promoted:
+        print("🔁 Claim leader gone, waiter takes over:", media_id)
+        try:
+            complete_stage(media_id, CLAIM_LOOKUP_STAGE, dispatchers[media_id])
+        except Exception as e:
+            print("❌ Could not release promoted claim waiter:", media_id, e)
+
+
+def claim_cache_stats():
+    return {"hot": _hot.stats()}
@@ -0,0 +1,225 @@
+# api/dag.py
+"""
+Dependency-aware scheduling for the verification pipeline.
+
+The planner returns a flat list of stages. Here that list is turned into a
+DAG using the declared dependencies below, and its state is kept on the
+media doc under ``pipeline`` so that any worker can advance it:
+
+    pipeline.stages      planned stages (job_finalize excluded)
+    pipeline.deps        {stage: [upstream stages present in the plan]}
+    pipeline.done        stages that have finished
+    pipeline.dispatched  stages already handed to an executor
+    pipeline.skipped     stages marked done without running (claim cache hit)
+    pipeline.started_at     when the DAG was stored (job latency)
+    pipeline.dispatched_at  {stage: when it was handed over} (queue wait)
+
+Independent branches are dispatched together; job_finalize is the join
+barrier and is only dispatched once every planned stage is done.
+
+Progress is kept apart from ``pipeline`` in a doc-size-independent
+``progress`` field that status reads project on their own:
+
+    progress.total    number of planned stages
+    progress.done     {stage: true} for finished / skipped stages, set by
+                      the same update that stores a stage's results, so
+                      repeated completions cannot over-count
+"""
+from django.utils import timezone
+from pymongo import ReturnDocument
+
+from .mongo import media_docs
+from .writer import stage_writer
+from .events import publish_job_event
+from .cache import invalidate_media
+
+FINALIZE_STAGE = "job_finalize"
+
+# Not plannable: inserted in front of retrieval whenever a claim is
+# verified (see api.claim_cache). A cache hit skips CLAIM_CACHE_SKIPS.
+CLAIM_LOOKUP_STAGE = "claim_lookup_cache"
+CLAIM_CACHE_SKIPS = ["retrieval_semantic_search", "verification_ensemble"]
+
+
+# -----------------------------
+# Declared stage dependencies
+# -----------------------------
+STAGE_DEPENDENCIES = {
+    "extract_frames": [],
+    "transcribe_audio": [],
+    "authenticity_image": [],
+    "authenticity_video": ["extract_frames"],
+    "authenticity_audio": [],
+    "detect_text_ai": [],
+    "claim_extract": ["transcribe_audio"],
+    "claim_normalize": ["claim_extract"],
+    "claim_lookup_cache": ["claim_normalize"],
+    "retrieval_semantic_search": ["claim_lookup_cache"],
+    "verification_ensemble": ["retrieval_semantic_search"],
+    "truthscore_compute": [
+        "verification_ensemble",
+        "authenticity_image",
+        "authenticity_video",
+        "authenticity_audio",
+        "detect_text_ai",
+    ],
+}
+
+
+def _resolve_deps(stage, planned, seen=None):
+    """
+    Upstream stages of `stage` that are actually in the plan. When a declared
+    dependency was not planned we walk through it to its own dependencies, so
+    claim_extract -> retrieval still orders correctly without claim_normalize.
+    """
+    seen = seen if seen is not None else set()
+    resolved = []
+    for dep in STAGE_DEPENDENCIES.get(stage, []):
+        if dep in seen:
+            continue
+        seen.add(dep)
+        if dep in planned:
+            resolved.append(dep)
+        else:
+            resolved.extend(_resolve_deps(dep, planned, seen))
+    return resolved
+
+
+def build_pipeline(steps):
+    """
+    Build the DAG for a plan ({"task": ..., "args": ...} steps).
+    Duplicate stages and the planner's own job_finalize are dropped, and
+    claim_lookup_cache is added when the plan verifies a claim.
+    """
+    stages = []
+    for step in steps:
+        name = step.get("task")
+        if name and name != FINALIZE_STAGE and name not in stages:
+            stages.append(name)
+
+    verifying = [s for s in stages if s in CLAIM_CACHE_SKIPS]
+    if verifying and CLAIM_LOOKUP_STAGE not in stages:
+        stages.insert(stages.index(verifying[0]), CLAIM_LOOKUP_STAGE)
+
+    planned = set(stages)
+    deps = {stage: _resolve_deps(stage, planned) for stage in stages}
+
+    # Kahn's algorithm — also gives us a stable topological order
+    remaining = {stage: set(d) for stage, d in deps.items()}
+    order = []
+    while remaining:
+        ready = [s for s in stages if s in remaining and not remaining[s]]
+        if not ready:
+            raise ValueError(f"Cycle in stage dependencies: {sorted(remaining)}")
+        for stage in ready:
+            order.append(stage)
+            del remaining[stage]
+        for pending in remaining.values():
+            pending.difference_update(ready)
+
+    return {"stages": order, "deps": deps, "done": [], "dispatched": []}
+
+
+def ready_stages(pipeline):
+    """Stages whose dependencies are all done and that were not dispatched yet."""
+    done = set(pipeline.get("done", []))
+    dispatched = set(pipeline.get("dispatched", []))
+    return [
+        stage for stage in pipeline["stages"]
+        if stage not in dispatched and all(d in done for d in pipeline["deps"].get(stage, []))
+    ]
+
+
+def is_complete(pipeline):
+    return set(pipeline["stages"]).issubset(pipeline.get("done", []))
+
+
+def initial_progress(pipeline):
+    return {"total": len(pipeline["stages"]), "done": {}}
+
+
+def progress_percent(progress):
+    """Percent of planned stages done; 100 is reserved for finalize."""
+    if not progress or not progress.get("total"):
+        return 0
+    return min(int(len(progress.get("done") or {}) / progress["total"] * 100), 99)
+
+
+# -----------------------------
+# Mongo-backed coordination
+# -----------------------------
+def _claim(media_id, stage):
+    """
+    Atomically mark `stage` as dispatched. Only one caller wins, so two
+    workers finishing sibling stages at the same time cannot both enqueue
+    the shared downstream stage (or the finalize barrier).
+    """
+    res = media_docs.update_one(
+        {"media_id": media_id, "pipeline.dispatched": {"$ne": stage}},
+        {"$addToSet": {"pipeline.dispatched": stage}, "$set": {f"pipeline.dispatched_at.{stage}": timezone.now()}},
+    )
+    return res.modified_count == 1
+
+
+def _advance(media_id, pipeline, dispatch):
+    for stage in ready_stages(pipeline):
+        if _claim(media_id, stage):
+            dispatch(stage)
+
+    if is_complete(pipeline) and _claim(media_id, FINALIZE_STAGE):
+        dispatch(FINALIZE_STAGE)
+
+
+def start_pipeline(media_id, steps, dispatch):
+    """
+    Store the DAG for a freshly planned job and fan out its root stages.
+    `dispatch(stage)` hands a stage to the executor (Django-Q, Celery, ...).
+    """
+    pipeline = build_pipeline(steps)
+    media_docs.update_one(
+        {"media_id": media_id},
+        {"$set": {
+            "pipeline": {**pipeline, "started_at": timezone.now()},
+            "progress": initial_progress(pipeline),
+            "status": "workflow_started",
+        }},
+    )
+    invalidate_media(media_id)
+    publish_job_event(media_id, "workflow_started", 0)
+    _advance(media_id, pipeline, dispatch)
+    return pipeline
+
+
+def complete_stage(media_id, stage, dispatch, skip=()):
+    """
+    Record that `stage` finished and dispatch whatever it unblocked.
+    Safe to call more than once for the same stage.
+
+    Results the stage buffered in stage_writer ride along in the same
+    update, so marking it done and storing its output is a single write.
+    Stages in `skip` are marked done (and dispatched) without running.
+    """
+    update = {"$addToSet": {"pipeline.done": stage}}
+    if skip:
+        update["$addToSet"] = {
+            "pipeline.done": {"$each": [stage, *skip]},
+            "pipeline.dispatched": {"$each": list(skip)},
+            "pipeline.skipped": {"$each": list(skip)},
+        }
+    update["$set"] = {
+        **stage_writer.take(media_id),
+        **{f"progress.done.{s}": True for s in [stage, *skip]},
+    }
+    doc = media_docs.find_one_and_update(
+        {"media_id": media_id},
+        update,
+        projection={"pipeline": 1, "progress": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    pipeline = (doc or {}).get("pipeline")
+    if not pipeline:
+        return
+    # the stage has written its results by now
+    invalidate_media(media_id)
+    publish_job_event(media_id, "processing", progress_percent(doc.get("progress")), stage=stage)
+    _advance(media_id, pipeline, dispatch)
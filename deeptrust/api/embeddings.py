@@ -0,0 +1,63 @@
+# api/embeddings.py
+"""
+Text embedders for the snippet index.
+
+An embedder is any object with a `name`, a `dim` and
+``embed(texts) -> float32 array of shape (len(texts), dim)``.
+settings.SNIPPET_EMBEDDER picks one by dotted path ("package.module:attr",
+a class or factory called with no arguments); the default is
+HashingEmbedder, which needs no model download.
+"""
+import hashlib
+import importlib
+import re
+import threading
+
+import numpy as np
+from django.conf import settings
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """
+    Signed feature hashing of word unigrams and bigrams, L2-normalized.
+    Lexical only, but deterministic and free; swap in a sentence model
+    through SNIPPET_EMBEDDER for semantic recall.
+    """
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        tokens = _TOKEN.findall(text.casefold())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text or ""):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                out[row, digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                path = getattr(settings, "SNIPPET_EMBEDDER", "")
+                if path:
+                    module, _, attr = path.partition(":")
+                    _embedder = getattr(importlib.import_module(module), attr)()
+                else:
+                    _embedder = HashingEmbedder()
+    return _embedder
@@ -0,0 +1,125 @@
+# api/events.py
+"""
+Job progress pub/sub.
+
+Pipeline code publishes events per media_id; the SSE endpoint subscribes
+and pushes them to the browser. The backend is chosen by
+settings.EVENTS_BACKEND:
+
+    "inprocess"  same-process fan-out only (tests); never sees what the
+                 qcluster / Celery workers publish
+    "redis"      Redis pub/sub at settings.EVENTS_REDIS_URL (workers and
+                 web servers in different processes)
+
+The SSE endpoint only streams when sse_available(): served by an ASGI
+server (uvicorn deeptrust.asgi:application) with the redis backend.
+Under runserver / WSGI, or with "inprocess", pages poll /api/status/.
+"""
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+
+
+def channel_for(media_id):
+    return f"deeptrust:job:{media_id}"
+
+
+def sse_available(request):
+    """
+    Whether /api/events/ can stream to this request: WSGI buffers an async
+    stream and pins a thread on it, and an in-process broker never hears
+    from the workers.
+    """
+    from django.core.handlers.asgi import ASGIRequest
+
+    return isinstance(request, ASGIRequest) and getattr(settings, "EVENTS_BACKEND", "inprocess") == "redis"
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            targets = list(self._subscribers.get(channel, ()))
+        for loop, q in targets:
+            # publishers are usually sync worker threads
+            loop.call_soon_threadsafe(q.put_nowait, event)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                subs = self._subscribers.get(channel)
+                subs.discard(entry)
+                if not subs:
+                    del self._subscribers[channel]
+
+
+class _RedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    async def get(self):
+        while True:
+            message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+            if message and message["type"] == "message":
+                return json.loads(message["data"])
+
+
+class RedisBroker:
+    def __init__(self, url):
+        import redis
+        import redis.asyncio
+
+        self._url = url
+        self._sync = redis.Redis.from_url(url)
+        self._async = redis.asyncio.Redis.from_url(url)
+
+    def publish(self, channel, event):
+        self._sync.publish(channel, json.dumps(event, default=str))
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        pubsub = self._async.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            yield _RedisSubscription(pubsub)
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, "EVENTS_BACKEND", "inprocess")
+                if backend == "redis":
+                    _broker = RedisBroker(settings.EVENTS_REDIS_URL)
+                else:
+                    _broker = InProcessBroker()
+    return _broker
+
+
+def publish_job_event(media_id, status, progress, stage=None):
+    """Best effort: a broker outage must never fail a pipeline stage."""
+    event = {"media_id": media_id, "status": status, "progress": progress, "stage": stage}
+    try:
+        get_broker().publish(channel_for(media_id), event)
+    except Exception as e:
+        print("⚠ Could not publish job event:", e)
@@ -0,0 +1,310 @@
+# api/executors.py
+"""
+Where pipeline stages run.
+
+An executor turns "stage X of job J is ready" into a call to
+api.stages.execute somewhere:
+
+    inline    right here, before dispatch returns (tests, benchmarks)
+    sync      inline within a latency budget, then the configured executor
+              (verify_media with sync=true)
+    thread    a thread pool in this process
+    process   a process pool in this process's host; dispatches made in the
+              child are handed back and re-dispatched by the parent
+    q         Django-Q, through the job's lane (api.lanes)
+    celery    Celery
+
+Stages registered as inline=True (see api.stages) run in the worker that
+unblocked them on every executor, unless STAGE_INLINE_CHEAP is off, so a
+chain of cheap stages costs no queue round trips.
+
+Only Django-Q retries a stage that raises (api.lanes, which calls
+api.qtasks.stage_failed once it gives up); everywhere else, and for
+inline stages, the first error fails the job (stages.fail_job).
+
+settings.STAGE_EXECUTOR picks the executor used by orchestration.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+
+from .dag import FINALIZE_STAGE, start_pipeline
+from .stages import STAGES, execute, fail_job, finalize
+
+
+def _inline_cheap():
+    return getattr(settings, "STAGE_INLINE_CHEAP", True)
+
+
+class Executor:
+    name = "base"
+
+    def submit(self, job_id, media_id, stage):
+        raise NotImplementedError
+
+    def submit_finalize(self, job_id, media_id):
+        raise NotImplementedError
+
+    def dispatcher(self, job_id, media_id):
+        """dispatch(stage) for api.dag."""
+        def dispatch(stage):
+            if stage == FINALIZE_STAGE:
+                self.submit_finalize(job_id, media_id)
+            elif _inline_cheap() and stage in STAGES and STAGES[stage].inline:
+                # the stage that unblocked it is done either way
+                self.run(job_id, media_id, stage)
+            else:
+                self.submit(job_id, media_id, stage)
+        return dispatch
+
+    def run(self, job_id, media_id, stage):
+        """Run a stage (or finalize) here, without retries: an error fails the job."""
+        try:
+            if stage == FINALIZE_STAGE:
+                finalize(job_id, media_id)
+            else:
+                execute(stage, job_id, media_id, self)
+        except Exception as e:
+            fail_job(job_id, media_id, stage, e, self.dispatchers)
+            return False
+        return True
+
+    def dispatchers(self, media_ids):
+        """{media_id: dispatch} for jobs resumed by another job (claim cache waiters)."""
+        from .models import VerificationJob
+
+        job_ids = dict(VerificationJob.objects.filter(media_id__in=media_ids).values_list("media_id", "job_id"))
+        return {m: self.dispatcher(job_ids.get(m), m) for m in media_ids}
+
+
+class InlineExecutor(Executor):
+    name = "inline"
+
+    def submit(self, job_id, media_id, stage):
+        self.run(job_id, media_id, stage)
+
+    def submit_finalize(self, job_id, media_id):
+        self.run(job_id, media_id, FINALIZE_STAGE)
+
+
+class BudgetExecutor(Executor):
+    """
+    Inline until `deadline` (time.perf_counter()), then hands whatever is
+    still undispatched to `fallback`; the DAG state is in Mongo, so the
+    queue picks up exactly where the request stopped.
+    """
+
+    name = "sync"
+
+    def __init__(self, deadline, fallback):
+        self.deadline = deadline
+        self.fallback = fallback
+        self.handed_off = False
+        self.finalized = False
+
+    def dispatcher(self, job_id, media_id):
+        def dispatch(stage):
+            if time.perf_counter() >= self.deadline:
+                self.handed_off = True
+                self.fallback.dispatcher(job_id, media_id)(stage)
+            elif stage == FINALIZE_STAGE:
+                finalize(job_id, media_id)
+                self.finalized = True
+            else:
+                try:
+                    execute(stage, job_id, media_id, self)
+                except Exception as e:
+                    # the queue retries it; the request must not fail the job
+                    print("❌ Inline stage failed, handing off:", stage, e)
+                    self.handed_off = True
+                    self.fallback.dispatcher(job_id, media_id)(stage)
+        return dispatch
+
+    def dispatchers(self, media_ids):
+        # other jobs resumed from here are not on this request's clock
+        return self.fallback.dispatchers(media_ids)
+
+
+class _PooledExecutor(Executor):
+    """Shared bookkeeping for the in-process pools: join() waits for quiescence."""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        self._pending = 0
+        self._idle = threading.Condition()
+
+    def _track(self, future):
+        with self._idle:
+            self._pending += 1
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        error = future.exception()
+        if error:
+            print(f"❌ {self.name} stage failed:", error)
+        with self._idle:
+            self._pending -= 1
+            self._idle.notify_all()
+
+    def join(self, timeout=None):
+        """Wait until nothing is queued or running; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+
+class ThreadExecutor(_PooledExecutor):
+    name = "thread"
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stage")
+        return self._pool
+
+    def submit(self, job_id, media_id, stage):
+        self._track(self._get_pool().submit(self.run, job_id, media_id, stage))
+
+    def submit_finalize(self, job_id, media_id):
+        self._track(self._get_pool().submit(self.run, job_id, media_id, FINALIZE_STAGE))
+
+
+class _RecordingExecutor(Executor):
+    """Stands in for ProcessExecutor inside a pool process: records dispatches for the parent."""
+
+    name = "process"
+
+    def __init__(self):
+        self.calls = []
+
+    def dispatcher(self, job_id, media_id):
+        def dispatch(stage):
+            self.calls.append((job_id, media_id, stage))
+        return dispatch
+
+
+def _execute_in_child(stage, job_id, media_id):
+    from .writer import stage_writer
+
+    recorder = _RecordingExecutor()
+    recorder.run(job_id, media_id, stage)
+    # nothing may stay buffered in a pool process
+    stage_writer.flush()
+    return recorder.calls
+
+
+def _finalize_in_child(job_id, media_id):
+    _RecordingExecutor().run(job_id, media_id, FINALIZE_STAGE)
+    return []
+
+
+class ProcessExecutor(_PooledExecutor):
+    name = "process"
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Celery prefork / Django-Q workers are daemonic and may not fork children
+            if multiprocessing.current_process().daemon:
+                print("⚠ Daemonic worker: process executor falls back to threads")
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stage")
+            else:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("fork"))
+        return self._pool
+
+    def _submit(self, fn, *args):
+        future = self._get_pool().submit(fn, *args)
+        # the child's dispatches are replayed here, before this future counts as done
+        future.add_done_callback(self._replay)
+        self._track(future)
+
+    def _replay(self, future):
+        if future.exception():
+            return
+        for job_id, media_id, stage in future.result():
+            self.dispatcher(job_id, media_id)(stage)
+
+    def submit(self, job_id, media_id, stage):
+        self._submit(_execute_in_child, stage, job_id, media_id)
+
+    def submit_finalize(self, job_id, media_id):
+        self._submit(_finalize_in_child, job_id, media_id)
+
+
+class DjangoQExecutor(Executor):
+    name = "q"
+
+    def __init__(self, route=None):
+        self.route = route
+
+    def _route(self, media_id):
+        from . import lanes
+
+        return self.route or lanes.media_route(media_id)
+
+    def dispatcher(self, job_id, media_id):
+        # one route lookup per dispatcher, however many stages it releases
+        if self.route is None:
+            return DjangoQExecutor(self._route(media_id)).dispatcher(job_id, media_id)
+        return super().dispatcher(job_id, media_id)
+
+    def dispatchers(self, media_ids):
+        base = DjangoQExecutor()
+        return Executor.dispatchers(base, media_ids)
+
+    def submit(self, job_id, media_id, stage):
+        from . import lanes
+
+        lane, user_id = self._route(media_id)
+        lanes.enqueue(lane, user_id, "api.qtasks.run_stage", job_id, media_id, stage, on_failure="api.qtasks.stage_failed")
+
+    def submit_finalize(self, job_id, media_id):
+        from . import lanes
+
+        lane, user_id = self._route(media_id)
+        lanes.enqueue(lane, user_id, "api.qtasks.job_finalize", job_id, media_id, on_failure="api.qtasks.stage_failed")
+
+
+class CeleryExecutor(Executor):
+    name = "celery"
+
+    def submit(self, job_id, media_id, stage):
+        from .tasks import run_stage
+        run_stage.delay(media_id, stage, job_id)
+
+    def submit_finalize(self, job_id, media_id):
+        from .tasks import job_finalize
+        job_finalize.delay({"media_id": media_id, "job_id": job_id})
+
+
+EXECUTORS = {
+    "inline": InlineExecutor,
+    "thread": ThreadExecutor,
+    "process": ProcessExecutor,
+    "q": DjangoQExecutor,
+    "celery": CeleryExecutor,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def run_within_budget(job_id, media_id, steps, budget_seconds):
+    """
+    Run a plan in this thread for up to `budget_seconds`. True when the
+    job finalized in time; otherwise the rest runs on STAGE_EXECUTOR.
+    """
+    executor = BudgetExecutor(time.perf_counter() + budget_seconds, get_executor())
+    start_pipeline(media_id, steps, executor.dispatcher(job_id, media_id))
+    return executor.finalized
+
+
+def get_executor(name=None):
+    """Process-wide executor instance (pools are shared)."""
+    name = name or getattr(settings, "STAGE_EXECUTOR", "q")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = EXECUTORS[name]()
+        return _instances[name]
@@ -0,0 +1,206 @@
+# api/frames.py
+"""
+Keyframe extraction for video jobs.
+
+ffmpeg decodes the video once and only hands over frames at scene
+changes (plus one every FRAME_MAX_GAP seconds, so static shots are still
+sampled), already scaled to FRAME_SIZE. Of those, frames whose dHash is
+within FRAME_DUPLICATE_DISTANCE bits of the last kept frame are dropped,
+and extraction stops at the job's frame budget. One frame is in memory at
+a time.
+
+Kept frames are appended to a raw uint8 file under FRAMES_DIR that
+authenticity_video maps with np.memmap, so scoring reads the frames
+without copying them. The path, count and timestamps live on the media
+doc under `keyframes`. FRAMES_DIR must be shared by the workers that run
+extract_frames and authenticity_video.
+"""
+import os
+import queue
+import re
+import subprocess
+import threading
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+
+from . import minio_client as storage
+from .imagehash import dhash_batch, hamming
+from .phash_index import int_to_phash
+
+FRAME_SIZE = 224
+FRAME_SHAPE = (FRAME_SIZE, FRAME_SIZE, 3)
+FRAME_SCENE_THRESHOLD = 0.3
+FRAME_MAX_GAP = 10.0  # seconds
+FRAME_DUPLICATE_DISTANCE = 6
+DEFAULT_FRAME_BUDGET = 32
+MAX_FRAME_BUDGET = 256
+
+_PTS_TIME = re.compile(rb"pts_time:\s*([-\d.]+)")
+
+
+def frame_budget_for(media_doc):
+    budget = media_doc.get("frame_budget") or getattr(settings, "FRAME_BUDGET", DEFAULT_FRAME_BUDGET)
+    return max(1, min(int(budget), MAX_FRAME_BUDGET))
+
+
+def media_source(media_doc):
+    """Something ffmpeg can open: a local path or a presigned MinIO URL."""
+    path = media_doc.get("minio_path")
+    if not path:
+        return None
+    if path.startswith("local://"):
+        return path[len("local://"):]
+    return storage.get_minio_client().presigned_get_object(storage.BUCKET, path, expires=timedelta(hours=1))
+
+
+# -----------------------------
+# Decoding
+# -----------------------------
+def _drain_timestamps(stderr, out):
+    # showinfo logs one line per selected frame, in output order
+    for line in stderr:
+        match = _PTS_TIME.search(line)
+        if match:
+            out.put(float(match.group(1)))
+    out.put(None)
+
+
+def ffmpeg_frames(source, size=FRAME_SIZE, scene_threshold=FRAME_SCENE_THRESHOLD, max_gap=FRAME_MAX_GAP):
+    """Yield (seconds, (size, size, 3) uint8 frame) for scene-change candidates."""
+    select = f"eq(n\\,0)+gt(scene\\,{scene_threshold})+gte(t-prev_selected_t\\,{max_gap})"
+    vf = (
+        f"select='{select}',showinfo,"
+        f"scale={size}:{size}:force_original_aspect_ratio=decrease,"
+        f"pad={size}:{size}:(ow-iw)/2:(oh-ih)/2"
+    )
+    cmd = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "info",
+        "-i", source, "-an", "-vf", vf, "-fps_mode", "vfr",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1",
+    ]
+    frame_bytes = size * size * 3
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=frame_bytes)
+    timestamps = queue.Queue()
+    threading.Thread(target=_drain_timestamps, args=(proc.stderr, timestamps), daemon=True).start()
+
+    buf = bytearray(frame_bytes)
+    view = memoryview(buf)
+    try:
+        while True:
+            filled = 0
+            while filled < frame_bytes:
+                read = proc.stdout.readinto(view[filled:])
+                if not read:
+                    break
+                filled += read
+            if filled < frame_bytes:
+                break
+            try:
+                ts = timestamps.get(timeout=5)
+            except queue.Empty:
+                ts = None
+            # the buffer is reused for the next frame: consumers copy what they keep
+            yield ts, np.frombuffer(buf, dtype=np.uint8).reshape(size, size, 3)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+
+def sample_keyframes(frames, budget, max_distance=FRAME_DUPLICATE_DISTANCE):
+    """
+    Keep frames that differ from the last kept one by more than
+    `max_distance` dHash bits; stop after `budget`. Yields (ts, frame, dhash).
+    """
+    last = None
+    kept = 0
+    for ts, frame in frames:
+        h = dhash_batch(frame[None])[0]
+        if last is not None and hamming(h, last)[()] <= max_distance:
+            continue
+        last = h
+        kept += 1
+        yield ts, frame, h
+        if kept >= budget:
+            return
+
+
+# -----------------------------
+# Storage
+# -----------------------------
+def _frames_path(media_id):
+    return os.path.join(settings.FRAMES_DIR, f"{media_id}.rgb")
+
+
+def extract_keyframes(media_id, source, budget, frames=None):
+    """Write sampled keyframes for `media_id` and return the `keyframes` doc."""
+    os.makedirs(settings.FRAMES_DIR, exist_ok=True)
+    path = _frames_path(media_id)
+    tmp = path + ".tmp"
+    frames = frames if frames is not None else ffmpeg_frames(source)
+
+    timestamps, hashes = [], []
+    try:
+        with open(tmp, "wb") as fh:
+            for ts, frame, h in sample_keyframes(frames, budget):
+                fh.write(frame.tobytes())
+                timestamps.append(ts)
+                hashes.append(int_to_phash(h))
+    except BaseException:
+        os.remove(tmp)
+        raise
+    finally:
+        close = getattr(frames, "close", None)
+        if close:
+            close()  # stops ffmpeg if the budget ran out first
+    os.replace(tmp, path)
+
+    return {"path": path, "count": len(timestamps), "shape": list(FRAME_SHAPE), "timestamps": timestamps, "dhashes": hashes}
+
+
+def load_keyframes(keyframes):
+    """Read-only (count, H, W, 3) view over the stored frames."""
+    count = keyframes.get("count", 0) if keyframes else 0
+    if not count:
+        return np.empty((0, *FRAME_SHAPE), dtype=np.uint8)
+    return np.memmap(keyframes["path"], dtype=np.uint8, mode="r", shape=(count, *keyframes["shape"]))
+
+
+def discard_keyframes(media_id):
+    try:
+        os.remove(_frames_path(media_id))
+    except OSError:
+        pass
+
+
+# -----------------------------
+# Stage bodies
+# -----------------------------
+def extract_frames_fields(media_doc):
+    """media_docs fields for the extract_frames stage."""
+    source = media_source(media_doc)
+    if not source:
+        return {"frames_extracted": False, "frames_error": "no video source"}
+    try:
+        keyframes = extract_keyframes(media_doc["media_id"], source, frame_budget_for(media_doc))
+    except (OSError, subprocess.SubprocessError) as e:
+        print("❌ Frame extraction failed:", e)
+        return {"frames_extracted": False, "frames_error": str(e)}
+    print(f"🎞 Kept {keyframes['count']} keyframes")
+    return {"frames_extracted": True, "keyframes": keyframes}
+
+
+def score_keyframes(keyframes, score_batch, batch_size=16):
+    """
+    Mean of score_batch(frames) over the stored keyframes, fed as
+    zero-copy slices of the memmap. None when there are no frames.
+    """
+    frames = load_keyframes(keyframes)
+    if not len(frames):
+        return None
+    total = 0.0
+    for start in range(0, len(frames), batch_size):
+        total += float(np.sum(score_batch(frames[start:start + batch_size])))
+    return total / len(frames)
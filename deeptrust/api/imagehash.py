@@ -0,0 +1,133 @@
+# api/imagehash.py
+"""
+Perceptual hashes computed over whole batches with NumPy.
+
+Images are uint8 arrays shaped (N, H, W, 3) or (N, H, W); every hash is
+returned as one uint64 per image, stored as 16-char hex like phash
+(see api.phash_index). Only decoding touches images one at a time
+(Pillow, in decode_images); resizing, the DCT and thresholding run on the
+whole batch.
+"""
+import numpy as np
+
+from .phash_index import int_to_phash, popcount64
+
+HASH_SIZE = 8
+PHASH_SIZE = 32   # pHash takes the low 8x8 DCT frequencies of a 32x32 image
+DECODE_SIZE = 64  # images are decoded straight to this gray square
+
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def to_gray(batch):
+    batch = np.asarray(batch)
+    if batch.ndim == 4:
+        return batch.astype(np.float32) @ _LUMA
+    return batch.astype(np.float32)
+
+
+def resize_area(gray, height, width):
+    """Box-filter downscale of (N, H, W) to (N, height, width); nearest when upscaling."""
+    n, h, w = gray.shape
+    if h >= height:
+        rows = (np.arange(height) * h) // height
+        gray = np.add.reduceat(gray, rows, axis=1) / np.diff(np.append(rows, h))[None, :, None]
+    else:
+        gray = gray[:, (np.arange(height) * h) // height]
+    if w >= width:
+        cols = (np.arange(width) * w) // width
+        gray = np.add.reduceat(gray, cols, axis=2) / np.diff(np.append(cols, w))[None, None, :]
+    else:
+        gray = gray[:, :, (np.arange(width) * w) // width]
+    return gray
+
+
+def pack_bits(bits):
+    """(N, 64) booleans -> (N,) uint64, first bit most significant."""
+    return np.packbits(bits.reshape(len(bits), 64), axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis; row k is frequency k."""
+    k = np.arange(n)[:, None]
+    basis = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+
+_DCT_LOW = _dct_matrix(PHASH_SIZE)[:HASH_SIZE]
+
+
+def ahash_batch(batch):
+    """Average hash: is each pixel of the 8x8 thumbnail above the mean."""
+    gray = resize_area(to_gray(batch), HASH_SIZE, HASH_SIZE)
+    return pack_bits(gray > gray.mean(axis=(1, 2), keepdims=True))
+
+
+def phash_batch(batch):
+    """DCT hash: low-frequency coefficients above their median (DC excluded from the median)."""
+    gray = resize_area(to_gray(batch), PHASH_SIZE, PHASH_SIZE)
+    coeffs = (_DCT_LOW @ gray @ _DCT_LOW.T).reshape(len(gray), HASH_SIZE * HASH_SIZE)
+    return pack_bits(coeffs > np.median(coeffs[:, 1:], axis=1, keepdims=True))
+
+
+def dhash_batch(batch):
+    """Difference hash: is each pixel brighter than its right neighbour (8x9 grid)."""
+    gray = resize_area(to_gray(batch), 8, 9)
+    return pack_bits(gray[:, :, 1:] > gray[:, :, :-1])
+
+
+def hamming(a, b):
+    return popcount64(np.asarray(a, dtype=np.uint64) ^ np.asarray(b, dtype=np.uint64))
+
+
+def decode_images(sources, size=DECODE_SIZE):
+    """
+    Decode paths / file objects into a (N, size, size) uint8 gray batch.
+    JPEGs are decoded at reduced scale (draft mode). Returns (batch, ok)
+    where ok[i] is False for anything Pillow could not read.
+    """
+    from PIL import Image
+
+    batch = np.zeros((len(sources), size, size), dtype=np.uint8)
+    ok = np.zeros(len(sources), dtype=bool)
+    for i, source in enumerate(sources):
+        try:
+            with Image.open(source) as img:
+                img.draft("L", (size, size))
+                batch[i] = np.asarray(img.convert("L").resize((size, size), Image.BOX))
+                ok[i] = True
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print("⚠ Could not decode image:", e)
+    return batch, ok
+
+
+def hash_images(sources):
+    """{"phash", "dhash", "ahash"}: hex strings per source (None if undecodable)."""
+    batch, ok = decode_images(sources)
+    hashes = {"phash": phash_batch(batch), "dhash": dhash_batch(batch), "ahash": ahash_batch(batch)}
+    return {
+        name: [int_to_phash(v) if good else None for v, good in zip(values, ok)]
+        for name, values in hashes.items()
+    }
+
+
+# -----------------------------
+# Stage bodies
+# -----------------------------
+def image_hash_fields(media_doc):
+    """media_docs fields (phash, dhash, ahash) for a stored image upload; {} if unreadable."""
+    from .uploads import open_upload
+
+    path = (media_doc or {}).get("minio_path")
+    if not path:
+        return {}
+    try:
+        with open_upload(path) as fh:
+            hashes = hash_images([fh])
+    except Exception as e:
+        print("⚠ Could not hash image:", e)
+        return {}
+    if hashes["phash"][0] is None:
+        return {}
+    return {name: values[0] for name, values in hashes.items()}
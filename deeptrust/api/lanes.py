@@ -0,0 +1,234 @@
+# api/lanes.py
+"""
+Priority lanes for Django-Q work.
+
+Every lane is its own Django-Q cluster (settings.Q_CLUSTER["ALT_CLUSTERS"],
+one `qcluster` per lane), so a lane's worker share is its cluster's
+`workers` and a saturated heavy lane cannot delay interactive work:
+
+    interactive   text-only jobs and anything without a file
+    image         image jobs
+    heavy         video / audio jobs
+    planning      orchestrate_job (the LLM task plan)
+
+Work is not put on the Django-Q queue directly. enqueue() stores the call
+in Mongo `lane_queue` and queues a run_next token on the lane's cluster;
+whichever worker picks up a token runs the most deserving queued call at
+that moment, not necessarily the one that queued the token:
+
+  1. anything queued for more than LANE_PROMOTE_AFTER seconds, oldest
+     first (age promotion), or running past LANE_LEASE_SECONDS
+     (a worker died holding it)
+  2. otherwise the oldest call of the user with the lowest virtual time
+     in that lane (start-time fair queueing): serving a call advances the
+     user's virtual time by cost / weight, and a user coming back idle
+     starts at the lane's clock, so nobody banks credit while away.
+
+Weights live on `lane_users` ({_id: "<lane>:<user_id>", weight}) and
+default to 1.
+
+A call is removed from `lane_queue` only once it returns. One that raises
+(or whose worker died) is queued again until it has been tried
+LANE_MAX_ATTEMPTS times; after that it stays in the queue as
+state "failed" with its last error, for inspection or a manual retry,
+and its `on_failure` hook (if any) is called with the same args plus
+error=.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from django_q.tasks import async_task
+from pymongo import ReturnDocument
+
+from .metrics import LANE_WAIT_SECONDS
+from .mongo import lane_queue, lane_users
+
+INTERACTIVE_LANE = "interactive"
+IMAGE_LANE = "image"
+HEAVY_LANE = "heavy"
+PLANNING_LANE = "planning"
+
+LANE_BY_FILE_TYPE = {
+    "text": INTERACTIVE_LANE,
+    "image": IMAGE_LANE,
+    "video": HEAVY_LANE,
+    "audio": HEAVY_LANE,
+}
+
+LANE_PROMOTE_AFTER = 60   # seconds
+LANE_LEASE_SECONDS = 900  # a running call older than this is handed out again
+LANE_MAX_ATTEMPTS = 3
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _aware(value):
+    # pymongo hands datetimes back naive (UTC)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def lane_for(file_type):
+    return LANE_BY_FILE_TYPE.get(file_type, INTERACTIVE_LANE)
+
+
+def lane_cluster(lane):
+    """Django-Q cluster (and ORM queue) name for a lane."""
+    return f"{settings.Q_CLUSTER['name']}-{lane}"
+
+
+def media_route(media_id):
+    """(lane, user_id) for the stages of a media doc."""
+    from .mongo import media_docs
+
+    doc = media_docs.find_one({"media_id": media_id}, {"file_type": 1, "user_id": 1}) or {}
+    return lane_for(doc.get("file_type")), doc.get("user_id")
+
+
+# -----------------------------
+# Producer side
+# -----------------------------
+def enqueue(lane, user_id, func, *args, cost=1.0, on_failure=None):
+    """Queue `func` (dotted path) with `args` on `lane` for `user_id`."""
+    lane_queue.insert_one({
+        "lane": lane,
+        "user_id": str(user_id) if user_id is not None else None,
+        "func": func,
+        "args": list(args),
+        "cost": cost,
+        "on_failure": on_failure,
+        "state": "queued",
+        "enqueued_at": _now(),
+    })
+    async_task("api.lanes.run_next", lane, cluster=lane_cluster(lane))
+
+
+# -----------------------------
+# Consumer side
+# -----------------------------
+def _claim(query, sort):
+    return lane_queue.find_one_and_update(
+        query,
+        {"$set": {"state": "running", "started_at": _now()}, "$inc": {"attempts": 1}},
+        sort=sort,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _promote_after():
+    return getattr(settings, "LANE_PROMOTE_AFTER", LANE_PROMOTE_AFTER)
+
+
+def _claim_overdue(lane, now):
+    promoted = now - timedelta(seconds=_promote_after())
+    stale = now - timedelta(seconds=LANE_LEASE_SECONDS)
+    return _claim(
+        {"lane": lane, "$or": [
+            {"state": "queued", "enqueued_at": {"$lte": promoted}},
+            {"state": "running", "started_at": {"$lte": stale}},
+        ]},
+        [("enqueued_at", 1)],
+    )
+
+
+def _claim_fair(lane):
+    users = lane_queue.distinct("user_id", {"lane": lane, "state": "queued"})
+    if not users:
+        return None
+    vtimes = {
+        doc["_id"].split(":", 1)[1]: doc.get("vtime", 0.0)
+        for doc in lane_users.find({"_id": {"$in": [f"{lane}:{u}" for u in users]}}, {"vtime": 1})
+    }
+    # another worker may empty a user's queue between distinct() and the claim
+    for user_id in sorted(users, key=lambda u: vtimes.get(str(u), 0.0)):
+        item = _claim({"lane": lane, "state": "queued", "user_id": user_id}, [("enqueued_at", 1)])
+        if item:
+            return item
+    return None
+
+
+def _charge(item):
+    """Advance the user's virtual time and the lane clock for a served call."""
+    lane = item["lane"]
+    clock = lane_users.find_one_and_update(
+        {"_id": f"{lane}:__clock__"}, {"$setOnInsert": {"vtime": 0.0}},
+        upsert=True, return_document=ReturnDocument.AFTER,
+    )["vtime"]
+    user = lane_users.find_one({"_id": f"{lane}:{item['user_id']}"}) or {}
+    start = max(user.get("vtime", 0.0), clock)
+    lane_users.update_one(
+        {"_id": f"{lane}:{item['user_id']}"},
+        {"$set": {"vtime": start + item.get("cost", 1.0) / user.get("weight", 1.0)}},
+        upsert=True,
+    )
+    lane_users.update_one({"_id": f"{lane}:__clock__"}, {"$max": {"vtime": start}})
+
+
+def claim_next(lane):
+    now = _now()
+    item = _claim_overdue(lane, now) or _claim_fair(lane)
+    if item:
+        _charge(item)
+    return item
+
+
+def run_next(lane):
+    """Django-Q token: run the most deserving queued call in `lane`."""
+    item = claim_next(lane)
+    if not item:
+        return False
+    waited = (_aware(item["started_at"]) - _aware(item["enqueued_at"])).total_seconds()
+    LANE_WAIT_SECONDS.observe(waited, lane=lane)
+    print(f"🚦 [{lane}] {item['func']} for user {item['user_id']} after {waited:.2f}s")
+    if item["attempts"] > LANE_MAX_ATTEMPTS:
+        # only a worker dying mid-call gets here: its lease expired
+        _fail(item, item.get("last_error") or "worker died while running it")
+        return True
+    start = time.perf_counter()
+    try:
+        import_string(item["func"])(*item["args"])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if item["attempts"] >= LANE_MAX_ATTEMPTS:
+            _fail(item, error)
+        else:
+            print(f"↻ [{lane}] {item['func']} failed (attempt {item['attempts']}), requeued: {error}")
+            lane_queue.update_one(
+                {"_id": item["_id"]},
+                {"$set": {"state": "queued", "last_error": error}, "$unset": {"started_at": ""}},
+            )
+            async_task("api.lanes.run_next", lane, cluster=lane_cluster(lane))
+        raise
+    lane_queue.delete_one({"_id": item["_id"]})
+    print(f"🚦 [{lane}] {item['func']} done in {time.perf_counter() - start:.2f}s")
+    return True
+
+
+def _fail(item, error):
+    print(f"❌ [{item['lane']}] {item['func']} failed after {item['attempts']} attempts: {error}")
+    lane_queue.update_one(
+        {"_id": item["_id"]},
+        {"$set": {"state": "failed", "last_error": error, "failed_at": _now()}},
+    )
+    if item.get("on_failure"):
+        try:
+            import_string(item["on_failure"])(*item["args"], error=error)
+        except Exception as e:
+            print(f"❌ [{item['lane']}] on_failure {item['on_failure']} failed:", e)
+
+
+def lane_stats():
+    """Queued / running / failed counts and oldest wait per lane."""
+    now = _now()
+    stats = {}
+    for row in lane_queue.aggregate([
+        {"$group": {"_id": {"lane": "$lane", "state": "$state"}, "count": {"$sum": 1}, "oldest": {"$min": "$enqueued_at"}}},
+    ]):
+        lane = stats.setdefault(row["_id"]["lane"], {"queued": 0, "running": 0, "failed": 0, "oldest_wait_s": 0.0})
+        lane[row["_id"]["state"]] = row["count"]
+        if row["_id"]["state"] == "queued" and row["oldest"]:
+            lane["oldest_wait_s"] = round((now - _aware(row["oldest"])).total_seconds(), 3)
+    return stats
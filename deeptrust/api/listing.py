@@ -0,0 +1,71 @@
+# api/listing.py
+"""
+Keyset-paginated job listing shared by the dashboard and /api/jobs/.
+
+Pages are ordered by (created_at, id) descending and served from the
+(user, -created_at, -id) index; the cursor is the last row of the previous
+page, so page N costs the same as page 1. Status and truthscore for the
+whole page come from a single $in query on media_docs.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+from .models import VerificationJob
+from .mongo import media_docs
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(job):
+    raw = f"{job.created_at.isoformat()}|{job.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def list_user_jobs(user, cursor=None, limit=PAGE_SIZE):
+    """One page of the user's jobs, newest first: (jobs, next_cursor)."""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    qs = VerificationJob.objects.filter(user=user)
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    page = list(
+        qs.order_by("-created_at", "-id")
+        .only("id", "job_id", "media_id", "status", "created_at")[:limit + 1]
+    )
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    page = page[:limit]
+
+    docs = {
+        doc["media_id"]: doc
+        for doc in media_docs.find(
+            {"media_id": {"$in": [job.media_id for job in page]}},
+            {"_id": 0, "media_id": 1, "status": 1, "truthscore": 1},
+        )
+    } if page else {}
+
+    jobs = []
+    for job in page:
+        media_doc = docs.get(job.media_id, {})
+        jobs.append({
+            "job_id": job.job_id,
+            "media_id": job.media_id,
+            "status": media_doc.get("status", "processing"),
+            "truthscore": media_doc.get("truthscore", None),
+            "created_at": job.created_at,
+        })
+    return jobs, next_cursor
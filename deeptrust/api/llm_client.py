@@ -0,0 +1,226 @@
+# api/llm_client.py
+"""
+Shared OpenRouter client.
+
+One client per process: keep-alive connection pool, connect/read timeouts,
+jittered exponential backoff on 429/5xx, a process-wide concurrency limit
+and a circuit breaker. When the breaker is open (or no slot frees up in
+time) calls fail fast with LLMUnavailable so the caller can degrade
+instead of pinning a worker.
+
+The HTTP layer is a pluggable transport: any callable
+``transport(url, headers, payload, timeout) -> (status, headers, text)``.
+"""
+import os
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3.05"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "20"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_ACQUIRE_TIMEOUT = float(os.getenv("LLM_ACQUIRE_TIMEOUT", "10"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """The LLM call failed and should not be retried."""
+
+
+class LLMUnavailable(LLMError):
+    """The LLM is unreachable, overloaded or the circuit is open."""
+
+
+# -----------------------------
+# Circuit breaker
+# -----------------------------
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures; after
+    `reset_timeout` seconds a single trial call is let through (half-open)
+    and its outcome closes or re-opens the circuit. A trial that ends
+    without either (an unexpected exception) frees the slot in end_call(),
+    so the next call becomes the trial.
+    """
+
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, reset_timeout=LLM_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_thread = None  # thread running the half-open trial
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and self._trial_thread is None:
+                self._trial_thread = threading.get_ident()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_thread = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_thread = None
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    def end_call(self):
+        """Called when an allowed call returns or raises, whatever happened."""
+        with self._lock:
+            if self._trial_thread == threading.get_ident():
+                self._trial_thread = None
+
+
+# -----------------------------
+# Transports
+# -----------------------------
+class RequestsTransport:
+    """Default transport: a pooled, keep-alive requests.Session."""
+
+    def __init__(self, pool_size=LLM_MAX_CONCURRENCY):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def __call__(self, url, headers, payload, timeout):
+        resp = self.session.post(url, headers=headers, json=payload, timeout=timeout)
+        return resp.status_code, resp.headers, resp.text
+
+
+# -----------------------------
+# Client
+# -----------------------------
+class OpenRouterClient:
+    def __init__(
+        self,
+        url,
+        api_key,
+        transport=None,
+        connect_timeout=LLM_CONNECT_TIMEOUT,
+        read_timeout=LLM_READ_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+        backoff_base=LLM_BACKOFF_BASE,
+        backoff_max=LLM_BACKOFF_MAX,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        acquire_timeout=LLM_ACQUIRE_TIMEOUT,
+        breaker=None,
+    ):
+        self.url = url
+        self.api_key = api_key
+        self.transport = transport or RequestsTransport(pool_size=max_concurrency)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.acquire_timeout = acquire_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _backoff(self, attempt, retry_after=None):
+        # Full jitter; a server-provided Retry-After wins if it is sane
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, payload):
+        """POST `payload` and return the decoded JSON body."""
+        if not self.api_key:
+            raise ValueError("❌ OPENROUTER_API_KEY is missing. Set it in environment variables.")
+
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise LLMUnavailable("No free OpenRouter slot")
+
+        if not self.breaker.allow():
+            self._slots.release()
+            raise LLMUnavailable("OpenRouter circuit is open")
+
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+        try:
+            last_error = None
+            for attempt in range(self.max_retries + 1):
+                retry_after = None
+                try:
+                    status, resp_headers, text = self.transport(self.url, headers, payload, self.timeout)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    last_error = e
+                else:
+                    if status == 200:
+                        self.breaker.record_success()
+                        return json.loads(text)
+
+                    if status not in RETRY_STATUSES:
+                        # Client errors are ours to fix; the upstream is healthy
+                        self.breaker.record_success()
+                        print("\n🔥 OpenRouter API Error")
+                        print("Status:", status)
+                        print("Response:", text)
+                        raise LLMError(f"OpenRouter returned {status}")
+
+                    last_error = LLMUnavailable(f"OpenRouter returned {status}")
+                    retry_after = (resp_headers or {}).get("Retry-After")
+
+                if attempt < self.max_retries:
+                    time.sleep(self._backoff(attempt, retry_after))
+
+            self.breaker.record_failure()
+            raise LLMUnavailable(f"OpenRouter failed after {self.max_retries + 1} attempts: {last_error}")
+        finally:
+            self.breaker.end_call()
+            self._slots.release()
+
+    def chat(self, model, messages):
+        try:
+            data = self.post({"model": model, "messages": messages})
+            return data["choices"][0]["message"]["content"]
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError) as e:
+            raise LLMError(f"Malformed OpenRouter response: {e}")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_openrouter_client(url, api_key):
+    """Process-wide client, created on first use with the given settings."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenRouterClient(url, api_key)
+    return _client
@@ -0,0 +1,98 @@
+# api/management/commands/backfill_phash.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pymongo import UpdateOne
+
+from api.imagehash import hash_images
+from api.mongo import checkpoints, media_docs
+from api.uploads import open_upload
+
+CHECKPOINT_ID = "backfill_phash"
+
+
+def _open(media_doc):
+    try:
+        return open_upload(media_doc["minio_path"])
+    except Exception as e:
+        print("⚠ Could not read", media_doc["media_id"], e)
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute phash for image media_docs that have none, in streaming batches. "
+        "Progress is checkpointed by _id, so an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=256)
+        parser.add_argument("--readers", type=int, default=8, help="Threads fetching files from storage.")
+        parser.add_argument("--limit", type=int, default=None, help="Stop after this many docs.")
+        parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint.")
+
+    def handle(self, *args, **options):
+        if options["restart"]:
+            checkpoints.delete_one({"_id": CHECKPOINT_ID})
+        state = checkpoints.find_one({"_id": CHECKPOINT_ID}) or {"processed": 0, "hashed": 0, "failed": 0}
+
+        query = {"file_type": "image", "phash": None, "minio_path": {"$ne": None}}
+        if state.get("last_id") is not None:
+            query["_id"] = {"$gt": state["last_id"]}
+            self.stdout.write(f"↻ Resuming after {state['last_id']} ({state['processed']} done)")
+
+        cursor = media_docs.find(query, {"media_id": 1, "minio_path": 1}).sort("_id", 1).batch_size(options["batch_size"])
+        if options["limit"]:
+            cursor = cursor.limit(options["limit"])
+
+        start = time.perf_counter()
+        processed = 0
+        with ThreadPoolExecutor(max_workers=options["readers"]) as readers:
+            batch = []
+            for doc in cursor:
+                batch.append(doc)
+                if len(batch) == options["batch_size"]:
+                    processed += self._run_batch(batch, readers, state)
+                    batch = []
+            if batch:
+                processed += self._run_batch(batch, readers, state)
+
+        elapsed = time.perf_counter() - start
+        rate = processed / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f"✔ {processed} docs in {elapsed:.1f}s ({rate:.0f}/s); "
+            f"total hashed {state['hashed']}, failed {state['failed']}"
+        )
+
+    def _run_batch(self, batch, readers, state):
+        files = list(readers.map(_open, batch))
+        readable = [(doc, f) for doc, f in zip(batch, files) if f is not None]
+        try:
+            hashes = hash_images([f for _, f in readable])["phash"] if readable else []
+        finally:
+            for _, f in readable:
+                f.close()
+
+        # phash_at lets running processes pull these into their phash index
+        hashed_at = timezone.now()
+        ops = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"phash": h, "phash_at": hashed_at}})
+            for (doc, _), h in zip(readable, hashes) if h
+        ]
+        if ops:
+            media_docs.bulk_write(ops, ordered=False)
+
+        # unreadable docs keep phash None; the checkpoint moves past them
+        state["processed"] += len(batch)
+        state["hashed"] += len(ops)
+        state["failed"] += len(batch) - len(ops)
+        state["last_id"] = batch[-1]["_id"]
+        checkpoints.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {**state, "updated_at": timezone.now()}},
+            upsert=True,
+        )
+        self.stdout.write(f"… {state['processed']} processed, last {batch[-1]['media_id']}")
+        return len(batch)
@@ -0,0 +1,28 @@
+# api/management/commands/build_snippet_index.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.vector_index import EXACT_MAX_ROWS, open_snippet_index, sync_snippets
+
+
+class Command(BaseCommand):
+    help = "Embed new snippets into the vector index and (re)train its IVF-PQ layer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--train", action="store_true", help="Retrain even if the index is already trained.")
+        parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default: sqrt(rows)).")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        index = open_snippet_index()
+
+        start = time.perf_counter()
+        added = sync_snippets(index, batch_size=options["batch_size"])
+        self.stdout.write(f"📥 Appended {added} snippets ({len(index)} total) in {time.perf_counter() - start:.1f}s")
+
+        # small corpora are searched exactly; IVF-PQ only pays off past EXACT_MAX_ROWS
+        if options["train"] or (not index.trained and len(index) > EXACT_MAX_ROWS):
+            start = time.perf_counter()
+            index.train(nlist=options["nlist"])
+            self.stdout.write(f"🧭 Trained {len(index.centroids)} lists in {time.perf_counter() - start:.1f}s")
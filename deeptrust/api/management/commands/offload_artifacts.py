@@ -0,0 +1,78 @@
+# api/management/commands/offload_artifacts.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pymongo import UpdateOne
+
+from api import artifacts
+from api.mongo import checkpoints, media_docs
+
+CHECKPOINT_ID = "offload_artifacts"
+
+
+class Command(BaseCommand):
+    help = (
+        "Move transcripts, keyframes and evidence still stored inline on media_docs into the "
+        "artifacts collection. Progress is checkpointed by _id, so an interrupted run resumes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--limit", type=int, default=None, help="Stop after this many docs.")
+        parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint.")
+
+    def handle(self, *args, **options):
+        if options["restart"]:
+            checkpoints.delete_one({"_id": CHECKPOINT_ID})
+        state = checkpoints.find_one({"_id": CHECKPOINT_ID}) or {"processed": 0, "moved": 0}
+
+        inline = [*artifacts.KIND_OF, "verification.evidence"]
+        query = {"$or": [{field: {"$exists": True}} for field in inline]}
+        if state.get("last_id") is not None:
+            query["_id"] = {"$gt": state["last_id"]}
+            self.stdout.write(f"↻ Resuming after {state['last_id']} ({state['processed']} done)")
+
+        projection = {"media_id": 1, **{field: 1 for field in inline}}
+        cursor = media_docs.find(query, projection).sort("_id", 1).batch_size(options["batch_size"])
+        if options["limit"]:
+            cursor = cursor.limit(options["limit"])
+
+        start = time.perf_counter()
+        processed = 0
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) == options["batch_size"]:
+                processed += self._run_batch(batch, state)
+                batch = []
+        if batch:
+            processed += self._run_batch(batch, state)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"✔ {processed} docs in {elapsed:.1f}s; {state['moved']} artifacts moved in total")
+
+    def _run_batch(self, batch, state):
+        ops = []
+        for doc in batch:
+            verification = doc.pop("verification", None) or {}
+            if "evidence" not in doc and "evidence" in verification:
+                doc["evidence"] = verification["evidence"]
+            fields = {k: v for k, v in doc.items() if k in artifacts.KIND_OF}
+            markers = artifacts.offload(doc["media_id"], fields)
+            state["moved"] += len(markers)
+            ops.append(UpdateOne({"_id": doc["_id"]}, {
+                "$set": markers,
+                "$unset": {field: "" for field in [*fields, "verification.evidence"]},
+            }))
+        media_docs.bulk_write(ops, ordered=False)
+
+        state["processed"] += len(batch)
+        state["last_id"] = batch[-1]["_id"]
+        checkpoints.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {**state, "updated_at": timezone.now()}},
+            upsert=True,
+        )
+        self.stdout.write(f"… {state['processed']} processed, last {batch[-1]['media_id']}")
+        return len(batch)
@@ -0,0 +1,51 @@
+# api/management/commands/provision.py
+import time
+
+from django.core.management.base import BaseCommand
+from django_q.models import Schedule
+
+from api.lanes import PLANNING_LANE, lane_cluster
+from api.minio_client import BUCKET, DEVELOPMENT_MODE, ensure_bucket
+from api.mongo import ensure_indexes
+
+# periodic Django-Q tasks, run by the planning lane's cluster
+# (Celery deployments run the same functions from beat)
+SCHEDULES = [
+    # hands claim leases of failed / dead leaders to a waiting job
+    {"name": "recover_stalled_claims", "func": "api.claim_cache.recover_stalled_claims", "minutes": 1},
+    # embeds new snippets into the vector index; retrieval only reads it
+    {"name": "sync_snippet_index", "func": "api.vector_index.sync_snippet_index", "minutes": 1},
+]
+
+
+def ensure_schedules():
+    for entry in SCHEDULES:
+        Schedule.objects.update_or_create(name=entry["name"], defaults={
+            "func": entry["func"],
+            "schedule_type": Schedule.MINUTES,
+            "minutes": entry["minutes"],
+            "repeats": -1,
+            "cluster": lane_cluster(PLANNING_LANE),
+        })
+    return [entry["name"] for entry in SCHEDULES]
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the Mongo indexes, the Django-Q schedules and the MinIO bucket "
+        "(idempotent; run on deploy, not at import)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--skip-minio", action="store_true", help="Only provision Mongo.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        names = ensure_indexes()
+        self.stdout.write(f"🗂 {len(names)} Mongo indexes in place ({time.perf_counter() - start:.1f}s)")
+        self.stdout.write(f"⏰ Schedules in place: {', '.join(ensure_schedules())}")
+
+        if options["skip_minio"] or DEVELOPMENT_MODE:
+            return
+        created = ensure_bucket()
+        self.stdout.write(f"🪣 Bucket {BUCKET} {'created' if created else 'already exists'}")
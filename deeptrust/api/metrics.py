@@ -0,0 +1,297 @@
+# api/metrics.py
+"""
+In-process latency metrics with a Prometheus text endpoint.
+
+Histograms and counters are plain dicts of label tuple -> bucket counts
+behind one lock per metric; recording is a bisect and a few additions.
+Nothing here talks to the network on the hot path.
+
+Web processes, Django-Q / Celery workers and pool processes each keep
+their own values. With settings.METRICS_DIR set, every process writes a
+snapshot to METRICS_DIR/<pid>.json every METRICS_FLUSH_SECONDS (and at
+exit), and /metrics serves the sum over all snapshots, so stage timings
+recorded by workers show up on the web scrape. Without it /metrics only
+shows the serving process.
+
+What is recorded:
+
+    deeptrust_http_request_seconds       per route/method/status (MetricsMiddleware)
+    deeptrust_http_db_ops                Mongo commands per request
+    deeptrust_stage_seconds              stage run time, per stage/executor/outcome
+    deeptrust_stage_queue_wait_seconds   dispatch -> start, per stage/executor
+    deeptrust_lane_wait_seconds          lane_queue wait, per lane
+    deeptrust_planner_seconds            generate_task_plan, per source/outcome
+    deeptrust_plan_cache_lookups_total   chief plan cache, per tier (local/shared) and outcome
+    deeptrust_mongo_command_seconds      every Mongo command (MongoCommandTimer)
+    deeptrust_job_seconds                pipeline start -> finalize, per file_type
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+METRICS_FLUSH_SECONDS = 5
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[i] += 1
+            row[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {"|".join(k): list(v) for k, v in self._values.items()}
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter:
+    def __init__(self, name, help, labelnames):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {"|".join(k): v for k, v in self._values.items()}
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+HTTP_SECONDS = _register(Histogram(
+    "deeptrust_http_request_seconds", "API request latency.", ["route", "method", "status"]))
+HTTP_DB_OPS = _register(Histogram(
+    "deeptrust_http_db_ops", "Mongo commands issued per API request.", ["route", "method"], COUNT_BUCKETS))
+STAGE_SECONDS = _register(Histogram(
+    "deeptrust_stage_seconds", "Pipeline stage run time.", ["stage", "executor", "outcome"]))
+STAGE_WAIT_SECONDS = _register(Histogram(
+    "deeptrust_stage_queue_wait_seconds", "Time from dispatch to start of a stage.", ["stage", "executor"]))
+LANE_WAIT_SECONDS = _register(Histogram(
+    "deeptrust_lane_wait_seconds", "Time a call waited in lane_queue.", ["lane"]))
+PLANNER_SECONDS = _register(Histogram(
+    "deeptrust_planner_seconds", "generate_task_plan latency.", ["source", "outcome"]))
+MONGO_SECONDS = _register(Histogram(
+    "deeptrust_mongo_command_seconds", "Mongo command latency.", ["command", "outcome"]))
+JOB_SECONDS = _register(Histogram(
+    "deeptrust_job_seconds", "Pipeline start to finalize.", ["file_type"]))
+JOBS_FINALIZED = _register(Counter(
+    "deeptrust_jobs_finalized_total", "Jobs finalized.", ["file_type"]))
+PLAN_CACHE_LOOKUPS = _register(Counter(
+    "deeptrust_plan_cache_lookups_total", "Chief plan cache lookups.", ["tier", "outcome"]))
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Observe the block's duration with outcome="ok" / "error" (when the histogram has that label)."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        if "outcome" in histogram.labelnames:
+            labels["outcome"] = outcome
+        histogram.observe(time.perf_counter() - start, **labels)
+        _ensure_flusher()
+
+
+# -----------------------------
+# Mongo commands
+# -----------------------------
+_local = threading.local()
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Command latency from the driver's own timings, plus a per-thread op count."""
+
+    def started(self, event):
+        _local.db_ops = getattr(_local, "db_ops", 0) + 1
+
+    def succeeded(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome="ok")
+
+    def failed(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome="error")
+
+
+def db_ops():
+    """Mongo commands issued by this thread so far."""
+    return getattr(_local, "db_ops", 0)
+
+
+# -----------------------------
+# Cross-process snapshots
+# -----------------------------
+_owner_pid = None
+_flush_lock = threading.Lock()
+
+
+def _metrics_dir():
+    return getattr(settings, "METRICS_DIR", "")
+
+
+def write_snapshot():
+    directory = _metrics_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    data = {m.name: m.snapshot() for m in REGISTRY}
+    with open(path + ".tmp", "w") as fh:
+        json.dump(data, fh)
+    os.replace(path + ".tmp", path)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            write_snapshot()
+        except OSError as e:
+            print("⚠ Could not write metrics snapshot:", e)
+
+
+def _ensure_flusher():
+    global _owner_pid
+    if _owner_pid == os.getpid() or not _metrics_dir():
+        return
+    with _flush_lock:
+        if _owner_pid == os.getpid():
+            return
+        if _owner_pid is not None:
+            # forked: the parent reports what it recorded before the fork
+            for metric in REGISTRY:
+                metric.reset()
+        _owner_pid = os.getpid()
+        threading.Thread(target=_flush_loop, daemon=True, name="metrics-flush").start()
+        atexit.register(write_snapshot)
+
+
+def _merged():
+    """{metric name: {label key: value}} summed over every process snapshot (or just this one)."""
+    directory = _metrics_dir()
+    if not directory:
+        return {m.name: m.snapshot() for m in REGISTRY}
+    write_snapshot()
+    merged = {m.name: {} for m in REGISTRY}
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            with open(entry.path) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        for name, values in data.items():
+            target = merged.setdefault(name, {})
+            for key, value in values.items():
+                if isinstance(value, list):
+                    current = target.get(key)
+                    target[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    target[key] = target.get(key, 0) + value
+    return merged
+
+
+def _labels(names, key, extra=()):
+    pairs = list(zip(names, key.split("|") if names else [])) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{n}="{v}"' for (n, _), v in zip(pairs, escaped)) + "}"
+
+
+def render():
+    """Prometheus text exposition format (0.0.4)."""
+    merged = _merged()
+    lines = []
+    for metric in REGISTRY:
+        values = merged.get(metric.name, {})
+        if isinstance(metric, Histogram):
+            lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} histogram"]
+            for key, row in sorted(values.items()):
+                cumulative = 0
+                for bound, count in zip([*metric.buckets, "+Inf"], row[:-1]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else repr(float(bound))
+                    lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, key, [('le', le)])} {cumulative}")
+                lines.append(f"{metric.name}_sum{_labels(metric.labelnames, key)} {row[-1]}")
+                lines.append(f"{metric.name}_count{_labels(metric.labelnames, key)} {cumulative}")
+        else:
+            lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} counter"]
+            for key, value in sorted(values.items()):
+                lines.append(f"{metric.name}{_labels(metric.labelnames, key)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------
+# HTTP
+# -----------------------------
+class MetricsMiddleware:
+    """Latency and Mongo op count per resolved route (not per URL, to keep label cardinality bounded)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        ops_before = db_ops()
+        response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match else "unmatched"
+        HTTP_SECONDS.observe(time.perf_counter() - start, route=route, method=request.method, status=response.status_code)
+        HTTP_DB_OPS.observe(db_ops() - ops_before, route=route, method=request.method)
+        _ensure_flusher()
+        return response
+
+
+def metrics_view(request):
+    from django.http import HttpResponse
+
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse(status=401)
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
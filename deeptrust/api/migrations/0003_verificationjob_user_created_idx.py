@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-18 11:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_verificationjob_created_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='verificationjob',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='api_job_user_created_idx'),
+        ),
+    ]
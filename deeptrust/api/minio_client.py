@@ -1,34 +1,55 @@
+# api/minio_client.py
+"""
+MinIO client, built on first use once per process (rebuilt after a fork,
+like api.mongo) so importing this module never touches the network.
+The bucket is created by ``python manage.py provision``.
+"""
 import os
+import threading
 
 DEVELOPMENT_MODE = os.getenv("DEVELOPMENT_MODE", "True") == "True"
 
 # These variables are imported by other modules
 BUCKET = "deeptrust-media"
-minio_client = None
+
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
+MINIO_SECURE = os.getenv("MINIO_SECURE", "False") == "True"
 
 if DEVELOPMENT_MODE:
     print("⚠ Running in DEVELOPMENT MODE → MinIO disabled")
-    
-else:
-    from minio import Minio
-    from minio.error import S3Error
-
-    MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
-    MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
-    MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
-    MINIO_SECURE = os.getenv("MINIO_SECURE", "False") == "True"
-
-    minio_client = Minio(
-        MINIO_ENDPOINT,
-        access_key=MINIO_ACCESS_KEY,
-        secret_key=MINIO_SECRET_KEY,
-        secure=MINIO_SECURE
-    )
-
-    # Create bucket only in real mode
-    try:
-        if not minio_client.bucket_exists(BUCKET):
-            minio_client.make_bucket(BUCKET)
-            print(f"✔ Created bucket: {BUCKET}")
-    except Exception as e:
-        print("❌ MinIO connection failed:", e)
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_minio_client():
+    """This process's Minio client, or None in DEVELOPMENT_MODE."""
+    global _client, _client_pid
+    if DEVELOPMENT_MODE:
+        return None
+    if _client_pid != os.getpid():
+        with _client_lock:
+            if _client_pid != os.getpid():
+                from minio import Minio
+
+                _client = Minio(
+                    MINIO_ENDPOINT,
+                    access_key=MINIO_ACCESS_KEY,
+                    secret_key=MINIO_SECRET_KEY,
+                    secure=MINIO_SECURE
+                )
+                _client_pid = os.getpid()
+    return _client
+
+
+def ensure_bucket():
+    """Create BUCKET if missing; True when it was created."""
+    client = get_minio_client()
+    if client is None or client.bucket_exists(BUCKET):
+        return False
+    client.make_bucket(BUCKET)
+    print(f"✔ Created bucket: {BUCKET}")
+    return True
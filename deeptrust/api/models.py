@@ -15,6 +15,12 @@ class VerificationJob(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)       # new canonical time
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of a user's jobs, newest first
+            models.Index(fields=["user", "-created_at", "-id"], name="api_job_user_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.job_id} - {self.media_id} - {self.status}"
 
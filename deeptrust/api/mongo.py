@@ -1,34 +1,118 @@
 # api/mongo.py
-from pymongo import MongoClient, ASCENDING
+"""
+Mongo handles for the app.
+
+Nothing here touches the network at import. The client is built on first
+use, once per process: a process forked after that (Django-Q / Celery
+workers, the process executor's pool) sees a different PID and builds its
+own instead of sharing the parent's sockets. Collections are imported as
+before (``from .mongo import media_docs``) and resolve through it.
+
+Indexes are provisioned by ``python manage.py provision``, not at import.
+"""
 import os
+import threading
+
+from pymongo import MongoClient, ASCENDING
+
+from .metrics import MongoCommandTimer
 
-MONGO_URI = "<MONGO_URI>"
+MONGO_URI = os.getenv("MONGO_URI", "<MONGO_URI>")
+MONGO_TLS = os.getenv("MONGO_TLS", "True") == "True"  # False for a local mongod
 MONGO_DB_NAME = "deeptrust"
 
-client = MongoClient(
-    MONGO_URI,
-    tls=True,
-    serverSelectionTimeoutMS=5000
-)
-
-db = client[MONGO_DB_NAME]
-
-media_docs = db["media_docs"]
-claims = db["claims"]
-verifications = db["verifications"]
-snippets = db["snippets"]
-watchlist = db["watchlist"]
-audit_log = db["audit_log"]
-sources = db["sources"]
-
-# Create indexes if missing (idempotent)
-media_docs.create_index([("media_id", ASCENDING)], unique=True)
-media_docs.create_index([("sha256", ASCENDING)])
-media_docs.create_index([("phash", ASCENDING)])
-media_docs.create_index([("file_type", ASCENDING)])  # important
-media_docs.create_index([("status", ASCENDING)])
-claims.create_index([("claim_hash", ASCENDING)], unique=True)
-claims.create_index([("expires_at", ASCENDING)])
-verifications.create_index([("media_id", ASCENDING)])
-snippets.create_index([("published_at", ASCENDING)])
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def _pool_size():
+    from django.conf import settings
+
+    return getattr(settings, "MONGO_MAX_POOL_SIZE", 100)
+
+
+def get_client():
+    """This process's MongoClient (rebuilt after a fork)."""
+    global _client, _client_pid
+    if _client_pid != os.getpid():
+        with _client_lock:
+            if _client_pid != os.getpid():
+                # a client inherited across fork is never used or closed here
+                _client = MongoClient(
+                    MONGO_URI,
+                    tls=MONGO_TLS,
+                    serverSelectionTimeoutMS=5000,
+                    maxPoolSize=_pool_size(),
+                    connect=False,  # monitors start with the first operation
+                    event_listeners=[MongoCommandTimer()],  # api.metrics
+                )
+                _client_pid = os.getpid()
+    return _client
+
+
+def get_db():
+    return get_client()[MONGO_DB_NAME]
+
+
+class LazyCollection:
+    """Module-level collection handle resolved against this process's client on every use."""
+
+    def __init__(self, name):
+        self.name = name
+        self._client = None
+        self._collection = None
+
+    def get(self):
+        client = get_client()
+        if self._client is not client:
+            self._collection = client[MONGO_DB_NAME][self.name]
+            self._client = client
+        return self._collection
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self.name!r})"
+
+
+media_docs = LazyCollection("media_docs")
+claims = LazyCollection("claims")
+verifications = LazyCollection("verifications")
+snippets = LazyCollection("snippets")
+watchlist = LazyCollection("watchlist")
+audit_log = LazyCollection("audit_log")
+sources = LazyCollection("sources")
+plan_cache = LazyCollection("plan_cache")
+checkpoints = LazyCollection("checkpoints")  # resumable maintenance commands
+lane_queue = LazyCollection("lane_queue")    # calls waiting for a Django-Q lane (api.lanes)
+lane_users = LazyCollection("lane_users")    # per-lane virtual time / weight of each user
+artifacts = LazyCollection("artifacts")      # bulky stage outputs kept off media_docs (api.artifacts)
+
+
+# -----------------------------
+# Provisioning (manage.py provision)
+# -----------------------------
+INDEXES = [
+    (media_docs, [("media_id", ASCENDING)], {"unique": True}),
+    (media_docs, [("sha256", ASCENDING)], {}),
+    (media_docs, [("phash", ASCENDING)], {}),
+    (media_docs, [("phash_at", ASCENDING)], {}),  # api.phash_index incremental sync
+    (media_docs, [("file_type", ASCENDING)], {}),  # important
+    (media_docs, [("status", ASCENDING)], {}),
+    (claims, [("claim_hash", ASCENDING)], {"unique": True}),
+    (claims, [("expires_at", ASCENDING)], {}),
+    (claims, [("lease.expires_at", ASCENDING)], {"sparse": True}),  # recover_stalled_claims
+    (verifications, [("media_id", ASCENDING)], {}),
+    (snippets, [("published_at", ASCENDING)], {}),
+    (artifacts, [("media_id", ASCENDING)], {}),
+    (plan_cache, [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    (lane_queue, [("lane", ASCENDING), ("state", ASCENDING), ("enqueued_at", ASCENDING)], {}),
+    (lane_queue, [("lane", ASCENDING), ("state", ASCENDING), ("user_id", ASCENDING), ("enqueued_at", ASCENDING)], {}),
+]
+
 
+def ensure_indexes():
+    """Create missing indexes (idempotent); returns the index names."""
+    return [collection.create_index(keys, **options) for collection, keys, options in INDEXES]
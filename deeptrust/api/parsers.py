@@ -0,0 +1,33 @@
+# api/parsers.py
+import json
+
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Newline-delimited JSON: one object per line. Lines that fail to parse
+    are kept as {"_error": ...} so a batch can report them per item instead
+    of rejecting the whole request.
+    """
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", "utf-8")
+        items = []
+        for line in stream:
+            try:
+                line = line.decode(encoding).strip()
+            except UnicodeDecodeError:
+                items.append({"_error": f"Line is not valid {encoding}"})
+                continue
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                item = {"_error": f"Invalid JSON: {e}"}
+            if not isinstance(item, dict):
+                item = {"_error": "Each line must be a JSON object"}
+            items.append(item)
+        return items
@@ -0,0 +1,317 @@
+# api/phash_index.py
+"""
+Near-duplicate index over 64-bit perceptual hashes.
+
+The equality index on media_docs.phash cannot answer "within Hamming
+distance k". This is a multi-index hash table (Norouzi et al.): each hash
+is split into `blocks` 16-bit substrings and every substring gets its own
+bucket table. If two hashes are within distance k, by pigeonhole at least
+one substring is within k // blocks, so we only probe buckets near the
+query's substrings and verify the (few) candidates with a vectorized
+popcount.
+
+Hashes are stored as 16-char hex strings in Mongo (BSON has no uint64),
+with ``phash_at`` set whenever ``phash`` is (re)written. Processes keep
+their index current by pulling on ``phash_at``, so a hash written to an
+old doc (authenticity_image, backfill_phash) is picked up like a new one.
+"""
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+BLOCK_BITS = 16
+BLOCK_MASK = (1 << BLOCK_BITS) - 1
+DEFAULT_BLOCKS = 4
+DEFAULT_MAX_DISTANCE = 8
+MERGE_THRESHOLD = 10000
+REFRESH_INTERVAL = 30  # seconds between incremental pulls from Mongo
+SYNC_OVERLAP = 120     # seconds of phash_at re-read on every pull (see _refresh)
+
+
+# -----------------------------
+# Bit helpers
+# -----------------------------
+_POPCOUNT_LUT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount64(values):
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT_LUT[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def phash_to_int(phash):
+    return int(phash, 16) if isinstance(phash, str) else int(phash)
+
+
+def int_to_phash(value):
+    return f"{int(value):016x}"
+
+
+def _neighbour_masks(radius):
+    """All 16-bit masks with at most `radius` bits set."""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in itertools.combinations(range(BLOCK_BITS), r):
+            masks.append(sum(1 << b for b in bits))
+    return np.array(masks, dtype=np.uint32)
+
+
+# -----------------------------
+# Index
+# -----------------------------
+class PHashIndex:
+    """
+    Bulk-built bucket tables plus a small append buffer for incremental
+    inserts; the buffer is folded into the tables every MERGE_THRESHOLD adds.
+    """
+
+    def __init__(self, blocks=DEFAULT_BLOCKS, merge_threshold=MERGE_THRESHOLD):
+        if blocks * BLOCK_BITS != 64:
+            raise ValueError("blocks must split 64 bits into 16-bit substrings")
+        self.blocks = blocks
+        self.merge_threshold = merge_threshold
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._ids = []
+        self._tables = []  # per block: (bucket starts, row order)
+        self._pending_hashes = []
+        self._pending_ids = []
+        self._masks = {}
+        self._lock = threading.RLock()
+        self._build_tables()
+
+    def __len__(self):
+        return len(self._ids) + len(self._pending_ids)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the hash array and bucket tables (ids excluded)."""
+        return self._hashes.nbytes + sum(s.nbytes + o.nbytes for s, o in self._tables)
+
+    def _build_tables(self):
+        self._tables = []
+        for b in range(self.blocks):
+            keys = ((self._hashes >> np.uint64(b * BLOCK_BITS)) & np.uint64(BLOCK_MASK)).astype(np.uint16)
+            order = np.argsort(keys, kind="stable").astype(np.uint32)
+            starts = np.zeros(BLOCK_MASK + 2, dtype=np.int64)
+            np.cumsum(np.bincount(keys, minlength=BLOCK_MASK + 1), out=starts[1:])
+            self._tables.append((starts, order))
+
+    def build(self, ids, hashes):
+        """Replace the index contents. `hashes` are ints or hex strings."""
+        hashes = np.asarray(
+            hashes if isinstance(hashes, np.ndarray) else [phash_to_int(h) for h in hashes],
+            dtype=np.uint64,
+        )
+        with self._lock:
+            self._hashes = hashes
+            self._ids = ids if isinstance(ids, np.ndarray) else list(ids)
+            self._pending_hashes, self._pending_ids = [], []
+            self._build_tables()
+
+    def add(self, media_id, phash):
+        with self._lock:
+            self._pending_ids.append(media_id)
+            self._pending_hashes.append(phash_to_int(phash))
+            if len(self._pending_ids) >= self.merge_threshold:
+                self.merge()
+
+    def merge(self):
+        with self._lock:
+            if not self._pending_ids:
+                return
+            self._hashes = np.concatenate([self._hashes, np.array(self._pending_hashes, dtype=np.uint64)])
+            if isinstance(self._ids, np.ndarray):
+                self._ids = np.concatenate([self._ids, np.asarray(self._pending_ids)])
+            else:
+                self._ids.extend(self._pending_ids)
+            self._pending_hashes, self._pending_ids = [], []
+            self._build_tables()
+
+    def _candidates(self, query, max_distance):
+        radius = max_distance // self.blocks
+        if radius > 2:
+            # probing C(16, r) buckets per block stops paying off; scan instead
+            return None
+        masks = self._masks.get(radius)
+        if masks is None:
+            masks = self._masks[radius] = _neighbour_masks(radius)
+
+        rows = []
+        for b, (starts, order) in enumerate(self._tables):
+            values = masks ^ ((query >> (b * BLOCK_BITS)) & BLOCK_MASK)
+            lo, counts = starts[values], starts[values + 1] - starts[values]
+            total = int(counts.sum())
+            if total:
+                # gather all probed bucket slices in one vectorized step
+                offsets = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+                rows.append(order[offsets + np.arange(total)])
+        if not rows:
+            return np.empty(0, dtype=np.uint32)
+        return np.concatenate(rows)
+
+    def query(self, phash, max_distance=DEFAULT_MAX_DISTANCE, limit=10):
+        """[(media_id, distance)] within `max_distance`, nearest first."""
+        query = phash_to_int(phash)
+        q = np.uint64(query)
+        with self._lock:
+            rows = self._candidates(query, max_distance)
+            if rows is None:
+                rows = np.arange(len(self._hashes))
+            dist = popcount64(self._hashes[rows] ^ q)
+            keep = dist <= max_distance
+            # a row can be probed through several blocks; report it once
+            rows, first = np.unique(rows[keep], return_index=True)
+            hits = [(self._ids[r], int(d)) for r, d in zip(rows, dist[keep][first])]
+
+            if self._pending_hashes:
+                pdist = popcount64(np.array(self._pending_hashes, dtype=np.uint64) ^ q)
+                hits += [(self._pending_ids[i], int(pdist[i])) for i in np.flatnonzero(pdist <= max_distance)]
+
+        hits.sort(key=lambda hit: hit[1])
+        return hits[:limit]
+
+
+# -----------------------------
+# Process-wide index synced from Mongo
+# -----------------------------
+_index = None
+_synced_until = None  # newest phash_at pulled so far
+_recent = {}          # media_id -> (phash, phash_at) inside the overlap window
+_last_refresh = 0.0
+_index_lock = threading.Lock()
+
+
+def _utc(value):
+    # pymongo hands datetimes back naive (UTC); keep everything that way
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def _pull(since=None, batch_size=10000):
+    # imported here so the index itself (and its benchmark) needs no database
+    from .mongo import media_docs
+
+    query = {"phash": {"$type": "string"}}
+    if since is not None:
+        query["phash_at"] = {"$gte": since}
+    cursor = media_docs.find(query, {"media_id": 1, "phash": 1, "phash_at": 1}).batch_size(batch_size)
+    for doc in cursor:
+        yield doc["media_id"], doc["phash"], doc.get("phash_at")
+
+
+def _seen(media_id, phash, phash_at):
+    """Record a pulled or locally indexed hash; False if it was already indexed."""
+    global _synced_until
+    if phash_at is not None:
+        phash_at = _utc(phash_at)
+        if _synced_until is None or phash_at > _synced_until:
+            _synced_until = phash_at
+    if _recent.get(media_id, (None,))[0] == phash:
+        return False
+    _recent[media_id] = (phash, phash_at or _synced_until)
+    return True
+
+
+def _prune_recent():
+    if _synced_until is None:
+        _recent.clear()
+        return
+    cutoff = _synced_until - timedelta(seconds=SYNC_OVERLAP)
+    for media_id in [m for m, (_, at) in _recent.items() if at is None or at < cutoff]:
+        del _recent[media_id]
+
+
+def _rebuild():
+    global _index, _synced_until, _last_refresh
+    _synced_until = None
+    _recent.clear()
+    ids, hashes = [], []
+    for media_id, phash, phash_at in _pull():
+        _seen(media_id, phash, phash_at)
+        ids.append(media_id)
+        hashes.append(phash_to_int(phash))
+    _prune_recent()
+
+    index = PHashIndex()
+    index.build(ids, np.array(hashes, dtype=np.uint64))
+    _index, _last_refresh = index, time.monotonic()
+    return index
+
+
+def rebuild_from_mongo():
+    """Build a fresh index from every media doc that has a phash."""
+    with _index_lock:
+        return _rebuild()
+
+
+def _refresh():
+    """
+    Add hashes written since the last pull. phash_at is stamped where the
+    hash was computed and lands in Mongo a little later (stage writes are
+    buffered), so each pull re-reads the last SYNC_OVERLAP seconds and
+    skips what is already indexed.
+    """
+    global _last_refresh
+    _last_refresh = time.monotonic()
+    since = datetime(1970, 1, 1) if _synced_until is None else _synced_until - timedelta(seconds=SYNC_OVERLAP)
+    for media_id, phash, phash_at in _pull(since=since):
+        if _seen(media_id, phash, phash_at):
+            _index.add(media_id, phash)
+    _prune_recent()
+
+
+def get_phash_index():
+    """The process index, built on first use and topped up from Mongo periodically."""
+    if _index is None or time.monotonic() - _last_refresh > REFRESH_INTERVAL:
+        with _index_lock:
+            if _index is None:
+                _rebuild()
+            elif time.monotonic() - _last_refresh > REFRESH_INTERVAL:
+                _refresh()
+    return _index
+
+
+def index_phash(media_id, phash, phash_at=None):
+    """Add a hash computed in this process now, rather than at the next pull."""
+    if _index is None or not phash:
+        return
+    with _index_lock:
+        if _seen(media_id, phash, phash_at or datetime.now(timezone.utc)):
+            _index.add(media_id, phash)
+
+
+def find_near_duplicates(phash, max_distance=DEFAULT_MAX_DISTANCE, limit=5, exclude=None):
+    """
+    Nearest prior media within `max_distance` bits, with their verdicts:
+    [{"media_id", "distance", "status", "truthscore", "authenticity_score", "verdict"}]
+    """
+    from .mongo import media_docs
+
+    hits = [(m, d) for m, d in get_phash_index().query(phash, max_distance, limit + 1) if m != exclude][:limit]
+    if not hits:
+        return []
+
+    docs = {
+        doc["media_id"]: doc
+        for doc in media_docs.find(
+            {"media_id": {"$in": [m for m, _ in hits]}},
+            {"media_id": 1, "status": 1, "truthscore": 1, "authenticity_score": 1, "claim.latest_verdict": 1},
+        )
+    }
+
+    results = []
+    for media_id, distance in hits:
+        doc = docs.get(media_id, {})
+        results.append({
+            "media_id": media_id,
+            "distance": distance,
+            "status": doc.get("status"),
+            "truthscore": doc.get("truthscore"),
+            "authenticity_score": doc.get("authenticity_score"),
+            "verdict": (doc.get("claim") or {}).get("latest_verdict"),
+        })
+    return results
@@ -1,101 +1,58 @@
 # api/qtasks.py
-import time
-from django_q.tasks import async_task
 from .mongo import media_docs
-from .chief import generate_task_plan
-from .models import VerificationJob
+from .chief import PLAN_PROJECTION, generate_task_plan
+from .dag import FINALIZE_STAGE, start_pipeline
+from .executors import DjangoQExecutor, get_executor
+from . import lanes
+from . import stages
 
 
 def orchestrate_job(job_id, media_id):
     """
     Orchestrates the entire verification pipeline.
     Replaces Celery's orchestrate_job.delay()
+
+    The plan is turned into a stage DAG (see api.dag): root stages are
+    dispatched right away and every stage dispatches what it unblocks when
+    it finishes, so job_finalize only runs once all planned stages are done.
+    Stages run on settings.STAGE_EXECUTOR (api.executors).
     """
     print("🎬 Django-Q: Starting Orchestration", job_id)
 
-    job = VerificationJob.objects.get(job_id=job_id)
-    media_doc = media_docs.find_one({"media_id": media_id})
+    media_doc = media_docs.find_one({"media_id": media_id}, PLAN_PROJECTION)
 
     # 1) Generate task plan via LLM
     plan = generate_task_plan(media_doc)
 
-    # 2) Run subtasks based on plan
-    for step in plan["plan"]:
-        step_type = step["task"]
-
-        if step_type == "extract_frames":
-            async_task("api.qtasks.extract_frames", job_id, media_id)
-
-        elif step_type == "transcribe_audio":
-            async_task("api.qtasks.transcribe_audio", job_id, media_id)
-
-        elif step_type == "authenticity":
-            async_task("api.qtasks.authenticity_check", job_id, media_id)
-
-        elif step_type == "claim_extract":
-            async_task("api.qtasks.claim_extract", job_id, media_id)
-
-        elif step_type == "truthscore":
-            async_task("api.qtasks.truthscore_compute", job_id, media_id)
-
-    # 3) Finalize when all tasks done
-    async_task("api.qtasks.job_finalize", job_id, media_id)
+    # 2) Fan out the stages with no pending dependencies
+    executor = get_executor()
+    if isinstance(executor, DjangoQExecutor):
+        # route is known here, no need to look it up again
+        executor = DjangoQExecutor((lanes.lane_for(media_doc.get("file_type")), media_doc.get("user_id")))
+    start_pipeline(media_id, plan["plan"], executor.dispatcher(job_id, media_id))
 
     return True
 
 
-def extract_frames(job_id, media_id):
-    print("🎞 Extracting frames...")
-    time.sleep(3)
-    media_docs.update_one(
-        {"media_id": media_id},
-        {"$set": {"frames_extracted": True}}
-    )
+def orchestrate_batch(jobs):
+    """Orchestrate [(job_id, media_id), ...] from one queued task."""
+    for job_id, media_id in jobs:
+        try:
+            orchestrate_job(job_id, media_id)
+        except Exception as e:
+            print("❌ Orchestration failed for", job_id, e)
 
 
-def transcribe_audio(job_id, media_id):
-    print("🎤 Transcribing audio...")
-    time.sleep(3)
-    media_docs.update_one(
-        {"media_id": media_id},
-        {"$set": {"transcript": "Dummy transcript"}}
-    )
+# Queued by DjangoQExecutor through the job's lane
+def run_stage(job_id, media_id, stage):
+    """Run a single planned stage, then release its dependents."""
+    stages.execute(stage, job_id, media_id, DjangoQExecutor())
 
 
-def authenticity_check(job_id, media_id):
-    print("🔍 Authenticity check...")
-    time.sleep(3)
-    media_docs.update_one(
-        {"media_id": media_id},
-        {"$set": {"authenticity_score": 0.88}}
-    )
-
-
-def claim_extract(job_id, media_id):
-    print("📝 Extracting claim...")
-    time.sleep(3)
-    media_docs.update_one(
-        {"media_id": media_id},
-        {"$set": {"claim_extracted": "Example claim"}}
-    )
-
-
-def truthscore_compute(job_id, media_id):
-    print("📊 Truthscore compute...")
-    time.sleep(3)
-    media_docs.update_one(
-        {"media_id": media_id},
-        {"$set": {"truthscore": 72}}
-    )
+def job_finalize(job_id, media_id):
+    stages.finalize(job_id, media_id)
 
 
-def job_finalize(job_id, media_id):
-    print("🏁 Finalizing job...")
-    media_docs.update_one(
-        {"media_id": media_id},
-        {"$set": {"status": "completed"}}
-    )
-    VerificationJob.objects.filter(job_id=job_id).update(
-        status="completed",
-        result_ready=True
-    )
+# on_failure of both: api.lanes gave up retrying them
+def stage_failed(job_id, media_id, stage=FINALIZE_STAGE, *, error):
+    stages.fail_job(job_id, media_id, stage, error, DjangoQExecutor().dispatchers)
@@ -0,0 +1,354 @@
+# api/stages.py
+"""
+Stage registry for the verification pipeline.
+
+Every stage is registered here once, with its contract:
+
+    inputs    media_docs fields the body reads; it is handed exactly these
+    outputs   media_docs fields it may write (a returned key must be one of
+              them or a sub-path of one, e.g. "claim.latest_verdict")
+    inline    cheap enough to run in the worker that unblocked it instead
+              of paying a queue round trip (see api.executors)
+
+Fields listed in api.artifacts (transcript, keyframes, evidence, ...) are
+read and written like any other, but live in the artifacts collection;
+the media doc only carries a marker for them.
+
+A body is ``fn(ctx) -> {field: value}``. ctx.media_id and ctx.doc are the
+job and its inputs; ctx.skip(stages) marks downstream stages done without
+running them, ctx.park() leaves the stage open for another job to
+complete (claim cache), and ctx.dispatchers(media_ids) lets a stage
+resume other jobs on the same executor.
+
+execute() and finalize() are the only runners; executors (inline, thread,
+process, Django-Q, Celery) differ only in where they call them. A stage
+that keeps raising ends in fail_job(), called by whichever executor
+stops retrying it.
+"""
+import time
+from datetime import timezone as dt_timezone
+
+from django.utils import timezone
+from pymongo import ReturnDocument
+
+from . import artifacts, audio, claim_cache, frames
+from .cache import invalidate_media
+from .dag import FINALIZE_STAGE, complete_stage, progress_percent
+from .events import publish_job_event
+from .imagehash import image_hash_fields
+from .metrics import JOB_SECONDS, JOBS_FINALIZED, STAGE_SECONDS, STAGE_WAIT_SECONDS
+from .mongo import audit_log, media_docs
+from .phash_index import find_near_duplicates, index_phash
+from .vector_index import retrieve_evidence
+from .writer import stage_writer
+
+
+class StageContractError(Exception):
+    pass
+
+
+class Stage:
+    def __init__(self, name, fn, inputs, outputs, inline):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.inline = inline
+        self.artifact_inputs = [field for field in self.inputs if field in artifacts.KIND_OF]
+        # the dispatch time rides along for queue-wait metrics; inline copies
+        # of artifact fields are still read for docs written before api.artifacts
+        self.projection = {"media_id": 1, f"pipeline.dispatched_at.{name}": 1, **{field: 1 for field in self.inputs}}
+        if self.artifact_inputs:
+            self.projection["artifacts"] = 1
+
+    def check_outputs(self, fields):
+        undeclared = [
+            key for key in fields
+            if not any(key == out or key.startswith(out + ".") for out in self.outputs)
+        ]
+        if undeclared:
+            raise StageContractError(f"{self.name} wrote undeclared fields {undeclared}")
+
+
+class StageContext:
+    def __init__(self, job_id, media_id, doc, executor):
+        self.job_id = job_id
+        self.media_id = media_id
+        self.doc = doc
+        self.executor = executor
+        self.skipped = []
+        self.parked = False
+
+    def skip(self, stages):
+        self.skipped.extend(stages)
+
+    def park(self):
+        self.parked = True
+
+    def dispatchers(self, media_ids):
+        return self.executor.dispatchers(media_ids)
+
+
+STAGES = {}
+
+
+def stage(name, inputs=(), outputs=(), inline=False):
+    def register(fn):
+        STAGES[name] = Stage(name, fn, inputs, outputs, inline)
+        return fn
+    return register
+
+
+# -----------------------------
+# Runners
+# -----------------------------
+def execute(name, job_id, media_id, executor):
+    """Run one stage body in this process, store its outputs and release its dependents."""
+    spec = STAGES.get(name)
+    skip = ()
+    if spec is None:
+        # unknown task — no-op, but still counts as done for the barrier
+        print("Unknown task:", name)
+    else:
+        doc = {}
+        # inline stages with no inputs run right after dispatch: no read, no wait to measure
+        if spec.inputs or not spec.inline:
+            doc = media_docs.find_one({"media_id": media_id}, spec.projection) or {}
+        dispatched_at = (doc.pop("pipeline", None) or {}).get("dispatched_at", {}).get(name)
+        if spec.artifact_inputs and doc.get("artifacts"):
+            doc.update(artifacts.load(media_id, spec.artifact_inputs, doc["artifacts"]))
+        wait = None
+        if dispatched_at:
+            wait = max((timezone.now() - _aware(dispatched_at)).total_seconds(), 0.0)
+            STAGE_WAIT_SECONDS.observe(wait, stage=name, executor=executor.name)
+
+        start = time.perf_counter()
+        ctx = StageContext(job_id, media_id, doc, executor)
+        try:
+            fields = spec.fn(ctx) or {}
+            spec.check_outputs(fields)
+            fields = artifacts.offload(media_id, fields)
+        except Exception:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=name, executor=executor.name, outcome="error")
+            raise
+        run = time.perf_counter() - start
+        outcome = "parked" if ctx.parked else "ok"
+        STAGE_SECONDS.observe(run, stage=name, executor=executor.name, outcome=outcome)
+        timing = {"executor": executor.name, "wait": wait, "run": round(run, 6), "outcome": outcome}
+        stage_writer.set(media_id, {**fields, f"timings.{name}": timing})
+        print(f"▶ {name} {media_id} ({executor.name}, {run:.3f}s)")
+        if ctx.parked:
+            # completed later by the job verifying the same claim
+            return
+        skip = ctx.skipped
+    complete_stage(media_id, name, executor.dispatcher(job_id, media_id), skip=skip)
+
+
+def _aware(value):
+    # pymongo hands datetimes back naive (UTC)
+    return timezone.make_aware(value, dt_timezone.utc) if timezone.is_naive(value) else value
+
+
+def _job_summary(job_id, media_id, doc, completed_at):
+    """Per-job timing record in audit_log, from the timings each stage stored."""
+    started_at = (doc.get("pipeline") or {}).get("started_at")
+    total = (completed_at - _aware(started_at)).total_seconds() if started_at else None
+    file_type = doc.get("file_type") or "unknown"
+    if total is not None:
+        JOB_SECONDS.observe(total, file_type=file_type)
+    JOBS_FINALIZED.inc(file_type=file_type)
+    stages = doc.get("timings") or {}
+    audit_log.insert_one({
+        "event": "job_summary",
+        "media_id": media_id,
+        "job_id": job_id,
+        "file_type": file_type,
+        "stages": stages,
+        "total_seconds": total,
+        "run_seconds": round(sum(t.get("run") or 0 for t in stages.values()), 6),
+        "wait_seconds": round(sum(t.get("wait") or 0 for t in stages.values()), 6),
+        "created_at": completed_at,
+    })
+
+
+def finalize(job_id, media_id):
+    print("🏁 Finalizing job", media_id)
+    completed_at = timezone.now()
+    # anything still buffered for this job lands with the status flip
+    doc = media_docs.find_one_and_update({"media_id": media_id}, {"$set": {
+        **stage_writer.take(media_id),
+        "status": "completed",
+        "completed_at": completed_at,
+    }}, projection={"file_type": 1, "timings": 1, "pipeline.started_at": 1}, return_document=ReturnDocument.AFTER)
+    try:
+        _job_summary(job_id, media_id, doc or {}, completed_at)
+    except Exception as e:
+        print("⚠ Job summary failed:", e)
+    # by media_id: duplicate submissions attached to this media finish too
+    from .models import VerificationJob
+    VerificationJob.objects.filter(media_id=media_id).update(
+        status="completed", result_ready=True, updated_at=timezone.now(),
+    )
+    frames.discard_keyframes(media_id)
+    invalidate_media(media_id)
+    publish_job_event(media_id, "completed", 100, stage=FINALIZE_STAGE)
+
+
+def fail_job(job_id, media_id, stage, error, dispatcher_for=None):
+    """
+    `stage` raised and will not be retried: the job moves to status
+    "failed" with the error under errors.<stage>, and a claim lease it
+    holds passes to the next waiting job right away. False when the job
+    had already completed or failed.
+    """
+    if isinstance(error, BaseException):
+        error = f"{type(error).__name__}: {error}"
+    print(f"❌ Job {media_id} failed in {stage}: {error}")
+    failed_at = timezone.now()
+    doc = media_docs.find_one_and_update({"media_id": media_id, "status": {"$nin": ["completed", "failed"]}}, {"$set": {
+        **stage_writer.take(media_id),
+        "status": "failed",
+        "failed_stage": stage,
+        "failed_at": failed_at,
+        f"errors.{stage}": error,
+    }}, projection={"claim_hash": 1, "progress": 1})
+    if doc is None:
+        return False
+    # by media_id, like finalize
+    from .models import VerificationJob
+    VerificationJob.objects.filter(media_id=media_id).update(status="failed", result_ready=False, updated_at=failed_at)
+    frames.discard_keyframes(media_id)
+    invalidate_media(media_id)
+    publish_job_event(media_id, "failed", progress_percent(doc.get("progress")), stage=stage)
+    if doc.get("claim_hash"):
+        claim_cache.abandon_lease(doc["claim_hash"], media_id, dispatcher_for)
+    return True
+
+
+# -----------------------------
+# Media stages
+# -----------------------------
+@stage("extract_frames",
+       inputs=["minio_path", "frame_budget"],
+       outputs=["frames_extracted", "frames_error", "keyframes"])
+def extract_frames(ctx):
+    return frames.extract_frames_fields(ctx.doc)
+
+
+@stage("transcribe_audio",
+       inputs=["minio_path"],
+       outputs=["transcript", "transcript_error", "transcript_segments", "speech_seconds",
+                "audio_seconds", "transcriber", "transcript_at"])
+def transcribe_audio(ctx):
+    return {**audio.transcribe_fields(ctx.doc), "transcript_at": timezone.now()}
+
+
+@stage("authenticity_image",
+       inputs=["minio_path"],
+       outputs=["authenticity_score", "phash", "dhash", "ahash", "phash_at", "near_duplicates"])
+def authenticity_image(ctx):
+    hashes = image_hash_fields(ctx.doc)
+    if not hashes:
+        return {"authenticity_score": 0.88}
+    # prior media within a few bits: re-encodes / crops of known content
+    near = find_near_duplicates(hashes["phash"], exclude=ctx.media_id)
+    phash_at = timezone.now()
+    index_phash(ctx.media_id, hashes["phash"], phash_at)
+    known = next((d for d in near if d["status"] == "completed" and d["authenticity_score"] is not None), None)
+    return {
+        # placeholder model; a finished near-duplicate's score is reused as is
+        "authenticity_score": known["authenticity_score"] if known else 0.88,
+        **hashes,
+        "phash_at": phash_at,
+        "near_duplicates": near,
+    }
+
+
+@stage("authenticity_video",
+       inputs=["keyframes"],
+       outputs=["authenticity_score", "frames_analyzed"])
+def authenticity_video(ctx):
+    keyframes = ctx.doc.get("keyframes") or {}
+    # placeholder model: one score per frame, fed straight from the memmap
+    score = frames.score_keyframes(keyframes, lambda batch: [0.88] * len(batch))
+    return {"authenticity_score": 0.88 if score is None else score, "frames_analyzed": keyframes.get("count", 0)}
+
+
+@stage("authenticity_audio", outputs=["audio_authenticity"])
+def authenticity_audio(ctx):
+    return {"audio_authenticity": 0.90}
+
+
+@stage("detect_text_ai", inputs=["text_input"], outputs=["text_ai_score"])
+def detect_text_ai(ctx):
+    return {"text_ai_score": 0.30 if ctx.doc.get("text_input") else None}
+
+
+# -----------------------------
+# Claim stages
+# -----------------------------
+@stage("claim_extract",
+       inputs=["claim_text", "text_input", "transcript"],
+       outputs=["claims", "claim", "claim_extracted"])
+def claim_extract(ctx):
+    # placeholder extractor: the user's claim, else the first sentence of the text
+    text = ctx.doc.get("claim_text") or ctx.doc.get("text_input") or ctx.doc.get("transcript") or ""
+    claim = text.strip().split(". ")[0][:500] or "sample claim"
+    return {
+        "claims": [claim],
+        "claim": {"text": claim, "media_id": ctx.media_id, "created_at": timezone.now()},
+        "claim_extracted": True,
+    }
+
+
+@stage("claim_normalize",
+       inputs=["claims"],
+       outputs=["normalized_claims", "claim.normalized_text"],
+       inline=True)
+def claim_normalize(ctx):
+    normalized = [" ".join(c.split()).lower() for c in ctx.doc.get("claims") or [] if c]
+    return {"normalized_claims": normalized, "claim.normalized_text": normalized[0] if normalized else None}
+
+
+@stage("claim_lookup_cache",
+       outputs=["claim_hash", "claim", "claim_cache", "evidence"],
+       inline=True)
+def claim_lookup_cache(ctx):
+    # hit -> skip retrieval/verification, miss -> lead, in flight elsewhere -> park
+    # (lookup_stage buffers its own fields in stage_writer)
+    outcome = claim_cache.lookup_stage(ctx.media_id)
+    if outcome == claim_cache.PARKED:
+        ctx.park()
+    else:
+        ctx.skip(outcome)
+
+
+@stage("retrieval_semantic_search",
+       inputs=["claim.normalized_text", "normalized_claims", "claim_text"],
+       outputs=["evidence"])
+def retrieval_semantic_search(ctx):
+    claim_texts = [c for c in ctx.doc.get("normalized_claims") or [] if c]
+    claim_texts = claim_texts or [t for t in [claim_cache.claim_text_of(ctx.doc)] if t]
+    # nearest snippets from the local vector index (api.vector_index)
+    return {"evidence": retrieve_evidence(claim_texts) if claim_texts else []}
+
+
+@stage("verification_ensemble",
+       inputs=["evidence"],
+       outputs=["claim.latest_verdict", "verification", "verification_result"])
+def verification_ensemble(ctx):
+    verdict = "Supported"
+    evidence = ctx.doc.get("evidence") or []
+    # cache the verdict and wake jobs waiting on the same claim
+    claim_cache.publish_verdict(ctx.media_id, verdict, evidence, ctx.dispatchers)
+    return {
+        "claim.latest_verdict": verdict,
+        # evidence is stored once, by retrieval_semantic_search
+        "verification": {"verdict": verdict, "evidence_count": len(evidence), "completed": True},
+        "verification_result": True,
+    }
+
+
+@stage("truthscore_compute", outputs=["truthscore"], inline=True)
+def truthscore_compute(ctx):
+    return {"truthscore": 72}
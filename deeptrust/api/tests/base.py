@@ -0,0 +1,77 @@
+# api/tests/base.py
+"""
+Shared test setup.
+
+MongoTestCase gives every test an empty in-memory Mongo (mongomock)
+behind api.mongo, empty job caches and a stage writer with nothing
+buffered. Nothing is handed to Django-Q: lanes.async_task is a mock the
+test can inspect. APITestCase adds an authenticated APIClient and a
+throwaway MEDIA_ROOT for uploads. mongomock comes from
+requirements-dev.txt.
+"""
+import tempfile
+from unittest import mock
+
+import mongomock
+import mongomock.collection
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.mongo import MONGO_DB_NAME, ensure_indexes
+from api.writer import stage_writer
+
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+
+def _add_update_without_sort(self, *args, sort=None, **kwargs):
+    # this pymongo passes sort= to bulk update ops, which mongomock does not know
+    return _add_update(self, *args, **kwargs)
+
+
+class MongoTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.mongo = mongomock.MongoClient()
+        self.db = self.mongo[MONGO_DB_NAME]
+        self.async_task = mock.Mock()
+        self.patch("api.mongo.get_client", lambda: self.mongo)
+        self.patch("mongomock.collection.BulkOperationBuilder.add_update", _add_update_without_sort)
+        self.patch("api.lanes.async_task", self.async_task)
+        # unique indexes are part of the contract (claim leases, media_id)
+        ensure_indexes()
+        with stage_writer._lock:
+            stage_writer._pending.clear()
+        # runs before the patches above are undone
+        self.addCleanup(stage_writer.flush)
+        caches["jobs"].clear()
+
+    def patch(self, target, new):
+        patcher = mock.patch(target, new)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def make_user(self, username="alice"):
+        return get_user_model().objects.create_user(username=username, password="pw-for-tests")
+
+    def insert_media(self, media_id, **fields):
+        doc = {"media_id": media_id, "user_id": "1", "status": "uploaded", **fields}
+        self.db.media_docs.insert_one(doc)
+        return doc
+
+    def media(self, media_id, projection=None):
+        return self.db.media_docs.find_one({"media_id": media_id}, projection)
+
+
+class APITestCase(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = self.make_user()
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
@@ -0,0 +1,123 @@
+# api/tests/test_artifacts.py
+import io
+from unittest import mock
+
+from bson import ObjectId
+from django.core.management import call_command
+
+from api import artifacts
+from api.models import VerificationJob
+
+from .base import APITestCase, MongoTestCase
+
+SEGMENTS = [{"start": 0.0, "end": 1.5, "text": "hello"}, {"start": 2.0, "end": 3.0, "text": "world"}]
+EVIDENCE = [{"snippet_id": "s-1", "score": 0.8, "title": "Paris"}]
+
+
+class FakeBucket:
+    """GridFSBucket stand-in (mongomock has no GridFS for this pymongo)."""
+
+    def __init__(self):
+        self.files = {}
+
+    def upload_from_stream(self, filename, data):
+        file_id = ObjectId()
+        self.files[file_id] = bytes(data)
+        return file_id
+
+    def open_download_stream(self, file_id):
+        return io.BytesIO(self.files[file_id])
+
+    def delete(self, file_id):
+        del self.files[file_id]
+
+
+class ArtifactTests(MongoTestCase):
+    def test_offload_keeps_small_fields_and_markers_only(self):
+        fields = artifacts.offload("m-1", {
+            "transcript": "hello world", "transcript_segments": SEGMENTS, "speech_seconds": 2.5,
+        })
+
+        self.assertEqual(fields["speech_seconds"], 2.5)
+        self.assertEqual(fields["artifacts.transcript"]["fields"], ["transcript", "transcript_segments"])
+        self.assertNotIn("transcript", fields)
+        self.assertEqual(artifacts.load("m-1", ["transcript"]), {"transcript": "hello world", "transcript_segments": SEGMENTS})
+        self.assertEqual(artifacts.load("m-1", ["transcript_segments"])["transcript_segments"], SEGMENTS)
+
+    def test_markers_limit_lookups(self):
+        artifacts.save("m-1", "evidence", {"evidence": EVIDENCE})
+        with mock.patch.object(artifacts.artifacts, "find") as find:
+            self.assertEqual(artifacts.load("m-1", ["keyframes"], markers={"evidence": {}}), {})
+        find.assert_not_called()
+        self.assertEqual(artifacts.load("m-1", ["evidence", "keyframes"], markers={"evidence": {}}), {"evidence": EVIDENCE})
+
+    def test_large_artifacts_go_to_gridfs_and_replacing_frees_them(self):
+        bucket = FakeBucket()
+        self.patch("api.artifacts._files", lambda: bucket)
+        self.patch("api.artifacts.ARTIFACT_INLINE_MAX_BYTES", 64)
+
+        big = {"keyframes": [{"index": i, "path": f"/frames/{i}.jpg"} for i in range(20)]}
+        artifacts.save("m-1", "frames", big)
+        doc = self.db.artifacts.find_one({"_id": "m-1:frames"})
+        self.assertNotIn("data", doc)
+        self.assertEqual(list(bucket.files), [doc["file_id"]])
+        self.assertEqual(artifacts.load("m-1", ["frames"]), big)
+
+        # a retried stage replaces the artifact; the old file goes
+        artifacts.save("m-1", "frames", {"keyframes": []})
+        self.assertEqual(bucket.files, {})
+        self.assertEqual(artifacts.load("m-1", ["keyframes"]), {"keyframes": []})
+
+    def test_offload_command_moves_inline_fields(self):
+        self.insert_media(
+            "m-legacy", transcript="hi", transcript_segments=SEGMENTS,
+            verification={"verdict": "Refuted", "evidence": EVIDENCE},
+        )
+        self.insert_media("m-plain", truthscore=50)
+
+        out = io.StringIO()
+        call_command("offload_artifacts", stdout=out)
+
+        doc = self.media("m-legacy")
+        self.assertNotIn("transcript", doc)
+        self.assertEqual(doc["verification"], {"verdict": "Refuted"})
+        self.assertEqual(sorted(doc["artifacts"]), ["evidence", "transcript"])
+        self.assertEqual(artifacts.load("m-legacy", ["transcript", "evidence"], doc["artifacts"]),
+                         {"transcript": "hi", "transcript_segments": SEGMENTS, "evidence": EVIDENCE})
+        self.assertNotIn("artifacts", self.media("m-plain"))
+        self.assertEqual(self.db.checkpoints.find_one({"_id": "offload_artifacts"})["moved"], 2)
+
+        # nothing inline is left, so a rerun has nothing to do
+        out = io.StringIO()
+        call_command("offload_artifacts", restart=True, stdout=out)
+        self.assertIn("✔ 0 docs", out.getvalue())
+
+
+class ReportExpandTests(APITestCase):
+    def job(self, media_id, **fields):
+        self.insert_media(media_id, user_id=str(self.user.id), status="completed", **fields)
+        VerificationJob.objects.create(job_id=f"job-{media_id}", user=self.user, media_id=media_id, status="completed")
+        return f"job-{media_id}"
+
+    def report(self, job_id, expand=None):
+        return self.api.get(f"/api/report/{job_id}/", {"expand": expand} if expand else {})
+
+    def test_report_is_small_until_expanded(self):
+        markers = artifacts.offload("m-1", {"transcript": "hi", "transcript_segments": SEGMENTS, "evidence": EVIDENCE})
+        job_id = self.job("m-1")
+        self.db.media_docs.update_one({"media_id": "m-1"}, {"$set": markers})
+
+        data = self.report(job_id).json()
+        self.assertEqual(data["expandable"], ["evidence", "transcript"])
+        self.assertNotIn("transcript", data)
+
+        data = self.report(job_id, "transcript,evidence").json()
+        self.assertEqual((data["transcript"], data["transcript_segments"], data["evidence"]), ("hi", SEGMENTS, EVIDENCE))
+        self.assertEqual(self.report(job_id, "frames").json()["keyframes"], None)
+        self.assertEqual(self.report(job_id, "everything").status_code, 400)
+
+    def test_legacy_inline_fields_still_expand(self):
+        job_id = self.job("m-old", transcript="hi", verification={"evidence": EVIDENCE})
+
+        data = self.report(job_id, "transcript,evidence").json()
+        self.assertEqual((data["transcript"], data["evidence"]), ("hi", EVIDENCE))
@@ -0,0 +1,119 @@
+# api/tests/test_audio.py
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from api import audio
+from api.audio import FRAME_SAMPLES, SAMPLE_RATE, StubTranscriber, transcribe_windows, voiced_chunks
+
+FRAME_SECONDS = FRAME_SAMPLES / SAMPLE_RATE
+PAD = 7  # AUDIO_PAD_SECONDS in frames
+
+
+def signal(*bursts, frames):
+    """`frames` frames of silence with loud noise over each (start, length) burst, in frames."""
+    out = np.zeros(frames * FRAME_SAMPLES, dtype=np.int16)
+    rng = np.random.default_rng(0)
+    for start, length in bursts:
+        n = length * FRAME_SAMPLES
+        out[start * FRAME_SAMPLES:start * FRAME_SAMPLES + n] = rng.normal(0, 8000, n).astype(np.int16)
+    return out
+
+
+def windows(samples, frames_per_window=1000):
+    step = frames_per_window * FRAME_SAMPLES
+    return [samples[i:i + step] for i in range(0, len(samples), step)]
+
+
+def chunks(samples, **kwargs):
+    return [(round(offset / FRAME_SECONDS), len(data) // FRAME_SAMPLES)
+            for offset, data in voiced_chunks(windows(samples, **kwargs))]
+
+
+def tearDownModule():
+    audio.reset_pool()
+
+
+class VoicedChunkTests(SimpleTestCase):
+    def test_silence_and_clicks_are_dropped(self):
+        self.assertEqual(chunks(signal(frames=500)), [])
+        self.assertEqual(chunks(signal((100, 3), frames=500)), [])
+
+    def test_burst_is_padded_on_both_sides(self):
+        self.assertEqual(chunks(signal((100, 50), frames=500)), [(100 - PAD, 50 + 2 * PAD)])
+
+    def test_short_pauses_merge_and_long_ones_split(self):
+        # 10 frames (0.3 s) is under AUDIO_MIN_SILENCE_SECONDS, 40 frames is over
+        self.assertEqual(chunks(signal((100, 30), (140, 30), frames=500)), [(100 - PAD, 70 + 2 * PAD)])
+        self.assertEqual(chunks(signal((100, 30), (170, 30), frames=500)),
+                         [(100 - PAD, 30 + 2 * PAD), (170 - PAD, 30 + 2 * PAD)])
+
+    def test_long_speech_is_cut_at_the_chunk_limit(self):
+        out = chunks(signal((0, 2400), frames=2500))
+        self.assertEqual([length for _, length in out], [1000, 1000, 400 + PAD])
+        self.assertEqual([start for start, _ in out], [0, 1000, 2000])
+
+    def test_window_boundaries_do_not_matter(self):
+        samples = signal((95, 40), (300, 12), (310, 200), frames=900)
+        expected = chunks(samples, frames_per_window=900)
+        for frames_per_window in (1, 7, 33, 128):
+            self.assertEqual(chunks(samples, frames_per_window=frames_per_window), expected)
+        self.assertEqual(len(expected), 2)
+
+
+class TranscribeTests(SimpleTestCase):
+    def setUp(self):
+        audio.reset_pool()
+        self.addCleanup(audio.reset_pool)
+
+    def daemonic(self):
+        patcher = mock.patch("api.audio.multiprocessing.current_process", return_value=mock.Mock(daemon=True))
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    def test_segments_are_shifted_and_stitched_in_order(self):
+        samples = signal((100, 50), (400, 50), (700, 50), frames=1000)
+        result = transcribe_windows(windows(samples, frames_per_window=100), path="", workers=2)
+
+        self.assertEqual(result["chunks"], 3)
+        self.assertEqual([s["start"] for s in result["segments"]],
+                         [round((start - PAD) * FRAME_SECONDS, 3) for start in (100, 400, 700)])
+        self.assertEqual(result["audio_seconds"], round(1000 * FRAME_SECONDS, 3))
+        self.assertEqual(result["speech_seconds"], round(3 * (50 + 2 * PAD) * FRAME_SECONDS, 3))
+        self.assertEqual(result["text"].count("[speech"), 3)
+        self.assertIsInstance(audio.get_pool("", 2), ProcessPoolExecutor)
+
+    def test_pool_is_reused_across_jobs(self):
+        pool = audio.get_pool("", 2)
+        self.assertIs(audio.get_pool("", 2), pool)
+        self.assertIsNot(audio.get_pool("", 3), pool)
+
+    def test_daemonic_workers_share_one_transcriber_on_threads(self):
+        self.daemonic()
+        loads = []
+
+        def factory():
+            loads.append(1)
+            return StubTranscriber()
+
+        samples = signal((100, 50), (400, 50), frames=600)
+        with mock.patch("api.audio.load_transcriber", side_effect=lambda path: factory()):
+            audio._worker_transcriber = None
+            self.addCleanup(setattr, audio, "_worker_transcriber", None)
+            for _ in range(2):
+                self.assertEqual(transcribe_windows(windows(samples), path="x:y", workers=4)["chunks"], 2)
+
+        self.assertIsInstance(audio.get_pool("x:y", 4), ThreadPoolExecutor)
+        self.assertEqual(len(loads), 1)
+
+    def test_failed_chunk_cancels_the_rest(self):
+        self.daemonic()
+        samples = signal(*[(i * 100, 30) for i in range(10)], frames=1000)
+        with mock.patch("api.audio._transcribe_chunk", side_effect=RuntimeError("model crashed")):
+            with self.assertRaises(RuntimeError):
+                transcribe_windows(windows(samples, frames_per_window=50), path="", workers=1)
+        # the pool survives for the next job
+        result = transcribe_windows(windows(samples), path="", workers=1)
+        self.assertEqual(result["chunks"], 10)
@@ -0,0 +1,60 @@
+# api/tests/test_chief.py
+import json
+from unittest import mock
+
+from api import chief, metrics
+from api.llm_client import LLMUnavailable
+
+from .base import MongoTestCase
+
+LLM_PLAN = json.dumps({"plan": [
+    {"task": "authenticity_image", "args": {}},
+    {"task": "claim_extract", "args": {}},
+    {"task": "not_a_task", "args": {}},
+    {"task": "job_finalize", "args": {}},
+]})
+
+
+class PlannerTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        chief._plan_cache.clear()
+        metrics.PLAN_CACHE_LOOKUPS.reset()
+        self.llm = self.patch("api.chief.call_openrouter", mock.Mock(return_value=LLM_PLAN))
+
+    def tasks(self, plan):
+        return [step["task"] for step in plan["plan"]]
+
+    def test_rule_inputs_never_call_the_llm(self):
+        plan = chief.generate_task_plan({"media_id": "m-1", "file_type": "text", "text_input": "hi"})
+
+        self.assertEqual(self.tasks(plan)[0], "detect_text_ai")
+        self.assertTrue(all(step["args"]["media_id"] == "m-1" for step in plan["plan"]))
+        self.llm.assert_not_called()
+
+    def test_llm_plans_are_validated_and_cached_per_signature(self):
+        doc = {"media_id": "m-1", "file_type": "image", "claim_text": "a claim"}
+        plan = chief.generate_task_plan(doc)
+        self.assertEqual(self.tasks(plan), ["authenticity_image", "claim_extract", "job_finalize"])
+
+        # same signature, different media: local hit, media_id re-injected
+        again = chief.generate_task_plan({**doc, "media_id": "m-2"})
+        self.assertEqual(again["plan"][0]["args"]["media_id"], "m-2")
+
+        # a fresh process finds it in Mongo
+        chief._plan_cache.clear()
+        chief.generate_task_plan(doc)
+
+        self.assertEqual(self.llm.call_count, 1)
+        self.assertEqual(chief.plan_cache_stats()["local"]["hits"], 1)
+        self.assertEqual(chief.plan_cache_stats()["shared"], {"hits": 1, "misses": 1, "errors": 0})
+        self.assertIn('deeptrust_plan_cache_lookups_total{tier="shared",outcome="hit"} 1', metrics.render())
+
+    def test_llm_failures_degrade_to_the_default_plan_uncached(self):
+        doc = {"media_id": "m-1", "file_type": "image", "claim_text": "a claim"}
+        for error in [LLMUnavailable("circuit open"), ValueError("OPENROUTER_API_KEY is missing")]:
+            self.llm.side_effect = error
+            plan = chief.generate_task_plan(doc)
+            self.assertEqual(self.tasks(plan), [step["task"] for step in chief.default_plan(doc)])
+
+        self.assertEqual(self.db.plan_cache.count_documents({}), 0)
@@ -0,0 +1,126 @@
+# api/tests/test_claim_cache.py
+import io
+from datetime import datetime, timedelta, timezone
+
+from django.core.management import call_command
+from django_q.models import Schedule
+
+from api import claim_cache, dag, stages
+from api.writer import stage_writer
+
+from .base import MongoTestCase
+
+CLAIM = "The Eiffel Tower is in Rome."
+
+
+class Recorder:
+    """dispatcher_for(media_ids) that records what each job dispatches."""
+
+    def __init__(self):
+        self.dispatched = {}
+
+    def dispatcher(self, media_id):
+        return lambda stage: self.dispatched.setdefault(media_id, []).append(stage)
+
+    def __call__(self, media_ids):
+        return {m: self.dispatcher(m) for m in media_ids}
+
+
+class ClaimCacheTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        claim_cache._hot.clear()
+        self.recorder = Recorder()
+
+    def start_job(self, media_id, text=CLAIM):
+        """A job run up to and through claim_lookup_cache, as api.stages.execute would."""
+        self.insert_media(media_id, claim={"normalized_text": text})
+        steps = [{"task": t} for t in ["claim_normalize", "retrieval_semantic_search", "verification_ensemble"]]
+        dispatch = self.recorder.dispatcher(media_id)
+        dag.start_pipeline(media_id, steps, dispatch)
+        dag.complete_stage(media_id, "claim_normalize", dispatch)
+        outcome = claim_cache.lookup_stage(media_id)
+        if outcome != claim_cache.PARKED:
+            dag.complete_stage(media_id, "claim_lookup_cache", dispatch, skip=outcome)
+        return outcome
+
+    def pipeline(self, media_id):
+        return self.media(media_id)["pipeline"]
+
+    def expire_lease(self):
+        self.db.claims.update_many({}, {"$set": {"lease.expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+
+    def test_canonical_form(self):
+        self.assertEqual(claim_cache.canonicalize_claim("  The EIFFEL tower,  is in ROME! "),
+                         "the eiffel tower is in rome")
+        self.assertEqual(claim_cache.claim_hash(claim_cache.canonicalize_claim(CLAIM)),
+                         claim_cache.claim_hash(claim_cache.canonicalize_claim(CLAIM.upper())))
+
+    def test_single_flight_lead_wait_then_hit(self):
+        self.assertEqual(self.start_job("m-lead"), [])
+        self.assertEqual(self.start_job("m-wait"), claim_cache.PARKED)
+
+        claim_cache.publish_verdict("m-lead", "Refuted", [{"snippet": "Paris"}], self.recorder)
+
+        # the waiter's lookup completed with retrieval and verification skipped
+        self.assertEqual(sorted(self.pipeline("m-wait")["skipped"]), sorted(dag.CLAIM_CACHE_SKIPS))
+        stage_writer.flush()
+        self.assertEqual(self.media("m-wait")["claim"]["latest_verdict"], "Refuted")
+        self.assertEqual(self.start_job("m-later"), dag.CLAIM_CACHE_SKIPS)
+        claim = self.db.claims.find_one()
+        self.assertNotIn("lease", claim)
+        self.assertNotIn("waiters", claim)
+
+    def test_live_lease_is_left_alone(self):
+        self.start_job("m-lead")
+        self.start_job("m-wait")
+        self.assertEqual(claim_cache.recover_stalled_claims(self.recorder), [])
+
+    def test_failed_leader_hands_the_claim_to_a_waiter(self):
+        self.start_job("m-lead")  # its verification never publishes
+        self.assertEqual(self.start_job("m-b"), claim_cache.PARKED)
+        self.assertEqual(self.start_job("m-c"), claim_cache.PARKED)
+        self.expire_lease()
+
+        self.assertEqual(claim_cache.recover_stalled_claims(self.recorder), ["m-b"])
+
+        claim = self.db.claims.find_one()
+        self.assertEqual((claim["lease"]["owner"], claim["waiters"]), ("m-b", ["m-c"]))
+        # m-b verifies the claim itself now
+        self.assertIn("claim_lookup_cache", self.pipeline("m-b")["done"])
+        self.assertEqual(self.recorder.dispatched["m-b"][-1], "retrieval_semantic_search")
+        self.assertNotIn("skipped", self.pipeline("m-b"))
+        self.assertNotIn("claim_lookup_cache", self.pipeline("m-c")["done"])
+
+        # ... and its verdict resumes the remaining waiter
+        claim_cache.publish_verdict("m-b", "Refuted", [], self.recorder)
+        self.assertEqual(sorted(self.pipeline("m-c")["skipped"]), sorted(dag.CLAIM_CACHE_SKIPS))
+
+    def test_failing_leader_hands_over_at_once(self):
+        self.start_job("m-lead")
+        self.start_job("m-wait")
+        stage_writer.flush()
+
+        self.assertTrue(stages.fail_job(None, "m-lead", "verification_ensemble", "LLMError: down", self.recorder))
+
+        claim = self.db.claims.find_one()
+        self.assertEqual((claim["lease"]["owner"], claim["waiters"]), ("m-wait", []))
+        self.assertEqual(self.recorder.dispatched["m-wait"][-1], "retrieval_semantic_search")
+        # a failed job that held no lease touches nothing
+        self.assertIsNone(claim_cache.abandon_lease(claim["claim_hash"], "m-lead", self.recorder))
+
+    def test_expired_lease_is_taken_over_by_a_new_job(self):
+        self.start_job("m-lead")
+        self.start_job("m-wait")
+        self.expire_lease()
+
+        self.assertEqual(self.start_job("m-new"), [])
+        claim_cache.publish_verdict("m-new", "Supported", [], self.recorder)
+        self.assertEqual(sorted(self.pipeline("m-wait")["skipped"]), sorted(dag.CLAIM_CACHE_SKIPS))
+
+    def test_provision_schedules_the_recovery(self):
+        for _ in range(2):
+            call_command("provision", skip_minio=True, stdout=io.StringIO())
+        schedule = Schedule.objects.get(name="recover_stalled_claims")
+        self.assertEqual(schedule.func, "api.claim_cache.recover_stalled_claims")
+        self.assertEqual(schedule.cluster, "deeptrust-planning")
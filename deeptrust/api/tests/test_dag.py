@@ -0,0 +1,120 @@
+# api/tests/test_dag.py
+from api import dag
+from api.executors import InlineExecutor
+from api.models import VerificationJob
+from api.writer import stage_writer
+
+from .base import MongoTestCase
+
+
+def plan(*stages):
+    return [{"task": s, "args": {}} for s in stages]
+
+
+class BuildPipelineTests(MongoTestCase):
+    def test_orders_stages_and_resolves_unplanned_dependencies(self):
+        pipeline = dag.build_pipeline(plan(
+            "verification_ensemble", "transcribe_audio", "claim_extract",
+            "retrieval_semantic_search", "claim_extract", "job_finalize",
+        ))
+
+        # duplicates and the planner's own finalize are dropped, the cache lookup is added
+        self.assertEqual(sorted(pipeline["stages"]), sorted([
+            "transcribe_audio", "claim_extract", "claim_lookup_cache",
+            "retrieval_semantic_search", "verification_ensemble",
+        ]))
+        # claim_normalize was not planned: the lookup waits on claim_extract instead
+        self.assertEqual(pipeline["deps"]["claim_lookup_cache"], ["claim_extract"])
+        order = pipeline["stages"]
+        for stage, deps in pipeline["deps"].items():
+            for dep in deps:
+                self.assertLess(order.index(dep), order.index(stage))
+
+    def test_ready_stages_are_the_roots(self):
+        pipeline = dag.build_pipeline(plan("extract_frames", "authenticity_video", "detect_text_ai"))
+        self.assertEqual(dag.ready_stages(pipeline), ["extract_frames", "detect_text_ai"])
+
+        pipeline["done"] = ["extract_frames"]
+        pipeline["dispatched"] = ["extract_frames", "detect_text_ai"]
+        self.assertEqual(dag.ready_stages(pipeline), ["authenticity_video"])
+
+    def test_progress_percent_keeps_100_for_finalize(self):
+        self.assertEqual(dag.progress_percent(None), 0)
+        self.assertEqual(dag.progress_percent({"total": 4, "done": {"a": True}}), 25)
+        self.assertEqual(dag.progress_percent({"total": 1, "done": {"a": True}}), 99)
+
+
+class BarrierTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.insert_media("m-1")
+        self.dispatched = []
+
+    def dispatch(self, stage):
+        self.dispatched.append(stage)
+
+    def test_finalize_waits_for_every_branch(self):
+        dag.start_pipeline("m-1", plan("extract_frames", "authenticity_video", "detect_text_ai"), self.dispatch)
+        self.assertEqual(self.dispatched, ["extract_frames", "detect_text_ai"])
+
+        dag.complete_stage("m-1", "extract_frames", self.dispatch)
+        self.assertEqual(self.dispatched[-1], "authenticity_video")
+        dag.complete_stage("m-1", "authenticity_video", self.dispatch)
+        self.assertNotIn(dag.FINALIZE_STAGE, self.dispatched)
+
+        dag.complete_stage("m-1", "detect_text_ai", self.dispatch)
+        self.assertEqual(self.dispatched[-1], dag.FINALIZE_STAGE)
+        self.assertEqual(self.media("m-1")["progress"]["done"], {
+            "extract_frames": True, "authenticity_video": True, "detect_text_ai": True,
+        })
+
+    def test_repeated_completion_dispatches_once(self):
+        dag.start_pipeline("m-1", plan("detect_text_ai", "truthscore_compute"), self.dispatch)
+        dag.complete_stage("m-1", "detect_text_ai", self.dispatch)
+        dag.complete_stage("m-1", "detect_text_ai", self.dispatch)
+        dag.complete_stage("m-1", "truthscore_compute", self.dispatch)
+        dag.complete_stage("m-1", "truthscore_compute", self.dispatch)
+
+        self.assertEqual(self.dispatched.count("truthscore_compute"), 1)
+        self.assertEqual(self.dispatched.count(dag.FINALIZE_STAGE), 1)
+        self.assertEqual(dag.progress_percent(self.media("m-1")["progress"]), 99)
+
+    def test_completion_stores_buffered_results(self):
+        dag.start_pipeline("m-1", plan("detect_text_ai"), self.dispatch)
+        stage_writer.set("m-1", {"text_ai_score": 0.3})
+        dag.complete_stage("m-1", "detect_text_ai", self.dispatch)
+
+        self.assertEqual(self.media("m-1")["text_ai_score"], 0.3)
+        self.assertEqual(stage_writer.take("m-1"), {})
+
+    def test_skipped_stages_count_as_done_without_running(self):
+        steps = plan("claim_extract", "retrieval_semantic_search", "verification_ensemble", "truthscore_compute")
+        dag.start_pipeline("m-1", steps, self.dispatch)
+        dag.complete_stage("m-1", "claim_extract", self.dispatch)
+        dag.complete_stage("m-1", "claim_lookup_cache", self.dispatch, skip=dag.CLAIM_CACHE_SKIPS)
+
+        self.assertNotIn("retrieval_semantic_search", self.dispatched)
+        self.assertEqual(self.dispatched[-1], "truthscore_compute")
+        pipeline = self.media("m-1")["pipeline"]
+        self.assertEqual(sorted(pipeline["skipped"]), sorted(dag.CLAIM_CACHE_SKIPS))
+
+
+class InlinePipelineTests(MongoTestCase):
+    def test_job_finalizes_once_all_stages_ran(self):
+        user = self.make_user()
+        self.insert_media("m-1", file_type="text", text_input="The sky is green. It is.")
+        VerificationJob.objects.create(job_id="job-1", user=user, media_id="m-1")
+
+        executor = InlineExecutor()
+        steps = plan("detect_text_ai", "claim_extract", "claim_normalize", "truthscore_compute")
+        dag.start_pipeline("m-1", steps, executor.dispatcher("job-1", "m-1"))
+
+        doc = self.media("m-1")
+        self.assertEqual(doc["status"], "completed")
+        self.assertEqual(doc["claim"]["normalized_text"], "the sky is green")
+        self.assertEqual(doc["truthscore"], 72)
+        self.assertEqual(sorted(doc["timings"]), sorted(s["task"] for s in steps))
+        job = VerificationJob.objects.get(job_id="job-1")
+        self.assertTrue(job.result_ready)
+        summary = self.db.audit_log.find_one({"event": "job_summary", "media_id": "m-1"})
+        self.assertEqual(summary["job_id"], "job-1")
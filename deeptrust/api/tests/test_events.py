@@ -0,0 +1,91 @@
+# api/tests/test_events.py
+import json
+from unittest import mock
+
+from django.test import AsyncClient, override_settings
+
+from api import views
+from api.events import InProcessBroker, channel_for
+from api.models import VerificationJob
+
+from .base import MongoTestCase
+
+
+class JobEventsTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user()
+        self.insert_media("m-1", status="workflow_started", progress={"total": 4, "done": {"a": True}})
+        VerificationJob.objects.create(job_id="job-1", user=self.user, media_id="m-1")
+        self.client.force_login(self.user)
+        self.broker = InProcessBroker()
+        self.patch("api.views.get_broker", lambda: self.broker)
+
+    async def events_client(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        return client
+
+    def test_wsgi_gets_no_stream(self):
+        # runserver / gunicorn would buffer the async stream and pin a thread
+        with override_settings(EVENTS_BACKEND="redis"):
+            response = self.client.get("/api/events/job-1/")
+        self.assertEqual(response.status_code, 204)
+
+    async def test_asgi_without_a_cross_process_broker_gets_no_stream(self):
+        client = await self.events_client()
+        with override_settings(EVENTS_BACKEND="inprocess"):
+            response = await client.get("/api/events/job-1/")
+        self.assertEqual(response.status_code, 204)
+
+    @override_settings(EVENTS_BACKEND="redis")
+    async def test_stream_pushes_events_then_closes_after_max_seconds(self):
+        client = await self.events_client()
+        with mock.patch.object(views, "SSE_MAX_SECONDS", 0.3):
+            response = await client.get("/api/events/job-1/")
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+
+            chunks = []
+            async for chunk in response.streaming_content:
+                chunks.append(chunk.decode())
+                if len(chunks) == 1:
+                    # subscribed before the snapshot was sent
+                    self.broker.publish(channel_for("m-1"), {"status": "processing", "progress": 50})
+
+        events = [json.loads(c[len("data: "):]) for c in chunks if c.startswith("data: ")]
+        self.assertEqual([(e["status"], e["progress"]) for e in events], [("workflow_started", 25), ("processing", 50)])
+
+    @override_settings(EVENTS_BACKEND="redis")
+    async def test_stream_ends_when_the_job_fails(self):
+        client = await self.events_client()
+        response = await client.get("/api/events/job-1/")
+
+        chunks = []
+        async for chunk in response.streaming_content:
+            chunks.append(chunk.decode())
+            if len(chunks) == 1:
+                self.broker.publish(channel_for("m-1"), {"status": "failed", "progress": 25, "stage": "claim_extract"})
+
+        self.assertEqual(json.loads(chunks[-1][len("data: "):])["status"], "failed")
+
+    @override_settings(EVENTS_BACKEND="redis")
+    async def test_quiet_stream_sends_ping_events(self):
+        client = await self.events_client()
+        with mock.patch.object(views, "SSE_HEARTBEAT_SECONDS", 0.05), mock.patch.object(views, "SSE_MAX_SECONDS", 0.3):
+            response = await client.get("/api/events/job-1/")
+            chunks = [chunk.decode() async for chunk in response.streaming_content]
+
+        # a named event reaches the page's "ping" listener; a comment would not
+        self.assertIn("event: ping\ndata: {}\n\n", chunks[1:])
+
+    def test_loading_page_polls_where_events_cannot_stream(self):
+        response = self.client.get("/loading/job-1/")
+        self.assertFalse(response.context["use_events"])
+        self.assertContains(response, "const useEvents = false;")
+        self.assertContains(response, "startPolling()")
+
+    def test_loading_page_outlasts_the_heartbeat(self):
+        response = self.client.get("/loading/job-1/")
+        self.assertContains(response, f"const EVENTS_STALL_MS = {int(views.SSE_STALL_SECONDS * 1000)};")
+        self.assertGreater(views.SSE_STALL_SECONDS, 2 * views.SSE_HEARTBEAT_SECONDS)
+        self.assertContains(response, 'events.addEventListener("ping", armStall);')
@@ -0,0 +1,139 @@
+# api/tests/test_imagehash.py
+import io
+import os
+import tempfile
+
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from PIL import Image
+
+from api.imagehash import (
+    ahash_batch, dhash_batch, hamming, hash_images, image_hash_fields, phash_batch, resize_area,
+)
+from api.phash_index import phash_to_int
+
+from .base import MongoTestCase
+
+
+def smooth_image(seed, size=256):
+    """Random 16x16 blocks blown up to size x size RGB: survives rescaling."""
+    blocks = np.random.default_rng(seed).integers(0, 256, size=(16, 16, 3), dtype=np.uint8)
+    return np.kron(blocks, np.ones((size // 16, size // 16, 1), dtype=np.uint8))
+
+
+def distance(a, b):
+    return int(hamming([a], [b])[0])
+
+
+def encode(pixels, fmt="PNG", size=None, **options):
+    img = Image.fromarray(pixels)
+    if size:
+        img = img.resize((size, size), Image.BILINEAR)
+    buf = io.BytesIO()
+    img.save(buf, fmt, **options)
+    buf.seek(0)
+    return buf
+
+
+class BatchHashTests(SimpleTestCase):
+    def test_resize_area_averages_blocks(self):
+        gray = np.arange(16, dtype=np.float32).reshape(1, 4, 4)
+        np.testing.assert_allclose(resize_area(gray, 2, 2)[0], [[2.5, 4.5], [10.5, 12.5]])
+
+    def test_known_patterns(self):
+        gradient = np.tile(np.arange(72, dtype=np.uint8) * 3, (64, 1))[None]
+        self.assertEqual(int(dhash_batch(gradient)[0]), 0xFFFFFFFFFFFFFFFF)
+
+        left_bright = np.zeros((1, 64, 64), dtype=np.uint8)
+        left_bright[:, :, :32] = 255
+        self.assertEqual(int(ahash_batch(left_bright)[0]), 0xF0F0F0F0F0F0F0F0)
+
+    def test_batch_matches_one_at_a_time(self):
+        batch = np.stack([smooth_image(seed, 64) for seed in range(5)])
+        hashes = phash_batch(batch)
+        self.assertEqual(hashes.dtype, np.uint64)
+        self.assertEqual(list(hashes), [phash_batch(image[None])[0] for image in batch])
+
+    def test_phash_separates_images_and_flips_on_inversion(self):
+        a, b = smooth_image(1, 64), smooth_image(2, 64)
+        ha, hb, hinv = phash_batch(np.stack([a, b, 255 - a]))
+        self.assertGreater(distance(ha, hb), 16)
+        # AC coefficients and their median change sign; the DC bit does not
+        self.assertGreaterEqual(distance(ha, hinv), 60)
+
+    def test_hash_images_survives_rescale_and_recompression(self):
+        pixels = smooth_image(3)
+        sources = [
+            encode(pixels),
+            encode(pixels, "JPEG", size=160, quality=80),
+            encode(smooth_image(4)),
+            io.BytesIO(b"not an image"),
+        ]
+        hashes = hash_images(sources)
+
+        self.assertEqual(sorted(hashes), ["ahash", "dhash", "phash"])
+        phashes = hashes["phash"]
+        self.assertIsNone(phashes[3])
+        self.assertTrue(all(len(h) == 16 for h in phashes[:3]))
+        self.assertLessEqual(distance(phash_to_int(phashes[0]), phash_to_int(phashes[1])), 8)
+        self.assertGreater(distance(phash_to_int(phashes[0]), phash_to_int(phashes[2])), 16)
+
+    def test_image_hash_fields(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "a.png")
+            with open(path, "wb") as fh:
+                fh.write(encode(smooth_image(5)).getvalue())
+
+            fields = image_hash_fields({"minio_path": f"local://{path}"})
+            self.assertEqual(sorted(fields), ["ahash", "dhash", "phash"])
+            self.assertEqual(image_hash_fields({"minio_path": f"local://{tmp}/missing.png"}), {})
+            self.assertEqual(image_hash_fields({"minio_path": None}), {})
+
+
+class BackfillPHashTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def stored_image(self, name, seed):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as fh:
+            fh.write(encode(smooth_image(seed)).getvalue())
+        return f"local://{path}"
+
+    def backfill(self, **options):
+        out = io.StringIO()
+        call_command("backfill_phash", batch_size=2, readers=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_hashes_missing_images_and_resumes(self):
+        self.insert_media("m-1", file_type="image", phash=None, minio_path=self.stored_image("1.png", 1))
+        self.insert_media("m-gone", file_type="image", phash=None, minio_path=f"local://{self.dir}/gone.png")
+        self.insert_media("m-2", file_type="image", phash=None, minio_path=self.stored_image("2.png", 2))
+        self.insert_media("m-text", file_type="text", phash=None, minio_path=None)
+        self.insert_media("m-done", file_type="image", phash="0" * 16, minio_path=self.stored_image("3.png", 3))
+
+        self.backfill()
+
+        for media_id in ("m-1", "m-2"):
+            doc = self.media(media_id)
+            self.assertEqual(doc["phash"], hash_images([doc["minio_path"][len("local://"):]])["phash"][0])
+            self.assertIsNotNone(doc["phash_at"])
+        self.assertIsNone(self.media("m-gone")["phash"])
+        self.assertEqual(self.media("m-done")["phash"], "0" * 16)
+        state = self.db.checkpoints.find_one({"_id": "backfill_phash"})
+        self.assertEqual((state["processed"], state["hashed"], state["failed"]), (3, 2, 1))
+
+        # a second run starts after the checkpoint: nothing left to do
+        self.assertIn("Resuming", self.backfill())
+        self.assertEqual(self.db.checkpoints.find_one({"_id": "backfill_phash"})["processed"], 3)
+
+        # --restart revisits the unreadable doc once its file shows up
+        with open(os.path.join(self.dir, "gone.png"), "wb") as fh:
+            fh.write(encode(smooth_image(6)).getvalue())
+        self.backfill(restart=True)
+        self.assertIsNotNone(self.media("m-gone")["phash"])
+        self.assertEqual(self.db.checkpoints.find_one({"_id": "backfill_phash"})["hashed"], 1)
@@ -0,0 +1,116 @@
+# api/tests/test_lanes.py
+from datetime import timedelta
+
+from django.test import override_settings
+
+from api import lanes
+from api.lanes import LANE_MAX_ATTEMPTS, enqueue, lane_stats, run_next
+
+from .base import MongoTestCase
+
+LANE = lanes.INTERACTIVE_LANE
+served = []
+
+
+def record(user_id, n):
+    served.append((user_id, n))
+
+
+def explode(*args):
+    raise RuntimeError("boom")
+
+
+class LaneTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        served.clear()
+
+    def submit(self, user_id, count, func="api.tests.test_lanes.record"):
+        for n in range(count):
+            enqueue(LANE, user_id, func, user_id, n)
+
+    def drain(self, limit=100):
+        while limit and run_next(LANE):
+            limit -= 1
+        return [user_id for user_id, _ in served]
+
+    def age(self, user_id, seconds):
+        self.db.lane_queue.update_many(
+            {"user_id": user_id}, {"$set": {"enqueued_at": lanes._now() - timedelta(seconds=seconds)}},
+        )
+
+    def test_users_alternate_regardless_of_arrival(self):
+        self.submit("a", 6)
+        self.submit("b", 2)
+
+        order = self.drain()
+        self.assertEqual(sorted(order[:4]), ["a", "a", "b", "b"])
+        self.assertEqual(order[4:], ["a"] * 4)
+        # each user's own calls stay in order
+        self.assertEqual([n for user_id, n in served if user_id == "a"], list(range(6)))
+        self.assertEqual(self.async_task.call_count, 8)
+        self.assertEqual(self.db.lane_queue.count_documents({}), 0)
+
+    def test_weights_share_the_lane(self):
+        self.db.lane_users.insert_one({"_id": f"{LANE}:a", "weight": 2.0})
+        self.submit("a", 8)
+        self.submit("b", 8)
+
+        order = self.drain()
+        self.assertEqual(order[:6].count("a"), 4)
+
+    def test_returning_user_starts_at_the_lane_clock(self):
+        self.submit("a", 5)
+        self.drain()
+        self.submit("b", 1)
+        self.drain()
+
+        vtime = self.db.lane_users.find_one({"_id": f"{LANE}:b"})["vtime"]
+        self.assertEqual(vtime, 5.0)  # not 1.0: no credit banked while away
+
+    def test_old_calls_are_promoted_past_fairness(self):
+        self.db.lane_users.insert_one({"_id": f"{LANE}:a", "vtime": 100.0})
+        self.submit("b", 1)
+        self.submit("a", 1)
+        self.age("a", 61)
+
+        self.assertEqual(self.drain(), ["a", "b"])
+        self.db.lane_users.update_one({"_id": f"{LANE}:a"}, {"$set": {"vtime": 1000.0}})
+        with override_settings(LANE_PROMOTE_AFTER=3600):
+            self.submit("b", 1)
+            self.submit("a", 1)
+            self.age("a", 61)
+            self.assertEqual(self.drain()[2:], ["b", "a"])
+
+    def test_failed_call_is_retried_then_kept_as_failed(self):
+        self.submit("a", 1, func="api.tests.test_lanes.explode")
+
+        for attempt in range(1, LANE_MAX_ATTEMPTS + 1):
+            with self.assertRaises(RuntimeError):
+                run_next(LANE)
+            item = self.db.lane_queue.find_one()
+            self.assertEqual(item["attempts"], attempt)
+            self.assertEqual(item["last_error"], "RuntimeError: boom")
+        self.assertEqual(item["state"], "failed")
+        # one token per enqueue plus one per retry
+        self.assertEqual(self.async_task.call_count, LANE_MAX_ATTEMPTS)
+
+        self.assertFalse(run_next(LANE))
+        self.assertEqual(lane_stats()[LANE]["failed"], 1)
+
+    def test_call_of_a_dead_worker_is_handed_out_again(self):
+        self.submit("a", 1)
+        stale = lanes._now() - timedelta(seconds=lanes.LANE_LEASE_SECONDS + 1)
+        self.db.lane_queue.update_one({}, {"$set": {"state": "running", "started_at": stale, "attempts": 1}})
+
+        self.assertEqual(self.drain(), ["a"])
+        self.assertEqual(self.db.lane_queue.count_documents({}), 0)
+
+    def test_call_that_kept_killing_workers_is_failed(self):
+        self.submit("a", 1)
+        stale = lanes._now() - timedelta(seconds=lanes.LANE_LEASE_SECONDS + 1)
+        self.db.lane_queue.update_one({}, {"$set": {"state": "running", "started_at": stale, "attempts": LANE_MAX_ATTEMPTS}})
+
+        self.assertTrue(run_next(LANE))
+        self.assertEqual(served, [])
+        self.assertEqual(self.db.lane_queue.find_one()["state"], "failed")
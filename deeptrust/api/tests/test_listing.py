@@ -0,0 +1,60 @@
+# api/tests/test_listing.py
+from datetime import datetime, timedelta, timezone
+
+from api.listing import decode_cursor, encode_cursor, list_user_jobs
+from api.models import VerificationJob
+
+from .base import APITestCase
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class KeysetListingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        # jobs 0-2 share a timestamp: the id breaks the tie
+        for i, offset in enumerate([0, 0, 0, 1, 2, 3, 4]):
+            job = VerificationJob.objects.create(job_id=f"job-{i}", user=self.user, media_id=f"m-{i}")
+            VerificationJob.objects.filter(pk=job.pk).update(created_at=T0 + timedelta(minutes=offset))
+        other = self.make_user("bob")
+        VerificationJob.objects.create(job_id="job-bob", user=other, media_id="m-bob")
+        self.insert_media("m-4", status="completed", truthscore=72)
+
+    def pages(self, limit):
+        pages, cursor = [], None
+        while True:
+            jobs, cursor = list_user_jobs(self.user, cursor=cursor, limit=limit)
+            pages.append([job["job_id"] for job in jobs])
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_every_job_once_newest_first(self):
+        expected = ["job-6", "job-5", "job-4", "job-3", "job-2", "job-1", "job-0"]
+        for limit in (1, 2, 3, 7, 50):
+            pages = self.pages(limit)
+            self.assertEqual([j for page in pages for j in page], expected)
+            self.assertTrue(all(pages))
+
+    def test_page_is_joined_with_media_docs(self):
+        jobs, _ = list_user_jobs(self.user, limit=3)
+        self.assertEqual([(j["status"], j["truthscore"]) for j in jobs],
+                         [("processing", None), ("processing", None), ("completed", 72)])
+
+    def test_cursor_round_trip_and_garbage(self):
+        job = VerificationJob.objects.get(job_id="job-1")
+        self.assertEqual(decode_cursor(encode_cursor(job)), (job.created_at, job.id))
+        for cursor in ["nonsense", "bm8tcGlwZQ", encode_cursor(job)[:-3]]:
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_api_pagination(self):
+        response = self.api.get("/api/jobs/", {"limit": 4})
+        data = response.json()
+        self.assertEqual(len(data["jobs"]), 4)
+
+        response = self.api.get("/api/jobs/", {"limit": 4, "cursor": data["next_cursor"]})
+        self.assertEqual([j["job_id"] for j in response.json()["jobs"]], ["job-2", "job-1", "job-0"])
+        self.assertIsNone(response.json()["next_cursor"])
+
+        self.assertEqual(self.api.get("/api/jobs/", {"cursor": "nonsense"}).status_code, 400)
+        self.assertEqual(self.api.get("/api/jobs/", {"limit": "many"}).status_code, 400)
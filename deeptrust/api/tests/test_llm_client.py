@@ -0,0 +1,116 @@
+# api/tests/test_llm_client.py
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from api.llm_client import CircuitBreaker, LLMError, LLMUnavailable, OpenRouterClient
+
+OK_BODY = '{"choices": [{"message": {"content": "{}"}}]}'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch("api.llm_client.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(threshold=2, reset_timeout=30)
+
+    def trip(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_lets_one_trial_through(self):
+        self.trip()
+        self.clock.now += 30
+        self.assertEqual(self.breaker.state, "half_open")
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        self.trip()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, "open")
+        self.clock.now += 29
+        self.assertFalse(self.breaker.allow())
+
+    def test_trial_ending_without_an_outcome_frees_the_slot(self):
+        self.trip()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.end_call()
+
+        self.assertEqual(self.breaker.state, "half_open")
+        self.assertTrue(self.breaker.allow())
+
+
+class OpenRouterClientTests(SimpleTestCase):
+    def make_client(self, *responses, threshold=5):
+        transport = mock.Mock(side_effect=list(responses))
+        client = OpenRouterClient(
+            "http://llm.test", "key", transport=transport, max_retries=2, backoff_base=0,
+            breaker=CircuitBreaker(threshold=threshold, reset_timeout=0),
+        )
+        return client, transport
+
+    def test_retries_transient_errors(self):
+        client, transport = self.make_client(
+            requests.ConnectionError("reset"), (503, {}, "busy"), (200, {}, OK_BODY),
+        )
+        self.assertEqual(client.chat("model", []), "{}")
+        self.assertEqual(transport.call_count, 3)
+
+    def test_client_errors_are_not_retried(self):
+        client, transport = self.make_client((400, {}, "bad request"))
+        with self.assertRaises(LLMError):
+            client.chat("model", [])
+        self.assertEqual(transport.call_count, 1)
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_exhausted_retries_count_against_the_breaker(self):
+        client, _ = self.make_client(*[(502, {}, "")] * 3, threshold=1)
+        with self.assertRaises(LLMUnavailable):
+            client.chat("model", [])
+        self.assertIsNotNone(client.breaker.opened_at)
+
+    def test_unexpected_error_in_the_trial_does_not_wedge_the_breaker(self):
+        client, transport = self.make_client(
+            requests.exceptions.ChunkedEncodingError("truncated"), (200, {}, OK_BODY),
+        )
+        client.breaker.opened_at = 0  # open, and past reset_timeout: half-open
+
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            client.chat("model", [])
+        self.assertEqual(client.chat("model", []), "{}")
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_missing_api_key(self):
+        client = OpenRouterClient("http://llm.test", "", transport=mock.Mock())
+        with self.assertRaises(ValueError):
+            client.chat("model", [])
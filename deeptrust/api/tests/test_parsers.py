@@ -0,0 +1,27 @@
+# api/tests/test_parsers.py
+import io
+
+from django.test import SimpleTestCase
+
+from api.parsers import NDJSONParser
+
+
+def parse(body):
+    return NDJSONParser().parse(io.BytesIO(body))
+
+
+class NDJSONParserTests(SimpleTestCase):
+    def test_one_object_per_line_skipping_blank_lines(self):
+        items = parse(b'{"text_input": "a"}\n\n  \n{"text_input": "b", "claim_text": "c"}\r\n')
+        self.assertEqual(items, [{"text_input": "a"}, {"text_input": "b", "claim_text": "c"}])
+
+    def test_empty_body(self):
+        self.assertEqual(parse(b""), [])
+
+    def test_bad_lines_become_item_errors(self):
+        items = parse(b'{"text_input": "a"}\n{not json\n[1, 2]\n\xff\xfe\n')
+
+        self.assertEqual(items[0], {"text_input": "a"})
+        self.assertTrue(items[1]["_error"].startswith("Invalid JSON"))
+        self.assertEqual(items[2], {"_error": "Each line must be a JSON object"})
+        self.assertIn("not valid", items[3]["_error"])
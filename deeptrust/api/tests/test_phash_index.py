@@ -0,0 +1,107 @@
+# api/tests/test_phash_index.py
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from api import phash_index
+from api.phash_index import PHashIndex, int_to_phash, popcount64
+from api.stages import STAGES, StageContext
+
+from .base import MongoTestCase
+
+
+def flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+class PHashIndexTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.hashes = rng.integers(0, 2 ** 63, size=2000, dtype=np.uint64)
+        self.ids = [f"m-{i}" for i in range(len(self.hashes))]
+        self.index = PHashIndex()
+        self.index.build(self.ids, self.hashes)
+
+    def brute_force(self, query, max_distance):
+        dist = popcount64(self.hashes ^ np.uint64(query))
+        return sorted((self.ids[i], int(dist[i])) for i in np.flatnonzero(dist <= max_distance))
+
+    def test_matches_a_linear_scan(self):
+        base = int(self.hashes[42])
+        for max_distance in (0, 4, 8, 12):  # 12 is past the probing radius: scan path
+            query = flip(base, 1, 17, 33)
+            hits = self.index.query(query, max_distance, limit=100)
+            self.assertEqual(sorted(hits), self.brute_force(query, max_distance))
+
+    def test_nearest_first_and_hex_input(self):
+        base = int(self.hashes[3])
+        self.index.add("near", flip(base, 5))
+        hits = self.index.query(int_to_phash(base), 8)
+        self.assertEqual(hits[:2], [("m-3", 0), ("near", 1)])
+
+    def test_pending_adds_are_searchable_and_merge(self):
+        index = PHashIndex(merge_threshold=3)
+        index.add("a", 0)
+        self.assertEqual(index.query(flip(0, 63), 2), [("a", 1)])
+        index.add("b", 0xFF)
+        index.add("c", 0xFFFF)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index._pending_ids, [])
+        self.assertEqual(index.query(0, 8), [("a", 0), ("b", 8)])
+
+
+class PHashSyncTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        phash_index._index = None
+        self.addCleanup(setattr, phash_index, "_index", None)
+
+    def refresh(self):
+        phash_index._last_refresh = 0.0
+        return phash_index.get_phash_index()
+
+    def test_hash_set_on_an_older_doc_is_pulled(self):
+        now = datetime.now(timezone.utc)
+        self.insert_media("m-old", file_type="image")
+        self.insert_media("m-new", file_type="image", phash=int_to_phash(0xF0F0), phash_at=now)
+        self.assertEqual(len(phash_index.get_phash_index()), 1)
+
+        # backfilled later: an older _id than anything already indexed
+        self.db.media_docs.update_one(
+            {"media_id": "m-old"}, {"$set": {"phash": int_to_phash(0x0F0F), "phash_at": now + timedelta(seconds=1)}},
+        )
+        index = self.refresh()
+        self.assertEqual(index.query(0x0F0F, 0), [("m-old", 0)])
+
+        # the overlap window re-reads both docs without duplicating them
+        self.refresh()
+        self.assertEqual(len(index), 2)
+
+    def test_local_adds_are_not_pulled_twice(self):
+        self.insert_media("m-1", phash=int_to_phash(1), phash_at=datetime.now(timezone.utc))
+        index = phash_index.get_phash_index()
+        self.insert_media("m-2", phash=int_to_phash(2), phash_at=datetime.now(timezone.utc))
+        phash_index.index_phash("m-2", int_to_phash(2))
+
+        self.refresh()
+        self.assertEqual(len(index), 2)
+
+    def test_authenticity_image_reports_and_reuses_near_duplicates(self):
+        self.insert_media(
+            "m-known", status="completed", authenticity_score=0.12,
+            phash=int_to_phash(0xABCDEF), phash_at=datetime.now(timezone.utc),
+        )
+        self.insert_media("m-1", file_type="image", minio_path="uploads/m-1.png")
+        hashes = {"phash": int_to_phash(flip(0xABCDEF, 2)), "dhash": "0" * 16, "ahash": "0" * 16}
+
+        with mock.patch("api.stages.image_hash_fields", return_value=hashes):
+            fields = STAGES["authenticity_image"].fn(StageContext("job-1", "m-1", {}, None))
+
+        self.assertEqual(fields["authenticity_score"], 0.12)
+        self.assertEqual(fields["near_duplicates"][0]["media_id"], "m-known")
+        self.assertEqual(fields["near_duplicates"][0]["distance"], 1)
+        self.assertEqual(phash_index.get_phash_index().query(hashes["phash"], 0), [("m-1", 0)])
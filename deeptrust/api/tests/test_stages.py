@@ -0,0 +1,80 @@
+# api/tests/test_stages.py
+from unittest import mock
+
+from api import dag, lanes
+from api.executors import DjangoQExecutor, InlineExecutor
+from api.models import VerificationJob
+from api.stages import STAGES, fail_job
+
+from .base import MongoTestCase
+
+
+def plan(*stages):
+    return [{"task": s, "args": {}} for s in stages]
+
+
+class StageFailureTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user()
+        self.insert_media("m-1", user_id=str(self.user.id), file_type="text", text_input="The sky is green.")
+        VerificationJob.objects.create(job_id="job-1", user=self.user, media_id="m-1")
+        self.events = self.patch("api.stages.publish_job_event", mock.Mock())
+
+    def break_stage(self, name, error=RuntimeError("model down")):
+        patcher = mock.patch.object(STAGES[name], "fn", side_effect=error)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def assert_failed(self, stage, error="RuntimeError: model down"):
+        doc = self.media("m-1")
+        self.assertEqual((doc["status"], doc["failed_stage"]), ("failed", stage))
+        self.assertEqual(doc["errors"], {stage: error})
+        self.assertEqual(VerificationJob.objects.get(job_id="job-1").status, "failed")
+        self.events.assert_called_with("m-1", "failed", mock.ANY, stage=stage)
+
+    def test_inline_failure_fails_the_job_instead_of_hanging(self):
+        self.break_stage("claim_extract")
+        executor = InlineExecutor()
+        dag.start_pipeline("m-1", plan("detect_text_ai", "claim_extract", "claim_normalize"), executor.dispatcher("job-1", "m-1"))
+
+        self.assert_failed("claim_extract")
+        # stages that did not depend on it still ran and kept their output
+        doc = self.media("m-1")
+        self.assertIn("text_ai_score", doc)
+        self.assertNotIn("claim_normalize", doc["pipeline"]["done"])
+
+    def test_failed_or_completed_jobs_are_left_alone(self):
+        self.assertTrue(fail_job("job-1", "m-1", "claim_extract", "first"))
+        self.assertFalse(fail_job("job-1", "m-1", "claim_normalize", "second"))
+        self.assertEqual(self.media("m-1")["errors"], {"claim_extract": "first"})
+
+        self.insert_media("m-done", status="completed")
+        self.assertFalse(fail_job("job-2", "m-done", "claim_extract", "late"))
+        self.assertEqual(self.media("m-done")["status"], "completed")
+
+    def test_lane_retries_then_fails_the_job(self):
+        body = self.break_stage("detect_text_ai")
+        DjangoQExecutor().submit("job-1", "m-1", "detect_text_ai")
+
+        for _ in range(lanes.LANE_MAX_ATTEMPTS - 1):
+            with self.assertRaises(RuntimeError):
+                lanes.run_next(lanes.INTERACTIVE_LANE)
+            self.assertEqual(self.media("m-1")["status"], "uploaded")
+        with self.assertRaises(RuntimeError):
+            lanes.run_next(lanes.INTERACTIVE_LANE)
+
+        self.assertEqual(body.call_count, lanes.LANE_MAX_ATTEMPTS)
+        self.assert_failed("detect_text_ai")
+
+    def test_retry_that_succeeds_keeps_the_job_going(self):
+        self.break_stage("detect_text_ai").side_effect = [RuntimeError("blip"), {"text_ai_score": 0.1}]
+        dag.start_pipeline("m-1", plan("detect_text_ai"), DjangoQExecutor().dispatcher("job-1", "m-1"))
+
+        with self.assertRaises(RuntimeError):
+            lanes.run_next(lanes.INTERACTIVE_LANE)
+        self.assertTrue(lanes.run_next(lanes.INTERACTIVE_LANE))  # the stage, then finalize
+        self.assertTrue(lanes.run_next(lanes.INTERACTIVE_LANE))
+
+        self.assertEqual(self.media("m-1")["status"], "completed")
+        self.assertEqual(self.db.lane_queue.count_documents({}), 0)
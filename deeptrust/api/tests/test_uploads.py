@@ -0,0 +1,216 @@
+# api/tests/test_uploads.py
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.test import SimpleTestCase, override_settings
+
+from api import uploads
+from api.uploads import (
+    PIPE_DEPTH, LocalSink, MinioSink, StreamingUploadHandler, discard_upload, sniff_mime_type,
+)
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 56
+
+
+class FakeMinio:
+    """Just enough of the MinIO client; put_object waits on `gate` before reading."""
+
+    def __init__(self, error=None):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.error = error
+        self.objects = {}
+        self.removed = []
+
+    def put_object(self, bucket, name, data, length, part_size, content_type):
+        self.gate.wait()
+        if self.error:
+            raise self.error
+        body = b""
+        while True:
+            part = data.read(part_size)
+            if not part:
+                break
+            body += part
+        self.objects[name] = (body, content_type)
+
+    def remove_object(self, bucket, name):
+        self.removed.append(name)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class SniffTests(SimpleTestCase):
+    def test_magic_bytes(self):
+        cases = {
+            PNG: "image/png",
+            b"\xff\xd8\xff\xe0\x00\x10JFIF": "image/jpeg",
+            b"GIF89a\x01\x00": "image/gif",
+            b"RIFF\x24\x08\x00\x00WAVEfmt ": "audio/wav",
+            b"RIFF\x24\x08\x00\x00WEBPVP8 ": "image/webp",
+            b"\x00\x00\x00\x18ftypisom": "video/mp4",
+            b"\x00\x00\x00\x14ftypqt  ": "video/quicktime",
+            b"\x1a\x45\xdf\xa3\x01\x00": "video/webm",
+            b"ID3\x04\x00": "audio/mpeg",
+            b"\xff\xfb\x90\x64": "audio/mpeg",  # bare MPEG frame sync
+        }
+        for head, mime in cases.items():
+            self.assertEqual(sniff_mime_type(head), mime, head)
+
+    def test_unknown_or_short_heads(self):
+        for head in (b"", b"RIFF", b"RIFF\x00\x00\x00\x00ABCD", b"plain text", b"\x00\x00\x00\x18mdat"):
+            self.assertIsNone(sniff_mime_type(head), head)
+
+
+class HandlerTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = FakeMinio()
+        for target, new in [("api.minio_client.DEVELOPMENT_MODE", True),
+                            ("api.minio_client.get_minio_client", lambda: self.client)]:
+            patcher = mock.patch(target, new)
+            self.addCleanup(patcher.stop)
+            patcher.start()
+
+    def start(self, name, content_type="application/octet-stream"):
+        handler = StreamingUploadHandler()
+        with self.assertRaises(StopFutureHandlers):
+            handler.new_file("file", name, content_type, None)
+        return handler
+
+    def upload(self, name, *chunks, content_type="application/octet-stream"):
+        handler = self.start(name, content_type)
+        offset = 0
+        for chunk in chunks:
+            self.assertIsNone(handler.receive_data_chunk(chunk, offset))
+            offset += len(chunk)
+        return handler.file_complete(offset)
+
+    def test_chunks_are_written_hashed_and_typed(self):
+        upload = self.upload("photo.bin", PNG, b"more", b"tail")
+
+        self.assertTrue(upload.storage_path.startswith(f"local://{self.media_root}/{upload.media_id}_"))
+        with uploads.open_upload(upload.storage_path) as fh:
+            self.assertEqual(fh.read(), PNG + b"moretail")
+        self.assertEqual((upload.mime_type, upload.file_type, upload.size), ("image/png", "image", len(PNG) + 8))
+        self.assertEqual(upload.sha256, hashlib.sha256(PNG + b"moretail").hexdigest())
+
+    def test_filename_is_the_fallback_not_the_client_header(self):
+        upload = self.upload("clip.mp3", b"no magic here", content_type="image/png")
+        self.assertEqual((upload.mime_type, upload.file_type), ("audio/mpeg", "audio"))
+
+        upload = self.upload("notes", b"no magic here", content_type="image/png")
+        self.assertEqual((upload.mime_type, upload.file_type), (None, None))
+
+    def test_empty_file_is_still_stored(self):
+        upload = self.upload("empty.png")
+        self.assertEqual((upload.size, upload.mime_type), (0, "image/png"))
+        self.assertEqual(os.path.getsize(upload.storage_path[len("local://"):]), 0)
+
+    def test_cut_off_request_removes_the_partial_file(self):
+        handler = self.start("photo.png")
+        handler.receive_data_chunk(PNG, 0)
+        self.assertEqual(len(os.listdir(self.media_root)), 1)
+
+        handler.upload_interrupted()
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    def test_interrupt_before_any_data_is_harmless(self):
+        self.start("photo.png").upload_interrupted()
+        StreamingUploadHandler().upload_interrupted()
+
+    def test_minio_is_used_outside_development_mode(self):
+        with mock.patch("api.minio_client.DEVELOPMENT_MODE", False):
+            upload = self.upload("photo.png", PNG)
+
+        self.assertEqual(upload.storage_path, f"uploads/{upload.media_id}/photo.png")
+        self.assertEqual(self.client.objects[upload.storage_path], (PNG, "image/png"))
+        self.assertEqual(os.listdir(self.media_root), [])
+
+
+class SinkTests(SimpleTestCase):
+    def setUp(self):
+        self.client = FakeMinio()
+        patcher = mock.patch("api.minio_client.get_minio_client", lambda: self.client)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    def test_local_sink_abort_removes_the_file(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            sink = LocalSink("m-1", "a.png", "image/png")
+            sink.write(PNG)
+            self.assertTrue(os.path.exists(sink.path))
+            sink.abort()
+            self.assertFalse(os.path.exists(sink.path))
+
+    def test_writer_blocks_while_minio_is_behind(self):
+        self.client.gate.clear()
+        sink = MinioSink("m-1", "a.mp4", "video/mp4")
+        written = []
+
+        def produce():
+            for n in range(PIPE_DEPTH + 3):
+                sink.write(bytes([n]) * 16)
+                written.append(n)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        # the pipe holds PIPE_DEPTH chunks; the next write waits for the reader
+        self.assertTrue(wait_for(lambda: len(written) == PIPE_DEPTH))
+        time.sleep(0.1)
+        self.assertEqual(len(written), PIPE_DEPTH)
+        self.assertTrue(producer.is_alive())
+
+        self.client.gate.set()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+        sink.close()
+
+        body, content_type = self.client.objects["uploads/m-1/a.mp4"]
+        self.assertEqual(body, b"".join(bytes([n]) * 16 for n in range(PIPE_DEPTH + 3)))
+        self.assertEqual(content_type, "video/mp4")
+
+    def test_failed_upload_surfaces_without_blocking_the_writer(self):
+        self.client.error = RuntimeError("bucket gone")
+        sink = MinioSink("m-1", "a.mp4", None)
+        self.assertTrue(wait_for(lambda: sink._error is not None))
+
+        with self.assertRaisesMessage(RuntimeError, "bucket gone"):
+            sink.write(b"x")
+        with self.assertRaisesMessage(RuntimeError, "bucket gone"):
+            sink.close()
+
+    def test_abort_finishes_the_upload_and_removes_the_object(self):
+        sink = MinioSink("m-1", "a.mp4", "video/mp4")
+        sink.write(b"partial")
+        sink.abort()
+
+        self.assertFalse(sink._thread.is_alive())
+        self.assertEqual(self.client.removed, ["uploads/m-1/a.mp4"])
+
+    def test_discard_upload(self):
+        with tempfile.NamedTemporaryFile(delete=False) as fh:
+            path = fh.name
+        discard_upload(f"local://{path}")
+        self.assertFalse(os.path.exists(path))
+        discard_upload(f"local://{path}")  # already gone: no error
+
+        discard_upload("uploads/m-1/a.mp4")
+        self.assertEqual(self.client.removed, ["uploads/m-1/a.mp4"])
+        with mock.patch.object(self.client, "remove_object", side_effect=RuntimeError("offline")):
+            discard_upload("uploads/m-2/a.mp4")  # logged, not raised
@@ -0,0 +1,95 @@
+# api/tests/test_vector_index.py
+import io
+import tempfile
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django_q.models import Schedule
+
+from api import vector_index
+from api.vector_index import VectorIndex
+
+from .base import MongoTestCase
+
+
+class VectorIndexTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = tmp.name
+        rng = np.random.default_rng(3)
+        self.vectors = rng.standard_normal((2000, 16)).astype(np.float32)
+        self.ids = [f"s-{i}" for i in range(len(self.vectors))]
+        self.index = VectorIndex(self.path, 16)
+
+    def test_exact_search_and_published_filter(self):
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.index.append(self.ids[:10], self.vectors[:10], [start + timedelta(days=i) for i in range(10)])
+
+        hits = self.index.search(self.vectors[4], k=3)[0]
+        self.assertEqual(hits[0][0], "s-4")
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+        self.assertEqual(len(hits), 3)
+
+        window = self.index.search(self.vectors[4], k=10, published_after=start + timedelta(days=5),
+                                   published_before=start + timedelta(days=8))[0]
+        self.assertEqual(sorted(i for i, _ in window), ["s-5", "s-6", "s-7"])
+
+    def test_ivf_search_finds_each_row_and_the_untrained_tail(self):
+        self.index.append(self.ids[:1500], self.vectors[:1500])
+        self.index.train(nlist=16, iterations=4)
+        self.index.append(self.ids[1500:], self.vectors[1500:])
+
+        queries = self.vectors[::100]
+        hits = self.index.search(queries, k=1, exact=False, nprobe=16)
+        self.assertEqual([row[0][0] for row in hits], self.ids[::100])
+
+    def test_reader_sees_rows_appended_by_another_handle(self):
+        reader = VectorIndex(self.path, 16)
+        self.assertEqual(reader.search(self.vectors[0])[0], [])
+
+        self.index.append(self.ids[:1], self.vectors[:1])
+        self.assertEqual(reader.search(self.vectors[0])[0][0][0], "s-0")
+
+
+class SnippetIndexTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(SNIPPET_INDEX_DIR=tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        vector_index._index = None
+        self.addCleanup(setattr, vector_index, "_index", None)
+
+    def add_snippet(self, title, text):
+        return self.db.snippets.insert_one({"title": title, "text": text, "url": f"https://example.org/{title}"}).inserted_id
+
+    def test_retrieval_never_syncs(self):
+        self.add_snippet("tower", "The Eiffel Tower is in Paris.")
+        with mock.patch("api.vector_index.sync_snippets") as sync:
+            for _ in range(3):
+                self.assertEqual(vector_index.search_snippets(["Eiffel Tower"]), [[]])
+        sync.assert_not_called()
+
+    def test_scheduled_sync_reaches_an_open_reader(self):
+        reader = vector_index.get_snippet_index()
+        tower = self.add_snippet("tower", "The Eiffel Tower is in Paris.")
+        self.add_snippet("bridge", "The Golden Gate Bridge is in San Francisco.")
+
+        self.assertEqual(vector_index.sync_snippet_index(), 2)
+        self.assertEqual(vector_index.sync_snippet_index(), 0)
+
+        hits = vector_index.search_snippets(["Where is the Eiffel Tower?"], k=1)[0]
+        self.assertIs(vector_index.get_snippet_index(), reader)
+        self.assertEqual(hits[0]["snippet_id"], str(tower))
+        self.assertEqual(hits[0]["title"], "tower")
+
+    def test_provision_schedules_the_sync(self):
+        call_command("provision", skip_minio=True, stdout=io.StringIO())
+        schedule = Schedule.objects.get(name="sync_snippet_index")
+        self.assertEqual(schedule.func, "api.vector_index.sync_snippet_index")
@@ -0,0 +1,130 @@
+# api/tests/test_views.py
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+
+from api.frames import MAX_FRAME_BUDGET
+from api.models import VerificationJob
+
+from .base import APITestCase
+
+NDJSON = "application/x-ndjson"
+VIDEO = b"\x00\x00\x00\x18ftypisom" + b"v" * 64
+
+
+class VerifyMediaTests(APITestCase):
+    def post_video(self, **data):
+        with tempfile.TemporaryFile() as video:
+            video.write(VIDEO)
+            video.seek(0)
+            return self.api.post("/api/verify/", {"file": video, **data}, format="multipart")
+
+    def test_frame_budget_is_stored_on_the_media_doc(self):
+        response = self.post_video(frame_budget="12")
+
+        self.assertEqual(response.status_code, 200)
+        doc = self.media(response.json()["media_id"])
+        self.assertEqual((doc["file_type"], doc["frame_budget"]), ("video", 12))
+
+    def test_blank_frame_budget_uses_the_default(self):
+        response = self.post_video(frame_budget="")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("frame_budget", self.media(response.json()["media_id"]))
+
+    def test_out_of_range_frame_budget_is_rejected(self):
+        for value in ["0", str(MAX_FRAME_BUDGET + 1), "lots"]:
+            response = self.post_video(frame_budget=value)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(str(MAX_FRAME_BUDGET), response.json()["error"])
+        self.assertFalse(VerificationJob.objects.exists())
+        self.assertEqual(os.listdir(settings.MEDIA_ROOT), [])  # rejected uploads are not kept
+
+    def post_known_video(self, status):
+        self.insert_media("m-known", status=status, sha256=hashlib.sha256(VIDEO).hexdigest(),
+                          text_input="", claim_text="")
+        response = self.post_video()
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_completed_duplicate_is_linked_and_done(self):
+        data = self.post_known_video("completed")
+
+        self.assertEqual((data["media_id"], data["deduplicated"]), ("m-known", True))
+        job = VerificationJob.objects.get(job_id=data["job_id"])
+        self.assertEqual((job.status, job.result_ready), ("completed", True))
+        self.assertEqual(os.listdir(settings.MEDIA_ROOT), [])  # the new upload is not kept
+
+    def test_in_flight_duplicate_is_linked_and_followed(self):
+        data = self.post_known_video("processing")
+
+        self.assertEqual((data["media_id"], data["deduplicated"]), ("m-known", True))
+        self.assertEqual(VerificationJob.objects.get(job_id=data["job_id"]).status, "processing")
+        self.assertEqual(self.db.media_docs.count_documents({}), 1)
+
+    def test_failed_duplicate_is_run_again(self):
+        data = self.post_known_video("failed")
+
+        self.assertNotEqual(data["media_id"], "m-known")
+        self.assertNotIn("deduplicated", data)
+        self.assertEqual(self.media(data["media_id"])["status"], "uploaded")
+        self.assertEqual(len(os.listdir(settings.MEDIA_ROOT)), 1)
+
+
+class VerifyBatchTests(APITestCase):
+    def post_ndjson(self, body):
+        return self.api.post("/api/verify/batch/", data=body, content_type=NDJSON)
+
+    def test_empty_ndjson_body_is_rejected(self):
+        for body in ["", "\n  \n"]:
+            response = self.post_ndjson(body)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.json())
+
+    def test_batch_of_bad_lines_is_rejected(self):
+        response = self.post_ndjson('{oops\n"just a string"\n')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["failed"], 2)
+        self.assertFalse(VerificationJob.objects.exists())
+
+    def test_mixed_batch_reports_per_item(self):
+        body = "\n".join([
+            '{"text_input": "The moon is made of cheese.", "claim_text": "moon cheese"}',
+            "{broken",
+            '{"claim_text": "no text"}',
+            '{"text_input": 42}',
+            '{"text_input": "Water boils at 100C."}',
+        ])
+        response = self.post_ndjson(body)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["accepted"], data["failed"]), (2, 3))
+        self.assertEqual([item["status"] for item in data["items"]],
+                         ["queued", "failed", "failed", "failed", "queued"])
+        media_ids = [item["media_id"] for item in data["items"] if item["status"] == "queued"]
+        self.assertEqual(self.db.media_docs.count_documents({"media_id": {"$in": media_ids}, "file_type": "text"}), 2)
+        self.assertEqual(VerificationJob.objects.filter(user=self.user).count(), 2)
+        # both jobs ride on one orchestrate_batch call
+        queued = list(self.db.lane_queue.find())
+        self.assertEqual([q["func"] for q in queued], ["api.qtasks.orchestrate_batch"])
+        self.assertEqual(len(queued[0]["args"][0]), 2)
+
+    def test_multipart_files_and_texts(self):
+        with tempfile.TemporaryFile() as a, tempfile.TemporaryFile() as b:
+            a.write(b"\x89PNG\r\n\x1a\n" + b"a" * 64)
+            b.write(b"\x89PNG\r\n\x1a\n" + b"a" * 64)  # identical: shares a's media doc
+            a.seek(0)
+            b.seek(0)
+            response = self.api.post("/api/verify/batch/", {
+                "file": [a, b], "text_input": ["Some text."], "claim_text": "shared",
+            }, format="multipart")
+
+        self.assertEqual(response.status_code, 200)
+        items = response.json()["items"]
+        self.assertEqual([i["status"] for i in items], ["queued", "deduplicated", "queued"])
+        self.assertEqual(items[0]["media_id"], items[1]["media_id"])
+        self.assertEqual(self.media(items[0]["media_id"])["file_type"], "image")
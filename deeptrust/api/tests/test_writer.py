@@ -0,0 +1,124 @@
+# api/tests/test_writer.py
+import threading
+
+from django.test import SimpleTestCase
+
+from api.writer import StageResultWriter, _merge
+
+
+class MergeTests(SimpleTestCase):
+    def merged(self, *writes):
+        pending = {}
+        for fields in writes:
+            _merge(pending, fields)
+        return pending
+
+    def test_later_writes_win(self):
+        self.assertEqual(self.merged({"a": 1, "b": 2}, {"a": 3}), {"a": 3, "b": 2})
+
+    def test_sub_path_lands_inside_a_pending_parent(self):
+        pending = self.merged({"claim": {"text": "x"}}, {"claim.latest_verdict": "Supported"})
+        self.assertEqual(pending, {"claim": {"text": "x", "latest_verdict": "Supported"}})
+
+    def test_deep_sub_path_creates_missing_levels(self):
+        pending = self.merged({"claim": "not a dict"}, {"claim.meta.source": "cache"})
+        self.assertEqual(pending, {"claim": {"meta": {"source": "cache"}}})
+
+    def test_whole_field_supersedes_pending_sub_paths(self):
+        pending = self.merged({"claim.latest_verdict": "Supported", "claims": [1]}, {"claim": {"text": "y"}})
+        self.assertEqual(pending, {"claims": [1], "claim": {"text": "y"}})
+
+    def test_parent_value_is_copied_not_mutated(self):
+        parent = {"text": "x"}
+        self.merged({"claim": parent}, {"claim.latest_verdict": "Refuted"})
+        self.assertEqual(parent, {"text": "x"})
+
+
+class FakeCollection:
+    def __init__(self, block=False, fail=False):
+        self.writes = []
+        self.fail = fail
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def bulk_write(self, ops, ordered=True):
+        self.entered.set()
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("primary stepped down")
+        self.writes.append([(op._filter["media_id"], op._doc["$set"]) for op in ops])
+
+
+class StageResultWriterTests(SimpleTestCase):
+    def writer(self, collection):
+        # a window long enough that the background thread never flushes here
+        return StageResultWriter(collection, window=3600)
+
+    def test_fragments_coalesce_into_one_update_per_job(self):
+        collection = FakeCollection()
+        writer = self.writer(collection)
+        writer.set("m-1", {"a": 1})
+        writer.set("m-2", {"b": 2})
+        writer.set("m-1", {"c": 3})
+        writer.flush()
+
+        self.assertEqual(collection.writes, [[("m-1", {"a": 1, "c": 3}), ("m-2", {"b": 2})]])
+        self.assertEqual(writer.take("m-1"), {})
+
+    def test_take_removes_a_jobs_fields(self):
+        collection = FakeCollection()
+        writer = self.writer(collection)
+        writer.set("m-1", {"a": 1})
+        writer.set("m-2", {"b": 2})
+
+        self.assertEqual(writer.take("m-1"), {"a": 1})
+        writer.flush()
+        self.assertEqual(collection.writes, [[("m-2", {"b": 2})]])
+
+    def test_take_waits_for_an_in_flight_flush_of_the_job(self):
+        collection = FakeCollection(block=True)
+        writer = self.writer(collection)
+        writer.set("m-1", {"a": 1})
+        flusher = threading.Thread(target=writer.flush)
+        flusher.start()
+        self.assertTrue(collection.entered.wait(5))
+
+        order = []
+        taker = threading.Thread(target=lambda: order.append(("take", writer.take("m-1"))))
+        taker.start()
+        taker.join(0.2)
+        self.assertTrue(taker.is_alive(), "take() returned while the flush was still writing")
+
+        writer.set("m-1", {"b": 2})  # arrives during the flush: left for take()
+        order.append(("released", None))
+        collection.release.set()
+        flusher.join(5)
+        taker.join(5)
+
+        self.assertEqual(order, [("released", None), ("take", {"b": 2})])
+
+    def test_take_for_another_job_does_not_wait(self):
+        collection = FakeCollection(block=True)
+        writer = self.writer(collection)
+        writer.set("m-1", {"a": 1})
+        writer.set("m-2", {"b": 2})
+        self.assertEqual(writer.take("m-2"), {"b": 2})
+        flusher = threading.Thread(target=writer.flush)
+        flusher.start()
+        self.assertTrue(collection.entered.wait(5))
+
+        self.assertEqual(writer.take("m-3"), {})
+        collection.release.set()
+        flusher.join(5)
+
+    def test_failed_flush_keeps_fields_under_newer_ones(self):
+        collection = FakeCollection(fail=True)
+        writer = self.writer(collection)
+        writer.set("m-1", {"a": 1, "b": 1})
+        with self.assertRaises(RuntimeError):
+            writer.flush()
+        writer.set("m-1", {"b": 2})
+
+        self.assertEqual(writer.take("m-1"), {"a": 1, "b": 2})
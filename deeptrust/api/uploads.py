@@ -0,0 +1,263 @@
+# api/uploads.py
+"""
+Streaming upload path for /api/verify/.
+
+Instead of letting Django spool every upload to a temp file and then
+reading it back for MinIO, StreamingUploadHandler pipes each chunk
+straight to its destination while hashing it and sniffing the MIME type
+from the first bytes. Memory stays bounded by MinIO's part size.
+
+    DEVELOPMENT_MODE  -> MEDIA_ROOT/<media_id>_<name>   ("local://..." path)
+    otherwise         -> MinIO multipart upload          ("uploads/<media_id>/<name>")
+"""
+import functools
+import hashlib
+import io
+import mimetypes
+import os
+import queue
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+from . import minio_client as storage
+
+MINIO_PART_SIZE = 8 * 1024 * 1024  # >= 5 MiB S3 minimum
+PIPE_DEPTH = 8                     # chunks buffered between request and MinIO
+
+
+# -----------------------------
+# Magic-byte sniffing
+# -----------------------------
+MAGIC_SIGNATURES = [
+    # (offset, signature, mime type)
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"BM", "image/bmp"),
+    (4, b"ftypqt", "video/quicktime"),
+    (4, b"ftypM4A", "audio/mp4"),
+    (4, b"ftyp", "video/mp4"),
+    (0, b"\x1a\x45\xdf\xa3", "video/webm"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"fLaC", "audio/flac"),
+    (0, b"OggS", "audio/ogg"),
+]
+
+
+def sniff_mime_type(head):
+    if head[:4] == b"RIFF" and len(head) >= 12:
+        return {b"WAVE": "audio/wav", b"WEBP": "image/webp", b"AVI ": "video/x-msvideo"}.get(head[8:12])
+    for offset, signature, mime in MAGIC_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return mime
+    # MPEG audio frame sync without an ID3 tag
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return "audio/mpeg"
+    return None
+
+
+def file_type_for(mime_type):
+    if mime_type:
+        for kind in ("image", "video", "audio"):
+            if mime_type.startswith(kind):
+                return kind
+    return None
+
+
+# -----------------------------
+# Sinks
+# -----------------------------
+class LocalSink:
+    def __init__(self, media_id, name, content_type):
+        self.path = os.path.join(settings.MEDIA_ROOT, f"{media_id}_{name}")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._fh = open(self.path, "wb")
+
+    @property
+    def storage_path(self):
+        return f"local://{self.path}"
+
+    def write(self, data):
+        self._fh.write(data)
+
+    def close(self):
+        self._fh.close()
+
+    def abort(self):
+        self._fh.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class _ChunkPipe:
+    """Blocking file-like reader fed from a bounded queue."""
+
+    def __init__(self, depth):
+        self._queue = queue.Queue(maxsize=depth)
+        self._buffer = bytearray()
+        self._eof = False
+
+    def put(self, data):
+        self._queue.put(data)
+
+    def read(self, size=-1):
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = self._queue.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer.extend(chunk)
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class MinioSink:
+    """
+    Streams into a MinIO multipart upload (put_object with unknown length)
+    running on a helper thread; the request thread only ever blocks on the
+    bounded pipe.
+    """
+
+    def __init__(self, media_id, name, content_type):
+        self.storage_path = f"uploads/{media_id}/{name}"
+        self._pipe = _ChunkPipe(PIPE_DEPTH)
+        self._error = None
+        self._thread = threading.Thread(target=self._upload, args=(content_type,), daemon=True)
+        self._thread.start()
+
+    def _upload(self, content_type):
+        try:
+            storage.get_minio_client().put_object(
+                storage.BUCKET, self.storage_path, self._pipe,
+                length=-1, part_size=MINIO_PART_SIZE,
+                content_type=content_type or "application/octet-stream",
+            )
+        except Exception as e:
+            self._error = e
+            # keep draining so the request thread never blocks on a dead reader
+            while self._pipe.read(MINIO_PART_SIZE):
+                pass
+
+    def write(self, data):
+        if self._error:
+            raise self._error
+        self._pipe.put(data)
+
+    def close(self):
+        self._pipe.put(None)
+        self._thread.join()
+        if self._error:
+            raise self._error
+
+    def abort(self):
+        self._pipe.put(None)
+        self._thread.join()
+        discard_upload(self.storage_path)
+
+
+def discard_upload(storage_path):
+    if storage_path.startswith("local://"):
+        try:
+            os.remove(storage_path[len("local://"):])
+        except OSError:
+            pass
+    else:
+        try:
+            storage.get_minio_client().remove_object(storage.BUCKET, storage_path)
+        except Exception as e:
+            print("⚠ Could not remove upload:", storage_path, e)
+
+
+def open_upload(storage_path):
+    """A readable file object for a stored upload (local file or MinIO object)."""
+    if storage_path.startswith("local://"):
+        return open(storage_path[len("local://"):], "rb")
+    response = storage.get_minio_client().get_object(storage.BUCKET, storage_path)
+    try:
+        return io.BytesIO(response.read())
+    finally:
+        response.close()
+        response.release_conn()
+
+
+# -----------------------------
+# Upload handler
+# -----------------------------
+class StreamedUploadedFile(UploadedFile):
+    """An upload that is already stored; carries its hash and detected type."""
+
+    def __init__(self, name, content_type, size, media_id, storage_path, sha256, mime_type):
+        super().__init__(file=None, name=name, content_type=content_type, size=size)
+        self.media_id = media_id
+        self.storage_path = storage_path
+        self.sha256 = sha256
+        self.mime_type = mime_type
+        self.file_type = file_type_for(mime_type)
+
+    def open(self, mode=None):
+        raise ValueError("Streamed uploads are not kept on the request; read them from storage_path.")
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.media_id = f"m-{uuid.uuid4()}"
+        self.name = os.path.basename(self.file_name or "upload")
+        self.sha256 = hashlib.sha256()
+        self.mime_type = None
+        self.sink = None
+        raise StopFutureHandlers()
+
+    def _open_sink(self, head):
+        # magic bytes first; fall back to the filename, never to the client header
+        self.mime_type = sniff_mime_type(head) or mimetypes.guess_type(self.name)[0]
+        sink_cls = LocalSink if storage.DEVELOPMENT_MODE else MinioSink
+        self.sink = sink_cls(self.media_id, self.name, self.mime_type)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.sink is None:
+            self._open_sink(raw_data[:64])
+        self.sha256.update(raw_data)
+        self.sink.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.sink is None:
+            self._open_sink(b"")
+        self.sink.close()
+        return StreamedUploadedFile(
+            name=self.name,
+            content_type=self.content_type,
+            size=file_size,
+            media_id=self.media_id,
+            storage_path=self.sink.storage_path,
+            sha256=self.sha256.hexdigest(),
+            mime_type=self.mime_type,
+        )
+
+    def upload_interrupted(self):
+        if getattr(self, "sink", None) is not None:
+            self.sink.abort()
+
+
+def streaming_upload(view):
+    """
+    Install StreamingUploadHandler for `view`. Must wrap the outermost view
+    function: handlers have to be set before anything (including the CSRF
+    check) reads request.POST / request.FILES.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [StreamingUploadHandler(request)]
+        return view(request, *args, **kwargs)
+    return wrapper
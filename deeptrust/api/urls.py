@@ -1,8 +1,11 @@
 from django.urls import path
-from .views import verify_media, job_status, job_report
+from .views import verify_media, verify_batch, job_list, job_status, job_events, job_report
 
 urlpatterns = [
     path("verify/", verify_media),
+    path("verify/batch/", verify_batch),
+    path("jobs/", job_list),
     path("status/<str:job_id>/", job_status),
+    path("events/<str:job_id>/", job_events),
     path("report/<str:job_id>/", job_report),
 ]
@@ -0,0 +1,536 @@
+# api/vector_index.py
+"""
+Embedding index over the snippets corpus.
+
+Vectors are L2-normalized, so scores are cosine similarities. Everything
+lives in flat append-only files under one directory and is read through
+np.memmap, so every worker process maps the same pages from the OS cache
+instead of loading its own copy:
+
+    ids.s24          snippet ids (ObjectId hex), 24 bytes per row
+    published.i64    published_at as epoch seconds (NO_DATE if unknown)
+    vectors.f32      float32 rows of `dim`
+    centroids.npy    IVF coarse centroids           \
+    codebooks.npy    PQ codebooks (m x 256 x dim/m)  > written by train()
+    ivf_lists.i32    IVF list of every coded row     |
+    pq_codes.u8      m PQ bytes per coded residual  /
+
+Small corpora (or tight published_at filters) are searched exactly with
+chunked matrix products. Once trained, large ones use IVF-PQ: probe the
+`nprobe` nearest lists, rank their rows by centroid score plus a PQ
+lookup over the residual (row - centroid), and rerank the best `rerank`
+with the exact vectors. Rows appended after the list
+order was built are scanned exactly until MERGE_THRESHOLD of them pile up.
+
+Request handlers and stages only read: new snippets are embedded by
+`manage.py build_snippet_index` or the sync_snippet_index schedule, and
+readers pick the appended rows up on their next search().
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: a single writer process is assumed
+    fcntl = None
+
+ID_BYTES = 24
+NO_DATE = np.iinfo(np.int64).min
+PQ_CENTROIDS = 256
+DEFAULT_PQ_M = 8
+DEFAULT_NPROBE = 16
+DEFAULT_RERANK = 1024
+EXACT_MAX_ROWS = 200000
+MERGE_THRESHOLD = 50000
+SEARCH_CHUNK_ROWS = 262144
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def to_epoch(value):
+    if value is None:
+        return NO_DATE
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    return int(value)
+
+
+def _normalize(vectors):
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def _nearest(data, centroids):
+    """Index of the nearest centroid (L2) for every row, in bounded chunks."""
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    chunk = max(1024, 2 ** 25 // len(centroids))
+    out = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), chunk):
+        block = np.asarray(data[start:start + chunk], dtype=np.float32)
+        out[start:start + len(block)] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return out
+
+
+def _kmeans(data, k, iterations, rng):
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(data, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=k)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        centroids[filled] = np.add.reduceat(data[order], starts, axis=0) / counts[filled, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            # reseed dead centroids on random points
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+    return centroids
+
+
+def _merge_topk(best_rows, best_scores, rows, scores, k):
+    rows = np.concatenate([best_rows, rows], axis=1)
+    scores = np.concatenate([best_scores, scores], axis=1)
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        rows = np.take_along_axis(rows, keep, axis=1)
+        scores = np.take_along_axis(scores, keep, axis=1)
+    return rows, scores
+
+
+class _WriterLock:
+    """Cross-process writer lock (flock on a lock file); re-entrant per process."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.RLock()
+        self._depth = 0
+        self._fh = None
+
+    def __enter__(self):
+        self._local.acquire()
+        if self._depth == 0 and fcntl is not None:
+            self._fh = open(self.path, "a")
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fh is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+        self._local.release()
+
+
+# -----------------------------
+# Index
+# -----------------------------
+class VectorIndex:
+    def __init__(self, path, dim, pq_m=DEFAULT_PQ_M, name=None):
+        if dim % pq_m:
+            raise ValueError("dim must be a multiple of pq_m")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        meta_path = self._file("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as fh:
+                meta = json.load(fh)
+            if meta["dim"] != dim or (name and meta.get("name") != name):
+                raise ValueError(f"Index at {path} was built for {meta}, not dim={dim} name={name}")
+        else:
+            meta = {"dim": dim, "pq_m": pq_m, "name": name}
+            with open(meta_path, "w") as fh:
+                json.dump(meta, fh)
+        self.dim = meta["dim"]
+        self.pq_m = meta["pq_m"]
+        self.name = meta.get("name")
+
+        self.writer = _WriterLock(self._file("write.lock"))
+        self._lock = threading.RLock()
+        self._signature = None
+        self._order = None  # (list starts, rows by list, rows covered)
+        self.centroids = self.codebooks = None
+        self.refresh()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _map(self, name, dtype, rows, width=None):
+        shape = (rows,) if width is None else (rows, width)
+        if rows == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode="r", shape=shape)
+
+    def _rows(self, name, row_bytes):
+        try:
+            return os.path.getsize(self._file(name)) // row_bytes
+        except OSError:
+            return 0
+
+    def refresh(self):
+        """Re-map the files if another process appended or retrained."""
+        names = ["ids.s24", "published.i64", "vectors.f32", "ivf_lists.i32", "pq_codes.u8", "centroids.npy"]
+        signature = tuple(
+            (os.path.getsize(p), os.path.getmtime(p)) if os.path.exists(p) else None
+            for p in map(self._file, names)
+        )
+        with self._lock:
+            if signature == self._signature:
+                return
+            retrained = self._signature is None or signature[-1] != self._signature[-1]
+
+            n = min(self._rows("ids.s24", ID_BYTES), self._rows("published.i64", 8), self._rows("vectors.f32", 4 * self.dim))
+            self.ids = self._map("ids.s24", f"S{ID_BYTES}", n)
+            self.published = self._map("published.i64", np.int64, n)
+            self.vectors = self._map("vectors.f32", np.float32, n, self.dim)
+
+            if retrained:
+                self._order = None
+                trained = os.path.exists(self._file("centroids.npy"))
+                self.centroids = np.load(self._file("centroids.npy")) if trained else None
+                self.codebooks = np.load(self._file("codebooks.npy")) if trained else None
+            coded = min(n, self._rows("ivf_lists.i32", 4), self._rows("pq_codes.u8", self.pq_m)) if self.centroids is not None else 0
+            self.lists = self._map("ivf_lists.i32", np.int32, coded)
+            self.codes = self._map("pq_codes.u8", np.uint8, coded, self.pq_m)
+            self._signature = signature
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def last_id(self):
+        return self.ids[-1].decode() if len(self.ids) else None
+
+    # -------- writes --------
+    def _truncate(self, name, row_bytes, rows):
+        p = self._file(name)
+        if os.path.exists(p) and os.path.getsize(p) != rows * row_bytes:
+            os.truncate(p, rows * row_bytes)
+
+    def _encode(self, vectors):
+        ds = self.dim // self.pq_m
+        codes = np.empty((len(vectors), self.pq_m), dtype=np.uint8)
+        for j in range(self.pq_m):
+            codes[:, j] = _nearest(vectors[:, j * ds:(j + 1) * ds], self.codebooks[j])
+        return codes
+
+    def _code_missing(self, batch_rows=262144):
+        """IVF-assign and PQ-encode rows that have vectors but no codes yet."""
+        n, coded = len(self.vectors), len(self.lists)
+        self._truncate("ivf_lists.i32", 4, coded)
+        self._truncate("pq_codes.u8", self.pq_m, coded)
+        with open(self._file("ivf_lists.i32"), "ab") as lists_fh, open(self._file("pq_codes.u8"), "ab") as codes_fh:
+            for start in range(coded, n, batch_rows):
+                block = np.asarray(self.vectors[start:start + batch_rows])
+                lists = _nearest(block, self.centroids)
+                lists_fh.write(lists.tobytes())
+                codes_fh.write(self._encode(block - self.centroids[lists]).tobytes())
+
+    def append(self, ids, vectors, published_at=None):
+        """Append rows; ids must be unique strings of at most 24 bytes."""
+        vectors = _normalize(vectors)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d vectors, got {vectors.shape[1]}")
+        encoded = np.array([str(i).encode() for i in ids], dtype=f"S{ID_BYTES}")
+        if len(encoded) != len(vectors) or any(len(str(i)) > ID_BYTES for i in ids):
+            raise ValueError("ids must match vectors and fit in 24 bytes")
+        published = np.array(
+            [to_epoch(p) for p in published_at] if published_at is not None else [NO_DATE] * len(ids),
+            dtype=np.int64,
+        )
+
+        with self.writer:
+            self.refresh()
+            n = len(self.ids)
+            # drop any partial rows left by a writer that died mid-append
+            for name, row_bytes in (("vectors.f32", 4 * self.dim), ("published.i64", 8), ("ids.s24", ID_BYTES)):
+                self._truncate(name, row_bytes, n)
+            # ids last: readers size the index by the shortest file
+            for name, data in (("vectors.f32", vectors), ("published.i64", published), ("ids.s24", encoded)):
+                with open(self._file(name), "ab") as fh:
+                    fh.write(data.tobytes())
+            self.refresh()
+            if self.trained:
+                self._code_missing()
+                self.refresh()
+
+    def train(self, nlist=None, sample_size=None, iterations=10, seed=0):
+        """(Re)build the IVF centroids and PQ codebooks from a sample, then code every row."""
+        rng = np.random.default_rng(seed)
+        with self.writer:
+            self.refresh()
+            n = len(self.ids)
+            nlist = nlist or int(np.clip(np.sqrt(n), 16, 65536))
+            sample_size = min(n, sample_size or max(40 * nlist, 40 * PQ_CENTROIDS))
+            if sample_size < max(nlist, PQ_CENTROIDS):
+                raise ValueError(f"Need at least {max(nlist, PQ_CENTROIDS)} vectors to train, have {n}")
+
+            sample = np.asarray(self.vectors[np.sort(rng.choice(n, sample_size, replace=False))])
+            centroids = _kmeans(sample, nlist, iterations, rng)
+            residuals = sample - centroids[_nearest(sample, centroids)]
+            ds = self.dim // self.pq_m
+            codebooks = np.stack([
+                _kmeans(np.ascontiguousarray(residuals[:, j * ds:(j + 1) * ds]), PQ_CENTROIDS, iterations, rng)
+                for j in range(self.pq_m)
+            ])
+
+            for name, data in (("codebooks.npy", codebooks), ("centroids.npy", centroids)):
+                tmp = self._file(name + ".tmp")
+                with open(tmp, "wb") as fh:
+                    np.save(fh, data)
+                os.replace(tmp, self._file(name))
+            for name in ("ivf_lists.i32", "pq_codes.u8"):
+                self._truncate(name, 1, 0)
+
+            self._signature = None
+            self.refresh()
+            self._code_missing()
+            self.refresh()
+
+    # -------- reads --------
+    def _ensure_order(self):
+        coded = len(self.lists)
+        if self._order is None or coded - self._order[2] > MERGE_THRESHOLD:
+            lists = np.asarray(self.lists)
+            order = np.argsort(lists, kind="stable").astype(np.uint32)
+            starts = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(lists, minlength=len(self.centroids)), out=starts[1:])
+            self._order = (starts, order, coded)
+        return self._order
+
+    def _search_exact(self, queries, k, mask, start=0):
+        n = len(self.ids)
+        best_rows = np.full((len(queries), 0), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        if start >= n:
+            return best_rows, best_scores
+
+        if mask is not None and np.count_nonzero(mask[start:]) <= EXACT_MAX_ROWS:
+            # selective filter: gather just the matching rows
+            rows = np.flatnonzero(mask[start:]) + start
+            if len(rows):
+                scores = queries @ np.asarray(self.vectors[rows]).T
+                best_rows, best_scores = _merge_topk(best_rows, best_scores, np.broadcast_to(rows, scores.shape), scores, k)
+            return best_rows, best_scores
+
+        for lo in range(start, n, SEARCH_CHUNK_ROWS):
+            hi = min(n, lo + SEARCH_CHUNK_ROWS)
+            scores = queries @ np.asarray(self.vectors[lo:hi]).T
+            if mask is not None:
+                scores[:, ~mask[lo:hi]] = -np.inf
+            rows = np.broadcast_to(np.arange(lo, hi), scores.shape)
+            best_rows, best_scores = _merge_topk(best_rows, best_scores, rows, scores, k)
+        return best_rows, best_scores
+
+    def _search_ivf(self, queries, k, mask, nprobe, rerank):
+        starts, order, covered = self._ensure_order()
+        nprobe = min(nprobe, len(self.centroids))
+        coarse = queries @ self.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        ds = self.dim // self.pq_m
+        tables = np.stack([queries[:, j * ds:(j + 1) * ds] @ self.codebooks[j].T for j in range(self.pq_m)], axis=1)
+        subspaces = np.arange(self.pq_m)
+
+        all_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, lists in enumerate(probes):
+            lo, counts = starts[lists], starts[lists + 1] - starts[lists]
+            total = int(counts.sum())
+            if not total:
+                continue
+            rows = order[np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(total)]
+            # q.x = q.centroid + q.residual
+            base = np.repeat(coarse[i, lists], counts)
+            if mask is not None:
+                keep = mask[rows]
+                rows, base = rows[keep], base[keep]
+            if len(rows) > rerank:
+                approx = base + tables[i][subspaces, np.asarray(self.codes[rows])].sum(axis=1)
+                rows = rows[np.argpartition(-approx, rerank - 1)[:rerank]]
+            rows = np.sort(rows)  # sequential-ish memmap reads
+            scores = np.asarray(self.vectors[rows]) @ queries[i]
+            r, s = _merge_topk(all_rows[i:i + 1], all_scores[i:i + 1], rows[None, :], scores[None, :], k)
+            all_rows[i, :r.shape[1]], all_scores[i, :s.shape[1]] = r[0], s[0]
+
+        # rows appended since the list order was built
+        tail_rows, tail_scores = self._search_exact(queries, k, mask, start=covered)
+        return _merge_topk(all_rows, all_scores, tail_rows, tail_scores, k)
+
+    def search(self, queries, k=10, published_after=None, published_before=None,
+               nprobe=DEFAULT_NPROBE, rerank=DEFAULT_RERANK, exact=None):
+        """
+        Top-k per query by cosine similarity, published_at in
+        [published_after, published_before): [[(id, score), ...], ...].
+        """
+        queries = _normalize(queries)
+        with self._lock:
+            self.refresh()
+            if not len(self.ids):
+                return [[] for _ in queries]
+
+            mask = None
+            if published_after is not None or published_before is not None:
+                published = np.asarray(self.published)
+                mask = published != NO_DATE
+                if published_after is not None:
+                    mask &= published >= to_epoch(published_after)
+                if published_before is not None:
+                    mask &= published < to_epoch(published_before)
+
+            if exact is None:
+                selected = len(self.ids) if mask is None else np.count_nonzero(mask)
+                exact = not self.trained or selected <= EXACT_MAX_ROWS
+            if exact:
+                rows, scores = self._search_exact(queries, k, mask)
+            else:
+                rows, scores = self._search_ivf(queries, k, mask, nprobe, max(rerank, k))
+
+            results = []
+            for r, s in zip(rows, scores):
+                ranked = sorted((float(score), int(row)) for row, score in zip(r, s) if row >= 0 and np.isfinite(score))
+                results.append([(self.ids[row].decode(), score) for score, row in reversed(ranked)])
+            return results
+
+
+# -----------------------------
+# Snippet index synced from Mongo
+# -----------------------------
+_index = None
+_index_lock = threading.Lock()
+
+
+def snippet_text(doc):
+    return " ".join(doc[f] for f in ("title", "text", "content") if isinstance(doc.get(f), str))
+
+
+def open_snippet_index():
+    from django.conf import settings
+    from .embeddings import get_embedder
+
+    embedder = get_embedder()
+    return VectorIndex(settings.SNIPPET_INDEX_DIR, embedder.dim, name=embedder.name)
+
+
+def get_snippet_index():
+    """The process's read-only handle on the shared index (search() re-maps new rows)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = open_snippet_index()
+    return _index
+
+
+def sync_snippet_index():
+    """Scheduled task (see provision): embed snippets added since the last run."""
+    added = sync_snippets(open_snippet_index())
+    if added:
+        print(f"📥 Indexed {added} new snippets")
+    return added
+
+
+def sync_snippets(index, batch_size=1000):
+    """Embed and append snippets newer than the last indexed one (by _id)."""
+    # imported here so the index itself (and its benchmark) needs no database
+    from bson import ObjectId
+    from .embeddings import get_embedder
+    from .mongo import snippets
+
+    embedder = get_embedder()
+    added = 0
+    with index.writer:
+        index.refresh()
+        last = index.last_id()
+        query = {"_id": {"$gt": ObjectId(last)}} if last else {}
+        cursor = snippets.find(query, {"title": 1, "text": 1, "content": 1, "published_at": 1}).sort("_id", 1).batch_size(batch_size)
+
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) == batch_size:
+                added += _append_snippets(index, embedder, batch)
+                batch = []
+        if batch:
+            added += _append_snippets(index, embedder, batch)
+    return added
+
+
+def _append_snippets(index, embedder, docs):
+    index.append(
+        [str(d["_id"]) for d in docs],
+        embedder.embed([snippet_text(d) for d in docs]),
+        [d.get("published_at") for d in docs],
+    )
+    return len(docs)
+
+
+def evidence_cutoff():
+    """Oldest published_at accepted as evidence (settings.SNIPPET_MAX_AGE_DAYS), or None."""
+    from django.conf import settings
+
+    days = getattr(settings, "SNIPPET_MAX_AGE_DAYS", None)
+    return datetime.now(timezone.utc) - timedelta(days=days) if days else None
+
+
+def retrieve_evidence(texts, k=5):
+    """One batched search for all of a job's claims, merged best-first by snippet."""
+    best = {}
+    for row in search_snippets(texts, k, published_after=evidence_cutoff()):
+        for hit in row:
+            if hit["score"] <= 0:
+                continue  # shares nothing with the claim
+            if hit["snippet_id"] not in best or hit["score"] > best[hit["snippet_id"]]["score"]:
+                best[hit["snippet_id"]] = hit
+    return sorted(best.values(), key=lambda hit: -hit["score"])[:k]
+
+
+def search_snippets(texts, k=5, published_after=None, published_before=None):
+    """
+    Evidence for each text, nearest first:
+    [[{"snippet_id", "score", "title", "url", "source", "published_at"}, ...], ...]
+    """
+    from bson import ObjectId
+    from .embeddings import get_embedder
+    from .mongo import snippets
+
+    if not texts:
+        return []
+    hits = get_snippet_index().search(get_embedder().embed(texts), k, published_after, published_before)
+
+    ids = {snippet_id for row in hits for snippet_id, _ in row}
+    docs = {
+        str(doc["_id"]): doc
+        for doc in snippets.find(
+            {"_id": {"$in": [ObjectId(i) for i in ids]}},
+            {"title": 1, "url": 1, "source": 1, "published_at": 1},
+        )
+    } if ids else {}
+
+    return [
+        [
+            {
+                "snippet_id": snippet_id,
+                "score": round(score, 4),
+                "title": docs.get(snippet_id, {}).get("title"),
+                "url": docs.get(snippet_id, {}).get("url"),
+                "source": docs.get(snippet_id, {}).get("source"),
+                "published_at": docs.get(snippet_id, {}).get("published_at"),
+            }
+            for snippet_id, score in row
+        ]
+        for row in hits
+    ]
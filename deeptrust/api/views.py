@@ -1,21 +1,91 @@
 # api/views.py
-import uuid
-import mimetypes
 import os
-from rest_framework.decorators import api_view, permission_classes
+import json
+import time
+import uuid
+import asyncio
+from asgiref.sync import sync_to_async
+from pymongo.errors import BulkWriteError
+from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 from .mongo import media_docs
-from .minio_client import minio_client, BUCKET
 from .models import VerificationJob
-from django_q.tasks import async_task
+from .uploads import streaming_upload, discard_upload
+from .parsers import NDJSONParser
+from .listing import list_user_jobs, PAGE_SIZE
+from .events import get_broker, channel_for, sse_available
+from .cache import cached_job, cached_payload
+from .lanes import PLANNING_LANE, enqueue
 from .qtasks import orchestrate_job
+from .chief import generate_task_plan
+from . import artifacts
+from .dag import progress_percent
+from .executors import run_within_budget
+from .frames import MAX_FRAME_BUDGET
+
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_ENQUEUE_SIZE = int(os.getenv("BATCH_ENQUEUE_SIZE", "50"))
+
+
+def find_duplicates(keys):
+    """
+    Existing media for (sha256, text_input, claim_text) keys, in one query on
+    the sha256 index: a completed doc where there is one, otherwise one
+    still in flight. Failed docs never match, so a resubmission reruns.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+
+    found = {}
+    cursor = media_docs.find(
+        {"sha256": {"$in": list({k[0] for k in keys})}, "status": {"$ne": "failed"}},
+        {"media_id": 1, "status": 1, "sha256": 1, "text_input": 1, "claim_text": 1},
+    )
+    for doc in cursor:
+        key = (doc.get("sha256"), doc.get("text_input"), doc.get("claim_text"))
+        if key in keys and (key not in found or doc.get("status") == "completed"):
+            found[key] = doc
+    return found
+
+
+def find_duplicate(sha256, text_input, claim_text):
+    key = (sha256, text_input, claim_text)
+    return find_duplicates([key]).get(key)
+
+
+def new_media_doc(media_id, user, text_input, claim_text, uploaded_file=None):
+    file_type = uploaded_file.file_type if uploaded_file else None
+
+    # If only text input, mark file_type as text
+    if not file_type and text_input:
+        file_type = "text"
+
+    return {
+        "media_id": media_id,
+        "user_id": str(user.id),
+        "minio_path": uploaded_file.storage_path if uploaded_file else None,
+        "text_input": text_input,
+        "claim_text": claim_text,
+        "file_type": file_type,
+        "sha256": uploaded_file.sha256 if uploaded_file else None,
+        "phash": None,
+        "status": "uploaded",
+    }
 
 
 # /api/verify/
+# Uploads are streamed to local storage / MinIO by StreamingUploadHandler
+# while Django parses the request, so the file arrives already stored,
+# hashed and typed.
+@streaming_upload
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def verify_media(request):
@@ -27,52 +97,59 @@ def verify_media(request):
     if not uploaded_file and not text_input:
         return Response({"error": "Please upload a file or enter text."}, status=400)
 
+    # optional cap on keyframes analyzed for a video (see api.frames)
+    frame_budget = request.data.get("frame_budget")
+    if frame_budget not in (None, ""):
+        try:
+            frame_budget = int(frame_budget)
+        except (TypeError, ValueError):
+            frame_budget = 0
+        if not 1 <= frame_budget <= MAX_FRAME_BUDGET:
+            if uploaded_file:
+                discard_upload(uploaded_file.storage_path)
+            return Response({"error": f"frame_budget must be between 1 and {MAX_FRAME_BUDGET}."}, status=400)
+    else:
+        frame_budget = None
+
+    # text-only jobs can run inside this request (see below)
+    sync = str(request.data.get("sync") or request.query_params.get("sync") or "").lower() in ("1", "true", "yes")
+
     media_id = f"m-{uuid.uuid4()}"
     job_id = f"job-{uuid.uuid4()}"
 
-    minio_path = None
-    file_type = None
-    sha256 = None
-    phash = None
-
-    # If uploaded file: save to local (dev) or MinIO; determine file type
+    # If uploaded file: it is already in local storage (dev) or MinIO,
+    # hashed and typed from its magic bytes
     if uploaded_file:
-        # determine type from filename
-        mime_type, _ = mimetypes.guess_type(uploaded_file.name)
-        if mime_type:
-            if mime_type.startswith("image"):
-                file_type = "image"
-            elif mime_type.startswith("video"):
-                file_type = "video"
-            elif mime_type.startswith("audio"):
-                file_type = "audio"
-        # save locally (development) or to MinIO
-        if os.getenv("DEVELOPMENT_MODE", "True") == "True":
-            local_path = os.path.join(settings.MEDIA_ROOT, f"{media_id}_{uploaded_file.name}")
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            with open(local_path, "wb+") as destination:
-                for chunk in uploaded_file.chunks():
-                    destination.write(chunk)
-            minio_path = f"local://{local_path}"
-        else:
-            minio_path = f"uploads/{media_id}/{uploaded_file.name}"
-            # minio_client.put_object expects a stream - for file upload use uploaded_file.file or uploaded_file.read
-            minio_client.put_object(BUCKET, minio_path, uploaded_file, length=uploaded_file.size)
+        media_id = uploaded_file.media_id
 
-    # If only text input, mark file_type as text
-    if not file_type and text_input:
-        file_type = "text"
+        # Identical submission already known: link to it instead of re-running
+        duplicate = find_duplicate(uploaded_file.sha256, text_input, claim_text)
+        if duplicate:
+            discard_upload(uploaded_file.storage_path)
+            completed = duplicate.get("status") == "completed"
+            VerificationJob.objects.create(
+                job_id=job_id,
+                user=user,
+                media_id=duplicate["media_id"],
+                status="completed" if completed else "processing",
+                result_ready=completed
+            )
+            if not completed:
+                # the original may have finalized while we were linking to it
+                latest = media_docs.find_one({"media_id": duplicate["media_id"]}, {"status": 1}) or {}
+                if latest.get("status") == "completed":
+                    VerificationJob.objects.filter(job_id=job_id).update(status="completed", result_ready=True)
+            return Response({
+                "message": "Verification completed." if completed else "Verification started.",
+                "job_id": job_id,
+                "media_id": duplicate["media_id"],
+                "deduplicated": True,
+            }, status=200)
 
     # Insert media doc in Mongo (include file_type)
-    media_doc = {
-        "media_id": media_id,
-        "user_id": str(user.id),
-        "minio_path": minio_path,
-        "text_input": text_input,
-        "claim_text": claim_text,
-        "file_type": file_type,
-        "status": "uploaded",
-    }
+    media_doc = new_media_doc(media_id, user, text_input, claim_text, uploaded_file)
+    if frame_budget:
+        media_doc["frame_budget"] = frame_budget
     media_docs.insert_one(media_doc)
 
     # Create SQL job
@@ -84,64 +161,352 @@ def verify_media(request):
         result_ready=False
     )
 
-    # Kick off orchestration (Celery)
-    async_task("api.qtasks.orchestrate_job", job_id, media_id)
+    # sync=true: run the text pipeline here within SYNC_BUDGET_MS and answer
+    # with the report; whatever is left past the budget goes to the queue
+    if sync and media_doc["file_type"] == "text":
+        start = time.perf_counter()
+        plan = generate_task_plan(media_doc)
+        completed = run_within_budget(job_id, media_id, plan["plan"], settings.SYNC_BUDGET_MS / 1000)
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        if completed:
+            return Response({
+                "message": "Verification completed.",
+                "job_id": job_id,
+                "media_id": media_id,
+                "sync": True,
+                "elapsed_ms": elapsed_ms,
+                "report": report_payload(media_id),
+            }, status=200)
+        return Response({
+            "message": "Verification started.",
+            "job_id": job_id,
+            "media_id": media_id,
+            "sync": False,
+            "elapsed_ms": elapsed_ms,
+        }, status=200)
+
+    # Kick off orchestration (planning lane, fair-queued per user)
+    enqueue(PLANNING_LANE, user.id, "api.qtasks.orchestrate_job", job_id, media_id)
 
     return Response({"message": "Verification started.", "job_id": job_id, "media_id": media_id}, status=200)
 
 
+# /api/verify/batch/
+# multipart: every uploaded file is an item (optional shared claim_text),
+#            plus one text item per text_input field
+# NDJSON:    one {"text_input": ..., "claim_text": ...} object per line
+@streaming_upload
+@api_view(['POST'])
+@parser_classes([MultiPartParser, NDJSONParser])
+@permission_classes([IsAuthenticated])
+def verify_batch(request):
+    user = request.user
+
+    items = []
+    if isinstance(request.data, list):
+        for entry in request.data:
+            error = entry.get("_error")
+            text_input, claim_text = entry.get("text_input") or "", entry.get("claim_text") or ""
+            if not error and not (isinstance(text_input, str) and isinstance(claim_text, str)):
+                error = "text_input and claim_text must be strings."
+            items.append({
+                "text_input": str(text_input).strip(),
+                "claim_text": str(claim_text).strip(),
+                "file": None,
+                "error": error,
+            })
+    elif hasattr(request.data, "getlist"):
+        # multipart (an empty NDJSON body parses to a plain {} and lands below)
+        shared_claim = request.data.get("claim_text", "").strip()
+        for field in request.FILES:
+            for uploaded_file in request.FILES.getlist(field):
+                items.append({"text_input": "", "claim_text": shared_claim, "file": uploaded_file, "error": None})
+        for text_input in request.data.getlist("text_input"):
+            items.append({"text_input": text_input.strip(), "claim_text": shared_claim, "file": None, "error": None})
+
+    if not items:
+        return Response({"error": "Please upload files or provide text items."}, status=400)
+    if len(items) > BATCH_MAX_ITEMS:
+        for item in items:
+            if item["file"]:
+                discard_upload(item["file"].storage_path)
+        return Response({"error": f"A batch may contain at most {BATCH_MAX_ITEMS} items."}, status=400)
+
+    results = [{"index": i} for i in range(len(items))]
+    for item, result in zip(items, results):
+        if not item["error"] and not item["file"] and not item["text_input"]:
+            item["error"] = "Item has neither a file nor text_input."
+        if item["error"]:
+            result.update(status="failed", error=item["error"])
+
+    # 1) Duplicate lookup for all uploads in one query
+    def dedup_key(item):
+        return (item["file"].sha256, item["text_input"], item["claim_text"])
+
+    uploads = [item for item in items if item["file"] and not item["error"]]
+    duplicates = find_duplicates(dedup_key(item) for item in uploads)
+
+    # 2) New media docs (identical files within the batch share one)
+    new_docs, new_items, jobs = [], [], []
+    batch_media = {}
+    for item, result in zip(items, results):
+        if item["error"]:
+            continue
+        result["job_id"] = f"job-{uuid.uuid4()}"
+        key = dedup_key(item) if item["file"] else None
+
+        if key in duplicates or key in batch_media:
+            if item["file"]:
+                discard_upload(item["file"].storage_path)
+            existing = duplicates.get(key)
+            completed = bool(existing) and existing.get("status") == "completed"
+            result.update(
+                media_id=existing["media_id"] if existing else batch_media[key],
+                status="completed" if completed else "deduplicated",
+                deduplicated=True,
+            )
+            continue
+
+        media_id = item["file"].media_id if item["file"] else f"m-{uuid.uuid4()}"
+        if key:
+            batch_media[key] = media_id
+        result.update(media_id=media_id, status="queued")
+        new_docs.append(new_media_doc(media_id, user, item["text_input"], item["claim_text"], item["file"]))
+        new_items.append((item, result))
+
+    failed_media = set()
+    if new_docs:
+        try:
+            media_docs.insert_many(new_docs, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors", []):
+                failed_media.add(new_docs[err["index"]]["media_id"])
+
+    for item, result in new_items:
+        if result["media_id"] in failed_media:
+            if item["file"]:
+                discard_upload(item["file"].storage_path)
+            result.update(status="failed", error="Could not store media document.")
+            result.pop("job_id")
+
+    # 3) SQL jobs in one round-trip
+    for result in results:
+        if result.get("status") == "failed":
+            continue
+        if result["media_id"] in failed_media:
+            # deduplicated against a batch sibling that failed to insert
+            result.update(status="failed", error="Could not store media document.", deduplicated=False)
+            result.pop("job_id")
+            continue
+        completed = result["status"] == "completed"
+        jobs.append(VerificationJob(
+            job_id=result["job_id"],
+            user=user,
+            media_id=result["media_id"],
+            status="completed" if completed else "processing",
+            result_ready=completed,
+        ))
+    VerificationJob.objects.bulk_create(jobs)
+
+    # Attached to in-flight media that may have finalized meanwhile
+    attached = {r["media_id"] for r in results if r.get("status") == "deduplicated"}
+    if attached:
+        done = [d["media_id"] for d in media_docs.find(
+            {"media_id": {"$in": list(attached)}, "status": "completed"}, {"media_id": 1}
+        )]
+        if done:
+            VerificationJob.objects.filter(media_id__in=done).update(status="completed", result_ready=True)
+
+    # 4) One queued task per chunk of new jobs, not one per item
+    to_start = [(r["job_id"], r["media_id"]) for _, r in new_items if r["status"] == "queued"]
+    for i in range(0, len(to_start), BATCH_ENQUEUE_SIZE):
+        chunk = to_start[i:i + BATCH_ENQUEUE_SIZE]
+        enqueue(PLANNING_LANE, user.id, "api.qtasks.orchestrate_batch", chunk, cost=len(chunk))
+
+    failed = sum(1 for r in results if r["status"] == "failed")
+    return Response({
+        "message": "Batch accepted." if failed < len(results) else "Batch rejected.",
+        "accepted": len(results) - failed,
+        "failed": failed,
+        "items": results,
+    }, status=200 if failed < len(results) else 400)
+
+
+# /api/jobs/?cursor=<cursor>&limit=<n>
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_list(request):
+    try:
+        limit = int(request.GET.get("limit", PAGE_SIZE))
+        jobs, next_cursor = list_user_jobs(request.user, cursor=request.GET.get("cursor"), limit=limit)
+    except ValueError:
+        return Response({"error": "Invalid cursor or limit"}, status=400)
+
+    return Response({"jobs": jobs, "next_cursor": next_cursor})
+
+
 # /api/status/<job_id>/
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def job_status(request, job_id):
-    try:
-        job = VerificationJob.objects.get(job_id=job_id, user=request.user)
-    except VerificationJob.DoesNotExist:
+    job = _owned_job(job_id, request.user)
+    if job is None:
         return Response({"error": "Invalid job_id"}, status=404)
 
-    media_doc = media_docs.find_one({"media_id": job.media_id}) or {}
-    status = media_doc.get("status", job.status or "processing")
+    payload = cached_payload(
+        "status", job["media_id"], lambda: status_payload(job["media_id"], job["status"])
+    )
+    return Response({"job_id": job_id, **payload})
 
-    # compute progress heuristically
-    keys = ["frames_extracted", "transcript", "authenticity_score", "claim_extracted", "truthscore"]
-    completed = sum(1 for k in keys if media_doc.get(k))
-    progress = int((completed / max(len(keys), 1)) * 100)
-    if status == "completed":
-        progress = 100
 
-    return Response({
-        "job_id": job.job_id,
-        "media_id": job.media_id,
+def _owned_job(job_id, user):
+    return cached_job(
+        job_id, user,
+        lambda: VerificationJob.objects.filter(job_id=job_id).only("user_id", "media_id", "status").first(),
+    )
+
+
+def status_payload(media_id, job_status="processing"):
+    # a few dozen bytes whatever the doc carries (see api.dag progress)
+    media_doc = media_docs.find_one({"media_id": media_id}, {"_id": 0, "status": 1, "progress": 1}) or {}
+    status = media_doc.get("status", job_status or "processing")
+    progress = 100 if status == "completed" else progress_percent(media_doc.get("progress"))
+
+    return {
+        "media_id": media_id,
         "status": status,
         "progress": progress
-    })
+    }
+
+
+# /api/events/<job_id>/
+# Server-Sent Events: one snapshot, then a push per stage completion until
+# the job is done or SSE_MAX_SECONDS pass. Async view, served by
+# deeptrust.asgi with EVENTS_BACKEND="redis" (see events.sse_available);
+# anywhere else it answers 204, which stops EventSource, and the page polls.
+SSE_HEARTBEAT_SECONDS = 15
+SSE_STALL_SECONDS = SSE_HEARTBEAT_SECONDS * 2.5  # page gives up on a silent stream
+SSE_MAX_SECONDS = 300
+FINISHED_STATUSES = ("completed", "failed")
+
+
+def _sse(data):
+    return f"data: {json.dumps(data, default=str)}\n\n"
+
+
+async def job_events(request, job_id):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+    if not sse_available(request):
+        return HttpResponse(status=204)
+
+    job = await VerificationJob.objects.filter(job_id=job_id, user=user).afirst()
+    if job is None:
+        return JsonResponse({"error": "Invalid job_id"}, status=404)
+
+    async def stream():
+        # subscribe before the snapshot so nothing slips in between
+        async with get_broker().subscribe(channel_for(job.media_id)) as events:
+            snapshot = await sync_to_async(cached_payload)(
+                "status", job.media_id, lambda: status_payload(job.media_id, job.status)
+            )
+            yield _sse({"job_id": job.job_id, **snapshot})
+            if snapshot["status"] in FINISHED_STATUSES:
+                return
+
+            deadline = time.monotonic() + SSE_MAX_SECONDS
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # the page reconnects or falls back to polling
+                    return
+                try:
+                    event = await asyncio.wait_for(events.get(), min(SSE_HEARTBEAT_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    # a named event, not a comment: EventSource only surfaces events,
+                    # and the page re-arms its stall timer on it
+                    yield "event: ping\ndata: {}\n\n"
+                    continue
+                yield _sse({"job_id": job.job_id, **event})
+                if event.get("status") in FINISHED_STATUSES:
+                    return
 
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
-# /api/report/<job_id>/
+
+# /api/report/<job_id>/?expand=transcript,evidence,frames
+# The report itself is small and cached; heavy sections (api.artifacts)
+# are only fetched when asked for.
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def job_report(request, job_id):
-    try:
-        job = VerificationJob.objects.get(job_id=job_id, user=request.user)
-    except VerificationJob.DoesNotExist:
+    job = _owned_job(job_id, request.user)
+    if job is None:
         return Response({"error": "Invalid job_id"}, status=404)
 
-    media_doc = media_docs.find_one({"media_id": job.media_id}) or {}
+    expand = [e for e in request.query_params.get("expand", "").split(",") if e]
+    unknown = [e for e in expand if e not in REPORT_EXPANSIONS]
+    if unknown:
+        return Response({"error": f"Unknown expand {unknown}; choose from {sorted(REPORT_EXPANSIONS)}"}, status=400)
+
+    payload = cached_payload("report", job["media_id"], lambda: report_payload(job["media_id"]))
+    if expand:
+        payload = {**payload, **report_sections(job["media_id"], expand)}
+    return Response({"job_id": job_id, **payload})
+
+
+REPORT_PROJECTION = {
+    "_id": 0, "status": 1, "authenticity_score": 1, "text_ai_score": 1, "truthscore": 1,
+    "claim.normalized_text": 1, "claim.latest_verdict": 1, "artifacts": 1, "near_duplicates": 1,
+}
+
+# expand name -> artifact fields it adds to the report
+REPORT_EXPANSIONS = {
+    "transcript": ["transcript", "transcript_segments"],
+    "evidence": ["evidence"],
+    "frames": ["keyframes"],
+}
+
+
+def report_payload(media_id):
+    media_doc = media_docs.find_one({"media_id": media_id}, REPORT_PROJECTION) or {}
     claim = media_doc.get("claim") or {}
-    verification = media_doc.get("verification") or {}
+    stored = media_doc.get("artifacts") or {}
 
-    result = {
-        "job_id": job.job_id,
-        "media_id": job.media_id,
+    return {
+        "media_id": media_id,
         "status": media_doc.get("status"),
         "authenticity_score": media_doc.get("authenticity_score"),
-        "transcript": media_doc.get("transcript"),
         "text_ai_score": media_doc.get("text_ai_score"),
         "truthscore": media_doc.get("truthscore"),
         "claim": {
             "normalized_text": claim.get("normalized_text"),
             "latest_verdict": claim.get("latest_verdict"),
         } if claim else None,
-        "evidence": verification.get("evidence", []),
+        # earlier media with a near-identical image (api.phash_index)
+        "near_duplicates": media_doc.get("near_duplicates") or [],
+        "expandable": sorted(e for e, fields in REPORT_EXPANSIONS.items() if artifacts.KIND_OF[fields[0]] in stored),
     }
-    return Response(result)
+
+
+def report_sections(media_id, expand):
+    """The requested heavy report sections, from api.artifacts."""
+    fields = [f for e in expand for f in REPORT_EXPANSIONS[e]]
+    values = artifacts.load(media_id, fields)
+    missing = [f for f in fields if f not in values]
+    if missing:
+        # docs from before api.artifacts carry these inline (evidence as verification.evidence)
+        legacy = media_docs.find_one(
+            {"media_id": media_id}, {"_id": 0, "verification.evidence": 1, **{f: 1 for f in missing}},
+        ) or {}
+        if "evidence" in missing and not legacy.get("evidence"):
+            legacy["evidence"] = (legacy.get("verification") or {}).get("evidence")
+        values.update({f: legacy.get(f) for f in missing})
+    sections = {f: values.get(f) for f in fields}
+    if "evidence" in sections:
+        sections["evidence"] = sections["evidence"] or []
+    return sections
@@ -0,0 +1,124 @@
+# api/writer.py
+"""
+Coalesced media_docs writes for pipeline stages.
+
+Stages hand their results to stage_writer.set() instead of issuing their
+own update_one. Fragments are merged per media_id (later writes win, in
+arrival order) and leave the process in one of three ways:
+
+    take(media_id)  folded into the stage-completion update (api.dag) or
+                    the finalize update, so a stage costs one write; it
+                    waits for a flush already writing that job's fields,
+                    so the completion never lands before them
+    flush()         one ordered bulk_write for every pending job, run by a
+                    background thread every `window` seconds
+    atexit          whatever is left when the worker exits
+"""
+import atexit
+import threading
+import time
+
+from pymongo import UpdateOne
+
+from .mongo import media_docs
+
+WRITE_WINDOW_SECONDS = 0.05
+MAX_PENDING_JOBS = 500
+
+
+def _merge(pending, fields):
+    """
+    Merge $set fields into `pending` without creating path conflicts
+    ("claim" and "claim.latest_verdict" cannot share one $set).
+    """
+    for key, value in fields.items():
+        # a whole-field write supersedes pending writes below it
+        for sub in [k for k in pending if k.startswith(key + ".")]:
+            del pending[sub]
+
+        parent = next((p for p in pending if key.startswith(p + ".")), None)
+        if parent is None:
+            pending[key] = value
+            continue
+
+        # a sub-path write into a pending parent value: apply it in place
+        target = pending[parent] = dict(pending[parent]) if isinstance(pending[parent], dict) else {}
+        parts = key[len(parent) + 1:].split(".")
+        for part in parts[:-1]:
+            child = target.get(part)
+            child = dict(child) if isinstance(child, dict) else {}
+            target[part] = child
+            target = child
+        target[parts[-1]] = value
+
+
+class StageResultWriter:
+    def __init__(self, collection, window=WRITE_WINDOW_SECONDS, max_pending=MAX_PENDING_JOBS):
+        self.collection = collection
+        self.window = window
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        # media_ids whose fields a flush is writing right now (take() waits on them)
+        self._in_flight = set()
+        self._flushed = threading.Condition(self._lock)
+        # serializes flushes so a later batch can never overtake an earlier one
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def set(self, media_id, fields):
+        with self._lock:
+            _merge(self._pending.setdefault(media_id, {}), fields)
+            full = len(self._pending) >= self.max_pending
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        if full:
+            self.flush()
+
+    def take(self, media_id):
+        """Pending $set fields for one job, removed from the buffer, once no flush is writing it."""
+        with self._flushed:
+            self._flushed.wait_for(lambda: media_id not in self._in_flight)
+            return self._pending.pop(media_id, {})
+
+    def flush(self, media_id=None):
+        with self._flush_lock:
+            with self._lock:
+                if media_id is None:
+                    batch, self._pending = self._pending, {}
+                else:
+                    batch = {media_id: self._pending.pop(media_id)} if media_id in self._pending else {}
+                self._in_flight.update(batch)
+            try:
+                ops = [UpdateOne({"media_id": m}, {"$set": fields}) for m, fields in batch.items() if fields]
+                if ops:
+                    self.collection.bulk_write(ops, ordered=True)
+            except Exception:
+                # put the batch back underneath anything newer and let the caller see it
+                with self._lock:
+                    for m, fields in batch.items():
+                        _merge(fields, self._pending.get(m, {}))
+                        self._pending[m] = fields
+                raise
+            finally:
+                with self._flushed:
+                    self._in_flight.difference_update(batch)
+                    self._flushed.notify_all()
+
+    def _run(self):
+        while True:
+            # idle until something is buffered, then give siblings a window to join
+            self._wakeup.wait()
+            time.sleep(self.window)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print("❌ Stage result flush failed:", e)
+
+
+stage_writer = StageResultWriter(media_docs)
+atexit.register(stage_writer.flush)
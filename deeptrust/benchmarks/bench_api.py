@@ -0,0 +1,392 @@
+# benchmarks/bench_api.py
+"""
+Load test for the verify / status / report API.
+
+    python -m benchmarks.bench_api --requests 2000 --concurrency 16 \
+        --mix verify_text=2,verify_image=1,verify_image_claim=1,status=10,report=2
+
+Everything runs in this process against local stand-ins, so a run is
+reproducible and comparable between commits (pip install -r
+requirements-dev.txt for mongomock):
+
+    Mongo     mongomock (default), or a local mongod with --mongo mongodb://localhost:27017
+    storage   DEVELOPMENT_MODE local files under a temp MEDIA_ROOT
+    SQL       a fresh SQLite file, migrated at start
+    LLM       a stub OpenRouter server on 127.0.0.1 answering after
+              --llm-latency-ms; only plans no rule covers (image + claim) reach it
+    Django-Q  lane_queue is real; run_next tokens go to in-process thread
+              pools sized like LANE_WORKERS instead of qcluster processes
+
+Requests go through django.test.Client (the whole middleware / DRF stack,
+no socket) from --concurrency closed-loop threads. Operations:
+
+    verify_text          text-only job
+    verify_text_sync     text-only job with sync=true
+    verify_image         unique random JPEG upload
+    verify_image_claim   JPEG upload with a claim (LLM-planned)
+    status               poll a job this run created
+    report               report of a job this run created
+
+Prints one JSON object: per operation count, errors (5xx / exceptions),
+status codes, p50/p95/p99 latency, requests/s and Mongo ops per request
+(counted in the request thread: pymongo command events, or mongomock
+collection calls), plus totals, how long the queued pipelines took to
+drain and the git commit. --out also writes it to a file.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import numpy as np
+
+OPERATIONS = ["verify_text", "verify_text_sync", "verify_image", "verify_image_claim", "status", "report"]
+DEFAULT_MIX = "verify_text=2,verify_image=1,verify_image_claim=1,status=10,report=2"
+
+STUB_PLAN = {"plan": [{"task": t} for t in [
+    "authenticity_image", "claim_extract", "claim_normalize", "retrieval_semantic_search",
+    "verification_ensemble", "truthscore_compute", "job_finalize",
+]]}
+
+
+# -----------------------------
+# Stand-ins
+# -----------------------------
+def start_llm_stub(latency_ms):
+    """OpenRouter-shaped chat completions server returning a fixed plan."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            time.sleep(latency_ms / 1000)
+            body = json.dumps({"choices": [{"message": {"content": json.dumps(STUB_PLAN)}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/api/v1/chat/completions"
+
+
+def use_mongomock():
+    """Route api.mongo to mongomock, counting every collection call as a Mongo op."""
+    import mongomock
+    import mongomock.collection
+    import pymongo
+
+    pymongo.MongoClient = mongomock.MongoClient
+
+    # this pymongo passes sort= to bulk update ops, which mongomock does not know
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def _add_update(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    mongomock.collection.BulkOperationBuilder.add_update = _add_update
+
+    from api import metrics
+
+    # fed the same events pymongo would send
+    timer = metrics.MongoCommandTimer()
+    depth = threading.local()
+    # mongomock updates are read-modify-write in Python; one lock gives them
+    # the per-document atomicity the DAG and lanes rely on in Mongo
+    serial = threading.RLock()
+
+    def counted(name, fn):
+        def wrapper(self, *args, **kwargs):
+            # find_one -> find etc. count once
+            if getattr(depth, "n", 0):
+                return fn(self, *args, **kwargs)
+            depth.n = 1
+            timer.started(SimpleNamespace(command_name=name))
+            start = time.perf_counter()
+            try:
+                with serial:
+                    return fn(self, *args, **kwargs)
+            finally:
+                depth.n = 0
+                timer.succeeded(SimpleNamespace(command_name=name, duration_micros=(time.perf_counter() - start) * 1e6))
+        return wrapper
+
+    for name in ["find", "find_one", "find_one_and_update", "find_one_and_replace", "insert_one", "insert_many",
+                 "update_one", "update_many", "replace_one", "delete_one", "delete_many", "bulk_write",
+                 "aggregate", "distinct", "count_documents"]:
+        setattr(mongomock.collection.Collection, name, counted(name, getattr(mongomock.collection.Collection, name)))
+
+
+def start_lane_workers(workers):
+    """Stand-in for the per-lane qclusters: run_next tokens go to thread pools."""
+    from api import lanes
+
+    pools = {lane: ThreadPoolExecutor(n, thread_name_prefix=f"lane-{lane}") for lane, n in workers.items()}
+    state = {"pending": 0, "errors": 0}
+    idle = threading.Condition()
+
+    def run_token(lane):
+        try:
+            lanes.run_next(lane)
+        except Exception as e:
+            state["errors"] += 1
+            print("❌ lane task failed:", lane, e, file=sys.stderr)
+        finally:
+            with idle:
+                state["pending"] -= 1
+                idle.notify_all()
+
+    def async_task(func, lane, cluster=None, **kwargs):
+        with idle:
+            state["pending"] += 1
+        pools[lane].submit(run_token, lane)
+
+    lanes.async_task = async_task
+
+    def drain(timeout):
+        with idle:
+            return idle.wait_for(lambda: state["pending"] == 0, timeout)
+
+    return drain, state
+
+
+# -----------------------------
+# Load
+# -----------------------------
+def random_jpeg(rng, size=256):
+    from PIL import Image
+
+    pixels = np.frombuffer(rng.randbytes(size * size * 3), dtype=np.uint8).reshape(size, size, 3)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=85)
+    buf.seek(0)
+    buf.name = f"bench-{uuid.uuid4().hex[:8]}.jpg"
+    return buf
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name!r}; choose from {OPERATIONS}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Load:
+    def __init__(self, users, seed):
+        self.users = users
+        self.seed = seed
+        self.jobs = defaultdict(list)  # user index -> [job_id]
+        self.media_ids = []
+        self.lock = threading.Lock()
+
+    def request(self, client, user, op, rng):
+        """One API call; returns the HTTP status."""
+        if op.startswith("verify_"):
+            data = {"text_input": f"Benchmark claim {uuid.uuid4().hex}. It was reported today."}
+            if op == "verify_text_sync":
+                data["sync"] = "true"
+            if op.startswith("verify_image"):
+                data = {"file": random_jpeg(rng)}
+                if op == "verify_image_claim":
+                    data["claim_text"] = f"This photo shows event {uuid.uuid4().hex[:6]}"
+            response = client.post("/api/verify/", data)
+            if response.status_code == 200:
+                body = response.json()
+                with self.lock:
+                    self.jobs[user].append(body["job_id"])
+                    self.media_ids.append(body["media_id"])
+            return response.status_code
+
+        with self.lock:
+            jobs = self.jobs[user]
+            job_id = rng.choice(jobs) if jobs else "job-missing"
+        path = "status" if op == "status" else "report"
+        return client.get(f"/api/{path}/{job_id}/").status_code
+
+
+def run_client(load, user_objs, index, mix, remaining, samples, warmup):
+    from django.test import Client
+    from api import metrics
+
+    rng = random.Random(load.seed + index)
+    user = index % len(user_objs)
+    client = Client()
+    client.force_login(user_objs[user])
+    ops, weights = list(mix), list(mix.values())
+
+    while True:
+        with remaining["lock"]:
+            if remaining["n"] <= 0:
+                return
+            remaining["n"] -= 1
+            recorded = remaining["n"] < remaining["total"] - warmup
+        op = rng.choices(ops, weights)[0]
+        ops_before = metrics.db_ops()
+        start = time.perf_counter()
+        try:
+            status = load.request(client, user, op, rng)
+        except Exception as e:
+            print("❌", op, e, file=sys.stderr)
+            status = "exception"
+        elapsed = time.perf_counter() - start
+        if recorded:
+            samples.append((op, elapsed, status, metrics.db_ops() - ops_before, time.perf_counter()))
+
+
+def summarize(samples, wall):
+    def stats(rows):
+        latencies = np.array([r[1] for r in rows]) * 1000
+        codes = Counter(str(r[2]) for r in rows)
+        return {
+            "count": len(rows),
+            "errors": sum(1 for r in rows if not isinstance(r[2], int) or r[2] >= 500),
+            "status_codes": dict(sorted(codes.items())),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+            "mean_ms": round(float(latencies.mean()), 2),
+            "rps": round(len(rows) / wall, 1),
+            "db_ops_per_request": round(sum(r[3] for r in rows) / len(rows), 2),
+        }
+
+    by_op = defaultdict(list)
+    for row in samples:
+        by_op[row[0]].append(row)
+    return {op: stats(rows) for op, rows in sorted(by_op.items())}, stats(samples) if samples else {}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=50, help="leading requests left out of the stats")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="op=weight,... from " + ",".join(OPERATIONS))
+    parser.add_argument("--mongo", default="mongomock", help="'mongomock' or a mongod URI")
+    parser.add_argument("--executor", default=None, help="STAGE_EXECUTOR override (default: settings)")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--drain-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="also write the JSON result here")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    # the app's progress prints go to stderr; stdout carries only the result
+    result_out, sys.stdout = sys.stdout, sys.stderr
+    workdir = tempfile.mkdtemp(prefix="bench-api-")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "deeptrust.settings")
+    os.environ["DEVELOPMENT_MODE"] = "True"
+    os.environ["OPENROUTER_URL"] = start_llm_stub(args.llm_latency_ms)
+    os.environ["SNIPPET_INDEX_DIR"] = os.path.join(workdir, "vector_index")
+    os.environ["FRAMES_DIR"] = os.path.join(workdir, "frames")
+    if args.mongo != "mongomock":
+        os.environ["MONGO_URI"] = args.mongo
+        os.environ.setdefault("MONGO_TLS", "False")
+
+    import django
+
+    if args.mongo == "mongomock":
+        # before anything imports api.mongo
+        use_mongomock()
+    django.setup()
+    from django.conf import settings
+    from django.core.management import call_command
+
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["testserver"]
+    settings.MEDIA_ROOT = os.path.join(workdir, "media")
+    settings.DATABASES["default"]["NAME"] = os.path.join(workdir, "db.sqlite3")
+    settings.METRICS_DIR = ""
+    if args.executor:
+        settings.STAGE_EXECUTOR = args.executor
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+    call_command("migrate", verbosity=0)
+    call_command("provision", skip_minio=True, verbosity=0)
+
+    from django.contrib.auth.models import User
+    from api import metrics
+    from api.mongo import media_docs
+
+    drain, lane_state = start_lane_workers(settings.LANE_WORKERS)
+    user_objs = [User.objects.create_user(f"bench{i}", password=uuid.uuid4().hex) for i in range(args.users)]
+    load = Load(args.users, args.seed)
+
+    def mongo_ops():
+        return sum(sum(row[:-1]) for row in metrics.MONGO_SECONDS.snapshot().values())
+
+    remaining = {"n": args.requests + args.warmup, "total": args.requests + args.warmup, "lock": threading.Lock()}
+    samples = []
+    ops_before = mongo_ops()
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=run_client, args=(load, user_objs, i, mix, remaining, samples, args.warmup))
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # the measured window starts at the first recorded sample
+    first = min((s[4] - s[1] for s in samples), default=start)
+    wall = time.perf_counter() - first
+
+    drain_start = time.perf_counter()
+    drained = drain(args.drain_timeout)
+    drain_s = time.perf_counter() - drain_start
+    completed = media_docs.count_documents({"media_id": {"$in": load.media_ids}, "status": "completed"})
+
+    by_op, overall = summarize(samples, wall)
+    result = {
+        "bench": "api",
+        "commit": git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "mix": mix,
+        "wall_s": round(wall, 3),
+        "overall": overall,
+        "operations": by_op,
+        "mongo_ops_total": mongo_ops() - ops_before,
+        "pipeline": {
+            "jobs_created": len(load.media_ids),
+            "jobs_completed": completed,
+            "drained": drained,
+            "drain_s": round(drain_s, 3),
+            "lane_errors": lane_state["errors"],
+        },
+    }
+    print(json.dumps(result), file=result_out)
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
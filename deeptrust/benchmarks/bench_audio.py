@@ -0,0 +1,90 @@
+# benchmarks/bench_audio.py
+"""
+Benchmark for api.audio: transcription wall time vs. file and speech length.
+
+    python -m benchmarks.bench_audio --minutes 10 --speech-ratios 0.1,0.5,1.0
+
+Each file is synthetic 16 kHz audio of --minutes length: "speech" bursts
+(modulated noise, 1-8 s each, at roughly -15 dBFS) separated by
+near-silent gaps, with --speech-ratio of the file voiced. The stub
+transcriber sleeps --realtime-factor x the chunk duration to stand in for
+a model. Windows are fed straight to transcribe_windows, so ffmpeg is not
+needed. "naive_s" is what transcribing the whole file in one call would
+cost at the same real-time factor.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from api.audio import AUDIO_WINDOW_SECONDS, SAMPLE_RATE, StubTranscriber, transcribe_windows
+
+
+def synthetic_audio(seconds, speech_ratio, seed):
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SAMPLE_RATE)
+    out = rng.normal(0, 30, total).astype(np.int16)  # ~-60 dBFS floor
+
+    bursts = []
+    while sum(bursts) < speech_ratio * total:
+        bursts.append(int(rng.uniform(1, 8) * SAMPLE_RATE))
+    if bursts:
+        bursts[-1] -= sum(bursts) - int(speech_ratio * total)
+    # the silence is split at random between the gaps around the bursts
+    gaps = (rng.dirichlet(np.ones(len(bursts) + 1)) * (total - sum(bursts))).astype(int)
+
+    pos = 0
+    for gap, burst in zip(gaps, bursts):
+        pos += gap
+        envelope = 0.5 + 0.5 * np.sin(np.arange(burst) / SAMPLE_RATE * 2 * np.pi * 4)
+        out[pos:pos + burst] = (rng.normal(0, 5000, burst) * envelope).astype(np.int16)
+        pos += burst
+    return out
+
+
+def windows(samples):
+    step = int(AUDIO_WINDOW_SECONDS * SAMPLE_RATE)
+    for start in range(0, len(samples), step):
+        yield samples[start:start + step]
+
+
+def run(minutes, speech_ratio, realtime_factor, workers, seed):
+    samples = synthetic_audio(minutes * 60, speech_ratio, seed)
+    os.environ["BENCH_AUDIO_RTF"] = str(realtime_factor)  # inherited by the pool processes
+
+    start = time.perf_counter()
+    result = transcribe_windows(windows(samples), path="benchmarks.bench_audio:slow_stub", workers=workers)
+    wall = time.perf_counter() - start
+
+    return {
+        "audio_s": result["audio_seconds"],
+        "speech_s": result["speech_seconds"],
+        "chunks": result["chunks"],
+        "segments": len(result["segments"]),
+        "workers": workers,
+        "wall_s": round(wall, 3),
+        "naive_s": round(result["audio_seconds"] * realtime_factor, 3),
+    }
+
+
+def slow_stub():
+    return StubTranscriber(realtime_factor=float(os.environ.get("BENCH_AUDIO_RTF", "0")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--speech-ratios", default="0.1,0.5,1.0")
+    parser.add_argument("--realtime-factor", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for ratio in (float(r) for r in args.speech_ratios.split(",")):
+        print(json.dumps({"speech_ratio": ratio, **run(args.minutes, ratio, args.realtime_factor, args.workers, args.seed)}))
+
+
+if __name__ == "__main__":
+    main()
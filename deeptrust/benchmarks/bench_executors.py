@@ -0,0 +1,93 @@
+# benchmarks/bench_executors.py
+"""
+Benchmark for api.executors: the same text pipeline on each executor.
+
+    DJANGO_SETTINGS_MODULE=deeptrust.settings \
+        python -m benchmarks.bench_executors --jobs 200 --executors inline,thread,process
+
+Needs the configured MongoDB (provisioned with manage.py provision).
+Each run inserts --jobs text media docs (distinct claims, so the claim
+cache does not short-circuit them), starts the fixed plan below on one
+executor and waits until every doc is
+"completed". Reports throughput and per-job latency (start_pipeline to
+status flip). Run once with STAGE_INLINE_CHEAP=0 to see what running the
+cheap stages inline saves. "q" and "celery" need their workers running;
+benchmark docs are deleted afterwards.
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "deeptrust.settings")
+django.setup()
+
+import numpy as np  # noqa: E402
+
+from api.dag import start_pipeline  # noqa: E402
+from api.executors import get_executor  # noqa: E402
+from api.mongo import media_docs  # noqa: E402
+
+PLAN = [{"task": t} for t in [
+    "detect_text_ai", "claim_extract", "claim_normalize",
+    "retrieval_semantic_search", "verification_ensemble", "truthscore_compute", "job_finalize",
+]]
+
+
+def run(executor_name, jobs, timeout):
+    executor = get_executor(executor_name)
+    run_id = uuid.uuid4().hex[:8]
+    media_ids = [f"bench-{run_id}-{i}" for i in range(jobs)]
+    media_docs.insert_many([
+        {"media_id": m, "user_id": "bench", "file_type": "text", "status": "uploaded",
+         "text_input": f"Benchmark claim {run_id} number {i} is true.", "claim_text": None}
+        for i, m in enumerate(media_ids)
+    ])
+
+    started, finished = {}, {}
+    start = time.perf_counter()
+    for m in media_ids:
+        started[m] = time.perf_counter()
+        start_pipeline(m, PLAN, executor.dispatcher(None, m))
+        if executor_name == "inline":
+            # the whole job ran inside start_pipeline
+            finished[m] = time.perf_counter()
+
+    deadline = start + timeout
+    while len(finished) < jobs and time.perf_counter() < deadline:
+        pending = [m for m in media_ids if m not in finished]
+        for doc in media_docs.find({"media_id": {"$in": pending}, "status": "completed"}, {"media_id": 1}):
+            finished[doc["media_id"]] = time.perf_counter()
+        if len(finished) < jobs:
+            time.sleep(0.01)
+    wall = time.perf_counter() - start
+    media_docs.delete_many({"media_id": {"$in": media_ids}})
+
+    latencies = np.array([finished[m] - started[m] for m in finished]) * 1000
+    return {
+        "executor": executor_name,
+        "jobs": jobs,
+        "completed": len(finished),
+        "wall_s": round(wall, 3),
+        "jobs_per_s": round(len(finished) / wall, 1),
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+        "latency_p99_ms": round(float(np.percentile(latencies, 99)), 1) if len(latencies) else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--executors", default="inline,thread,process")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    for name in args.executors.split(","):
+        print(json.dumps(run(name, args.jobs, args.timeout)))
+
+
+if __name__ == "__main__":
+    main()
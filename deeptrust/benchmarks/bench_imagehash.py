@@ -0,0 +1,98 @@
+# benchmarks/bench_imagehash.py
+"""
+Benchmark for api.imagehash: images per second on one core.
+
+    python -m benchmarks.bench_imagehash --count 2000 --batch-size 256
+
+Synthetic JPEGs (multi-octave noise, --width x --height) are
+encoded in memory up front. "decode" times decode_images alone, "hash"
+times the three batch hashes on already decoded thumbnails, and "total"
+is hash_images end to end, which is what backfill_phash does per batch.
+A second pass re-encodes every image at half size and lower quality and
+reports how many bits each hash moved; unrelated images sit near 32.
+"""
+import argparse
+import io
+import json
+import time
+
+import numpy as np
+
+from api.imagehash import ahash_batch, decode_images, dhash_batch, hamming, hash_images, phash_batch
+
+
+def synthetic_jpegs(count, width, height, seed, scale=1.0, quality=90):
+    """Multi-octave noise, so the spectrum falls off roughly like a photo's."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(count):
+        rgb = np.full((height, width, 3), 128.0, dtype=np.float32)
+        for octave in (4, 8, 16, 32, 64):
+            coarse = rng.normal(0, 1, (max(1, octave * height // width), octave, 3)).astype(np.float32)
+            for c in range(3):
+                layer = Image.fromarray(coarse[..., c], mode="F").resize((width, height), Image.BICUBIC)
+                rgb[..., c] += np.asarray(layer) * 8 * (64 / octave) ** 0.5
+        img = Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8))
+        if scale != 1.0:
+            img = img.resize((int(width * scale), int(height * scale)), Image.BILINEAR)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality)
+        out.append(buf.getvalue())
+    return out
+
+
+def timed(fn, blobs, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(blobs), batch_size):
+        fn([io.BytesIO(b) for b in blobs[i:i + batch_size]])
+    return time.perf_counter() - start
+
+
+def run(count, width, height, batch_size, seed):
+    blobs = synthetic_jpegs(count, width, height, seed)
+    thumbs, _ = decode_images([io.BytesIO(b) for b in blobs])
+
+    decode_s = timed(decode_images, blobs, batch_size)
+    total_s = timed(hash_images, blobs, batch_size)
+    hash_s = {}
+    for name, fn in (("phash", phash_batch), ("dhash", dhash_batch), ("ahash", ahash_batch)):
+        start = time.perf_counter()
+        for i in range(0, count, batch_size):
+            fn(thumbs[i:i + batch_size])
+        hash_s[name] = time.perf_counter() - start
+
+    # robustness: same images, downscaled and recompressed
+    altered = synthetic_jpegs(count, width, height, seed, scale=0.5, quality=60)
+    alt_thumbs, _ = decode_images([io.BytesIO(b) for b in altered])
+    drift = {
+        name: float(np.mean(hamming(fn(thumbs), fn(alt_thumbs))))
+        for name, fn in (("phash", phash_batch), ("dhash", dhash_batch), ("ahash", ahash_batch))
+    }
+
+    return {
+        "count": count,
+        "size": f"{width}x{height}",
+        "batch_size": batch_size,
+        "decode_per_s": round(count / decode_s),
+        "total_per_s": round(count / total_s),
+        **{f"{name}_per_s": round(count / s) for name, s in hash_s.items()},
+        **{f"{name}_mean_bits_moved": round(d, 2) for name, d in drift.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=768)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.count, args.width, args.height, args.batch_size, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# benchmarks/bench_phash_index.py
+"""
+Benchmark for api.phash_index: build time, memory and query latency.
+
+    python -m benchmarks.bench_phash_index --sizes 1000000,10000000
+
+Hashes are uniformly random 64-bit values; every query is a planted
+near-duplicate (a stored hash with a few flipped bits) so each lookup has
+at least one true hit.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from api.phash_index import PHashIndex
+
+
+def percentile(samples, p):
+    return float(np.percentile(np.asarray(samples) * 1000, p))
+
+
+def run(size, queries, max_distance, seed):
+    rng = np.random.default_rng(seed)
+    hashes = rng.integers(0, 2**64, size=size, dtype=np.uint64)
+    ids = np.arange(size, dtype=np.int64)
+
+    index = PHashIndex()
+    start = time.perf_counter()
+    index.build(ids, hashes)
+    build_s = time.perf_counter() - start
+
+    targets = rng.integers(0, size, size=queries)
+    flips = rng.integers(0, max_distance + 1, size=queries)
+    latencies, recalled = [], 0
+    for target, nflip in zip(targets, flips):
+        query = int(hashes[target])
+        for bit in rng.choice(64, size=nflip, replace=False):
+            query ^= 1 << int(bit)
+        start = time.perf_counter()
+        hits = index.query(query, max_distance=max_distance)
+        latencies.append(time.perf_counter() - start)
+        recalled += any(int(m) == int(target) for m, _ in hits)
+
+    return {
+        "size": size,
+        "max_distance": max_distance,
+        "build_s": round(build_s, 3),
+        "index_mb": round(index.nbytes / 2**20, 1),
+        "query_p50_ms": round(percentile(latencies, 50), 3),
+        "query_p99_ms": round(percentile(latencies, 99), 3),
+        "recall": recalled / queries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000000,10000000")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--max-distance", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(json.dumps(run(size, args.queries, args.max_distance, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# benchmarks/bench_vector_index.py
+"""
+Benchmark for api.vector_index: build/train time, disk footprint and
+recall@k vs latency for exact search and IVF-PQ at several nprobe values.
+
+    python -m benchmarks.bench_vector_index --sizes 1000000,10000000 --dir /tmp/vecbench
+
+Vectors are drawn from a mixture of Gaussians (real embeddings are
+clustered; uniform noise is the worst case for any IVF). Queries are
+fresh draws from the same mixture and ground truth is the exact search.
+The index files are written to --dir, which needs ~size*dim*4 bytes.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from api.vector_index import VectorIndex
+
+
+def percentile(samples, p):
+    return float(np.percentile(np.asarray(samples) * 1000, p))
+
+
+def mixture(rng, centers, n, noise):
+    picks = rng.integers(0, len(centers), size=n)
+    return centers[picks] + noise * rng.standard_normal((n, centers.shape[1])).astype(np.float32)
+
+
+def timed_search(index, queries, k, **kwargs):
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(index.search(q[None, :], k, **kwargs)[0])
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def recall(results, truth, k):
+    return float(np.mean([len({i for i, _ in r} & {i for i, _ in t}) / k for r, t in zip(results, truth)]))
+
+
+def run(size, args):
+    rng = np.random.default_rng(args.seed)
+    path = os.path.join(args.dir, f"n{size}")
+    shutil.rmtree(path, ignore_errors=True)
+    index = VectorIndex(path, args.dim)
+
+    centers = rng.standard_normal((args.clusters, args.dim)).astype(np.float32)
+    start = time.perf_counter()
+    for lo in range(0, size, args.chunk):
+        n = min(args.chunk, size - lo)
+        index.append([f"{i:024x}" for i in range(lo, lo + n)], mixture(rng, centers, n, args.noise))
+    append_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index.train()
+    train_s = time.perf_counter() - start
+
+    queries = mixture(rng, centers, args.queries, args.noise)
+    disk_mb = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 2**20
+    rows = []
+
+    # exact: batched for throughput, single queries for latency
+    start = time.perf_counter()
+    truth = index.search(queries, args.k, exact=True)
+    batch_s = time.perf_counter() - start
+    latencies, _ = timed_search(index, queries[:args.exact_queries], args.k, exact=True)
+    rows.append({
+        "size": size, "mode": "exact", "recall": 1.0,
+        "p50_ms": round(percentile(latencies, 50), 2), "p99_ms": round(percentile(latencies, 99), 2),
+        "batched_qps": round(len(queries) / batch_s, 1),
+    })
+
+    index.search(queries[:4], args.k, exact=False)  # warm the list order
+    for nprobe in args.nprobes:
+        for rerank in args.reranks:
+            latencies, results = timed_search(index, queries, args.k, exact=False, nprobe=nprobe, rerank=rerank)
+            start = time.perf_counter()
+            index.search(queries, args.k, exact=False, nprobe=nprobe, rerank=rerank)
+            batch_s = time.perf_counter() - start
+            rows.append({
+                "size": size, "mode": "ivfpq", "nlist": len(index.centroids), "nprobe": nprobe, "rerank": rerank,
+                "recall": round(recall(results, truth, args.k), 3),
+                "p50_ms": round(percentile(latencies, 50), 2), "p99_ms": round(percentile(latencies, 99), 2),
+                "batched_qps": round(len(queries) / batch_s, 1),
+            })
+
+    for row in rows:
+        row.update({"dim": args.dim, "k": args.k, "append_s": round(append_s, 1),
+                    "train_s": round(train_s, 1), "disk_mb": round(disk_mb, 1)})
+        print(json.dumps(row))
+
+    if not args.keep:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000000,10000000")
+    parser.add_argument("--dir", default="vector_bench")
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--clusters", type=int, default=4096)
+    parser.add_argument("--noise", type=float, default=0.6)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--exact-queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobes", type=lambda s: [int(x) for x in s.split(",")], default=[1, 4, 16, 64])
+    parser.add_argument("--reranks", type=lambda s: [int(x) for x in s.split(",")], default=[256, 1024])
+    parser.add_argument("--chunk", type=int, default=1000000)
+    parser.add_argument("--keep", action="store_true", help="Leave the index files in --dir.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        run(size, args)
+
+
+if __name__ == "__main__":
+    main()
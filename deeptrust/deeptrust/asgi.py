@@ -3,6 +3,9 @@ ASGI config for deeptrust project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve this (e.g. ``uvicorn deeptrust.asgi:application``) to stream job
+progress from /api/events/<job_id>/ without tying up a thread per client.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -57,8 +58,53 @@ Q_CLUSTER = {
     "orm": "default",  # No Redis needed
 }
 
+# Priority lanes (see api.lanes): one extra cluster per lane, each started with
+#   Q_CLUSTER_NAME=deeptrust-<lane> python manage.py qcluster
+# All work goes through the lanes: a plain `qcluster` (the "deeptrust"
+# cluster) runs none of it.
+# LANE_WORKERS overrides the worker shares, e.g. "interactive=4,heavy=1".
+LANE_WORKERS = {"interactive": 3, "image": 2, "heavy": 2, "planning": 1}
+LANE_WORKERS.update(
+    (lane, int(n)) for lane, n in
+    (part.split("=") for part in os.getenv("LANE_WORKERS", "").split(",") if part)
+)
+LANE_TIMEOUTS = {"heavy": 600}  # ffmpeg decode + transcription of long media
+LANE_PROMOTE_AFTER = int(os.getenv("LANE_PROMOTE_AFTER", "60"))
+Q_CLUSTER["ALT_CLUSTERS"] = {
+    f"{Q_CLUSTER['name']}-{lane}": {
+        "workers": workers,
+        "timeout": LANE_TIMEOUTS.get(lane, Q_CLUSTER["timeout"]),
+        "retry": LANE_TIMEOUTS.get(lane, Q_CLUSTER["timeout"]) + 80,
+    }
+    for lane, workers in LANE_WORKERS.items()
+}
+
+# Where pipeline stages run (see api.executors): q | celery | thread | process | inline.
+# Stages marked inline in api.stages run in the worker that unblocked them
+# unless STAGE_INLINE_CHEAP is off.
+STAGE_EXECUTOR = os.getenv("STAGE_EXECUTOR", "q")
+STAGE_INLINE_CHEAP = os.getenv("STAGE_INLINE_CHEAP", "1") == "1"
+
+# /api/verify/ with sync=true runs text-only jobs in the request for up to
+# this long, then hands the rest to STAGE_EXECUTOR.
+SYNC_BUDGET_MS = int(os.getenv("SYNC_BUDGET_MS", "800"))
+
+# Mongo connections per process (api.mongo). A Django-Q / Celery worker
+# runs one task at a time; besides it only the stage writer and the thread
+# executor (cpu_count threads) hold connections, so the pymongo default of
+# 100 per process would mostly sit idle across every worker. Web
+# processes serving many threads should raise it.
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", str((os.cpu_count() or 1) + 4)))
+
+# /metrics (api.metrics). With METRICS_DIR set (a directory shared by the
+# web and worker processes on a host) the endpoint aggregates every
+# process; METRICS_TOKEN, when set, is required as a Bearer token.
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -144,3 +190,52 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
+
+# "jobs" holds assembled status/report payloads (see api.cache). LocMem is
+# per process, so set JOB_CACHE_URL to a Redis URL in production for
+# worker-side invalidation to reach the web processes.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "jobs": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["JOB_CACHE_URL"],
+    } if os.getenv("JOB_CACHE_URL") else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "jobs",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+# Job progress pub/sub for /api/events/<job_id>/ (see api.events).
+# "inprocess" only reaches subscribers in the same process; use "redis"
+# when Django-Q workers and the ASGI server run separately.
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "inprocess")
+EVENTS_REDIS_URL = os.getenv("EVENTS_REDIS_URL", "redis://localhost:6379/0")
+
+# Snippet vector index for retrieval_semantic_search (see api.vector_index).
+# SNIPPET_EMBEDDER is "module:factory" for a real embedding model; empty
+# uses the built-in hashing embedder. Build/train with
+# `python manage.py build_snippet_index`; the sync_snippet_index schedule
+# (manage.py provision) embeds new snippets after that.
+SNIPPET_INDEX_DIR = os.getenv("SNIPPET_INDEX_DIR", str(BASE_DIR / "vector_index"))
+SNIPPET_EMBEDDER = os.getenv("SNIPPET_EMBEDDER", "")
+SNIPPET_MAX_AGE_DAYS = int(os.getenv("SNIPPET_MAX_AGE_DAYS", "0")) or None
+
+# Keyframes sampled by extract_frames (see api.frames); must be shared by
+# the workers running extract_frames and authenticity_video. FRAME_BUDGET
+# is the default per job, overridable per upload with `frame_budget`.
+FRAMES_DIR = os.getenv("FRAMES_DIR", str(BASE_DIR / "frames"))
+FRAME_BUDGET = int(os.getenv("FRAME_BUDGET", "32"))
+
+# transcribe_audio (see api.audio). AUDIO_TRANSCRIBER is "module:factory"
+# for a speech model; empty uses the deterministic stub. AUDIO_WORKERS=0
+# means one process per CPU; the pool and its loaded models live as long
+# as the worker process.
+AUDIO_TRANSCRIBER = os.getenv("AUDIO_TRANSCRIBER", "")
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "0"))
+AUDIO_VAD_THRESHOLD_DB = float(os.getenv("AUDIO_VAD_THRESHOLD_DB", "-40"))
+
+# /api/verify/batch/ accepts up to BATCH_MAX_ITEMS files in one request
+DATA_UPLOAD_MAX_NUMBER_FILES = 1000
@@ -16,6 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from api.metrics import metrics_view
 from users.views import home, loading, dashboard, signup, login_view, upload_form, report, logout_view
 
 urlpatterns = [
@@ -29,4 +30,5 @@ urlpatterns = [
     path("upload/", upload_form, name="upload_form"),
     path("report/<str:job_id>/", report, name="report"),
     path("api/", include("api.urls")),
+    path("metrics", metrics_view, name="metrics"),
 ]
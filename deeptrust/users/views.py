@@ -4,8 +4,9 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 
-from api.models import VerificationJob
-from api.mongo import media_docs
+from api.events import sse_available
+from api.listing import list_user_jobs
+from api.views import SSE_STALL_SECONDS
 
 
 # ------------------------------
@@ -70,21 +71,12 @@ def logout_view(request):
 # ------------------------------
 @login_required
 def dashboard(request):
-    sql_jobs = VerificationJob.objects.filter(user=request.user).order_by('-uploaded_at')
+    try:
+        jobs, next_cursor = list_user_jobs(request.user, cursor=request.GET.get("cursor"))
+    except ValueError:
+        return redirect("dashboard")
 
-    jobs = []
-
-    for job in sql_jobs:
-        media_doc = media_docs.find_one({"media_id": job.media_id}) or {}
-
-        jobs.append({
-            "job_id": job.job_id,
-            "media_id": job.media_id,
-            "status": media_doc.get("status", "processing"),
-            "truthscore": media_doc.get("truthscore", None)
-        })
-
-    return render(request, "dashboard.html", {"jobs": jobs})
+    return render(request, "dashboard.html", {"jobs": jobs, "next_cursor": next_cursor})
 
 
 # ------------------------------
@@ -100,7 +92,12 @@ def upload_form(request):
 # ------------------------------
 @login_required
 def loading(request, job_id):
-    return render(request, "loading.html", {"job_id": job_id})
+    # pushed progress only where /api/events/ can actually stream
+    return render(request, "loading.html", {
+        "job_id": job_id,
+        "use_events": sse_available(request),
+        "events_stall_ms": int(SSE_STALL_SECONDS * 1000),
+    })
 
 
 # ------------------------------